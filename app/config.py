@@ -1,9 +1,65 @@
+from typing import Dict, Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     db_dsn: str = "sqlite+aiosqlite:///./dev.db"
+    # Read-only traffic (evaluate cache refills, lists, audit). A refill that
+    # read a lagging replica would cache the old row for a whole TTL, so keys
+    # invalidated by a change event refill from the primary for
+    # db_read_fresh_seconds afterwards; keep it above the replica's worst lag.
+    db_read_dsn: Optional[str] = None
+    db_read_fresh_seconds: float = 30.0
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout: float = 30.0
+    db_pool_recycle: int = 1800
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_mmap_bytes: int = 256 * 1024 * 1024
+    sqlite_busy_timeout_ms: int = 5000
     jwt_secret: str = "dev-secret"
+    auth_enabled: bool = True
+    auth_cache_size: int = 10_000
     log_level: str = "INFO"
+    log_mode: str = "queue"  # queue | sync
+    log_queue_size: int = 10_000
+    # Access-log keep probability by route template / tenant, e.g. LOG_SAMPLE_RATES='{"/v1/evaluate": 0.01}'
+    log_sample_rates: Dict[str, float] = {}
+    log_tenant_sample_rates: Dict[str, float] = {}
+    cache_ttl_seconds: int = 60
+    cache_stale_seconds: int = 30
+    cache_max_entries: int = 50_000
+    cache_tenant_quota: Optional[int] = 5_000
+    change_bus: str = "auto"  # auto | postgres | polling | inprocess
+    change_poll_seconds: float = 2.0
+    # How far behind their watermark change scans (polling bus, snapshot catch-up) re-read: updated_at is
+    # stamped before commit, so rows can become visible out of timestamp order (also covers clock skew).
+    change_overlap_seconds: float = 10.0
+    audit_mode: str = "async"  # async | transactional
+    audit_queue_size: int = 10_000
+    audit_batch_size: int = 500
+    audit_flush_seconds: float = 0.2
+    audit_on_full: str = "sync"  # sync | block
+    audit_max_retries: int = 5  # failed flushes in a row before bad rows are bisected out to the dead-letter log
+    audit_retry_max_seconds: float = 30.0
+    exposure_bucket_seconds: int = 60
+    exposure_flush_seconds: float = 10.0
+    exposure_max_keys: int = 100_000
+    exposure_unique_users: bool = False
+    # Warm-start snapshot file (unset: warm each worker from the DB, write nothing).
+    snapshot_path: Optional[str] = None
+    snapshot_interval_seconds: float = 300.0
+    # Directory for compact rulesets mmap-shared by the workers on a host (unset: per-worker copies).
+    ruleset_dir: Optional[str] = None
+    # /v1/evaluate without pydantic for well-formed requests (same responses, byte for byte).
+    evaluate_fast_path: bool = True
+    # Opt-in profiling: the header (needs the debug:profile scope when auth is on) returns Server-Timing;
+    # "cprofile" as its value, or PROFILE_SAMPLE_RATE of all requests, dumps cProfile stats into PROFILE_DIR.
+    profile_header: str = "X-Debug-Profile"
+    profile_dir: Optional[str] = None
+    profile_sample_rate: float = 0.0
+    stream_replay_size: int = 1_000
+    stream_queue_size: int = 256
+    stream_heartbeat_seconds: float = 15.0
 
     class Config:
         env_prefix = ""
@@ -1,29 +1,190 @@
-from typing import AsyncGenerator, Annotated, Optional
-from fastapi import Header, HTTPException, Depends, Request
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+import time
+from typing import Any, AsyncGenerator, Annotated, Callable, Dict, Optional
+from fastapi import Header, HTTPException, Depends, Request, status
+from prometheus_client import Counter, Histogram
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app.config import settings
+from app.utils.profiling import PROFILE_SCOPE, stage
+from app.utils.security import Principal, TokenCache, unauthorized
 
-engine = create_async_engine(settings.db_dsn, future=True)
+POOL_CHECKOUT_SECONDS = Histogram(
+    "db_pool_checkout_seconds", "Time spent waiting for a pooled connection", ["engine"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+POOL_TIMEOUTS = Counter("db_pool_timeouts_total", "Connection checkouts that hit pool_timeout", ["engine"])
+
+class _TimedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each checkout waited; `label` is set per engine."""
+    label = "db"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeout:
+            POOL_TIMEOUTS.labels(self.label).inc()
+            raise
+        finally:
+            POOL_CHECKOUT_SECONDS.labels(self.label).observe(time.perf_counter() - start)
+
+def _is_sqlite(dsn: str) -> bool:
+    return dsn.startswith("sqlite")
+
+def _is_memory(dsn: str) -> bool:
+    return _is_sqlite(dsn) and (":memory:" in dsn or dsn.rstrip("/").endswith(":"))
+
+def _sqlite_pragmas(read_only: bool):
+    def on_connect(dbapi_conn, _record):
+        cur = dbapi_conn.cursor()
+        # WAL lets readers proceed while a writer holds the lock; NORMAL is
+        # durable across app crashes (not power loss) under WAL.
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute(f"PRAGMA synchronous={settings.sqlite_synchronous}")
+        cur.execute(f"PRAGMA mmap_size={int(settings.sqlite_mmap_bytes)}")
+        cur.execute(f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout_ms)}")
+        if read_only:
+            cur.execute("PRAGMA query_only=ON")
+        cur.close()
+    return on_connect
+
+def make_engine(dsn: str, label: str, *, read_only: bool = False) -> AsyncEngine:
+    """An engine with the configured pool sizing; SQLite files also get WAL and friends on connect."""
+    kwargs: Dict[str, Any] = {"future": True}
+    if not _is_memory(dsn):
+        kwargs.update(
+            poolclass=type(f"{label.title()}Pool", (_TimedQueuePool,), {"label": label}),
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_timeout=settings.db_pool_timeout,
+            pool_recycle=settings.db_pool_recycle,
+            pool_pre_ping=not _is_sqlite(dsn),
+        )
+    eng = create_async_engine(dsn, **kwargs)
+    if _is_sqlite(dsn) and not _is_memory(dsn):
+        event.listen(eng.sync_engine, "connect", _sqlite_pragmas(read_only))
+    return eng
+
+# Writes (and anything that must read its own writes) go to `engine`.
+# Read-only paths use `read_engine`: DB_READ_DSN (e.g. a replica) when set,
+# otherwise a second pool on the primary so a write burst can't starve reads
+# of connections. An in-memory SQLite database can't be shared across
+# pools, so there the two are the same engine.
+engine = make_engine(settings.db_dsn, "write")
+_read_dsn = settings.db_read_dsn or settings.db_dsn
+read_engine = engine if _is_memory(_read_dsn) else make_engine(_read_dsn, "read", read_only=True)
 SessionLocal = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+ReadSessionLocal = async_sessionmaker(read_engine, expire_on_commit=False, class_=AsyncSession)
+
+class FreshReads:
+    """
+    Picks the session factory for a cache refill. Keys marked after a change
+    event are refilled from the primary for `hold_seconds`: a lagging replica
+    could still return the row the event replaced, and the cache would then
+    serve it for a whole TTL. Marks are exact cache keys, or prefixes ending
+    in ":" ("" for everything). A zero hold leaves every refill on `replica`.
+    """
+
+    def __init__(self, primary: async_sessionmaker, replica: async_sessionmaker, hold_seconds: float):
+        self.primary = primary
+        self.replica = replica
+        self.hold = hold_seconds
+        self._keys: Dict[str, float] = {}
+        self._prefixes: Dict[str, float] = {}
+
+    def mark(self, key: str):
+        self._mark(self._keys, key)
+
+    def mark_prefix(self, prefix: str):
+        self._mark(self._prefixes, prefix)
+
+    def _mark(self, marks: Dict[str, float], key: str):
+        if self.hold <= 0:
+            return
+        now = time.monotonic()
+        if len(marks) >= 1024:
+            for k in [k for k, until in marks.items() if until <= now]:
+                del marks[k]
+        marks[key] = now + self.hold
+
+    def session(self, key: str) -> async_sessionmaker:
+        if not self._keys and not self._prefixes:
+            return self.replica
+        now = time.monotonic()
+        if self._keys.get(key, 0.0) > now:
+            return self.primary
+        if any(until > now and key.startswith(p) for p, until in self._prefixes.items()):
+            return self.primary
+        return self.replica
+
+# Without DB_READ_DSN the read pool is on the primary already, so there is nothing to route around.
+fresh_reads = FreshReads(SessionLocal, ReadSessionLocal, settings.db_read_fresh_seconds if settings.db_read_dsn else 0.0)
 
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     async with SessionLocal() as session:
         yield session
 
+async def get_read_db() -> AsyncGenerator[AsyncSession, None]:
+    """Session on the read engine, for handlers that never write."""
+    async with ReadSessionLocal() as session:
+        yield session
+
 Tenant = Annotated[str, Header(alias="X-Tenant-ID")]
 
 def require_tenant(tenant: Tenant):
-    if not tenant:
-        raise HTTPException(status_code=400, detail="X-Tenant-ID required")
-    return tenant
+    with stage("tenant"):
+        if not tenant:
+            raise HTTPException(status_code=400, detail="X-Tenant-ID required")
+        return tenant
+
+token_cache = TokenCache(settings.jwt_secret, max_entries=settings.auth_cache_size)
 
-async def require_auth(request: Request):
+async def require_auth(request: Request) -> Optional[Principal]:
     """
-    TODO (candidate): Enforce Authorization: Bearer <JWT>
-    - Parse header
-    - Verify HS256 JWT using settings.jwt_secret
-    - Check exp and optionally scopes/claims
-    - Attach claims to request.state.user if useful
+    Enforce `Authorization: Bearer <JWT>` (HS256, exp required) via the
+    verified-token cache and attach the claims to request.state.user.
+    Returns None without checking anything when AUTH_ENABLED is off.
     """
-    # For starter: no enforcement so smoke tests run without a token.
-    return
+    if not settings.auth_enabled:
+        return None
+    with stage("auth"):
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            raise unauthorized("Missing bearer token")
+        principal = token_cache.verify(token.strip())
+    request.state.user = principal.claims
+    return principal
+
+def may_profile(authorization: str) -> bool:
+    """Whether a caller with this Authorization header may use the profiling header (see app.utils.profiling)."""
+    if not settings.auth_enabled:
+        return True
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    try:
+        return PROFILE_SCOPE in token_cache.verify(token.strip()).scopes
+    except HTTPException:
+        return False
+
+def require_scopes(*scopes: str) -> Callable:
+    """
+    Dependency requiring every scope in `scopes`; 403 otherwise. The set is
+    built here, once, when the route is declared:
+
+        @router.get("", dependencies=[Depends(require_scopes("flags:r"))])
+    """
+    required = frozenset(scopes)
+
+    async def check(principal: Optional[Principal] = Depends(require_auth)):
+        if principal is not None and not required <= principal.scopes:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
+                                detail=f"Missing scope: {', '.join(sorted(required - principal.scopes))}")
+    return check
+
+def get_actor(request: Request) -> str:
+    """Audit actor: the token subject when auth attached claims, else 'anonymous'."""
+    claims = getattr(request.state, "user", None) or {}
+    return str(claims.get("sub") or "anonymous")
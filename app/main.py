@@ -1,10 +1,15 @@
-from fastapi import FastAPI, Request
-from starlette.middleware.base import BaseHTTPMiddleware
-from app.utils.logging import setup_logging
+from fastapi import FastAPI
+from app.utils.logging import AccessLogSampler, RequestContextMiddleware, setup_logging, shutdown_logging
 from app.config import settings
 from app.models import Base
-from app.deps import engine
-from prometheus_client import Counter, generate_latest, CONTENT_TYPE_LATEST
+from app.deps import engine, may_profile
+from app.services.changes import bus
+from app.services.audit import writer as audit_writer
+from app.services.exposures import aggregator as exposures
+from app.services.snapshot import warm
+from app.utils.metrics import MetricsMiddleware
+from app.utils.profiling import ProfilingMiddleware
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 from fastapi.responses import Response
 
 from app.routers import health as health_router
@@ -13,39 +18,51 @@ from app.routers import flags as flags_router
 from app.routers import segments as segments_router
 from app.routers import evaluate as evaluate_router
 from app.routers import audit as audit_router
+from app.routers import bulk as bulk_router
+from app.routers import stream as stream_router
+from app.routers import exposures as exposures_router
 
 # Logging
-setup_logging(settings.log_level)
+setup_logging(settings.log_level, settings.log_mode, settings.log_queue_size)
 
 app = FastAPI(title="Feature Flag Service", version="0.1.0")
 
-REQUEST_COUNT = Counter("http_requests_total", "Total HTTP requests", ["path", "method", "status"])
-
-class MetricsMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        response = None
-        try:
-            response = await call_next(request)
-            return response
-        finally:
-            status = getattr(response, "status_code", 500)
-            REQUEST_COUNT.labels(path=request.url.path, method=request.method, status=status).inc()
-
 @app.on_event("startup")
 async def on_startup():
     # Create tables (simple approach for starter)
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+    await bus.start()
+    await audit_writer.start()
+    await exposures.start()
+    await warm.start(evaluate_router.prime)
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await warm.stop()
+    await exposures.stop()
+    await audit_writer.stop()
+    await bus.stop()
+    shutdown_logging()
 
 app.add_middleware(MetricsMiddleware)
+app.add_middleware(RequestContextMiddleware,
+                   sampler=AccessLogSampler(settings.log_sample_rates, settings.log_tenant_sample_rates))
+# Outermost, so the Server-Timing total covers the other middlewares too.
+app.add_middleware(ProfilingMiddleware, authorize=may_profile, header=settings.profile_header,
+                   profile_dir=settings.profile_dir, sample_rate=settings.profile_sample_rate)
 
 # Routers
 app.include_router(health_router.router)
 app.include_router(auth_router.router)
+# Before flags/segments so /v1/flags/export isn't taken for a flag key.
+app.include_router(bulk_router.router)
 app.include_router(flags_router.router)
 app.include_router(segments_router.router)
 app.include_router(evaluate_router.router)
 app.include_router(audit_router.router)
+app.include_router(stream_router.router)
+app.include_router(exposures_router.router)
 
 @app.get("/metrics")
 async def metrics():
@@ -5,7 +5,7 @@ from datetime import datetime
 from typing import Optional, List, Dict, Any
 
 from sqlalchemy import (
-    String, Text, JSON, DateTime,
+    String, Text, JSON, DateTime, Integer, LargeBinary,
     UniqueConstraint, Index, CheckConstraint
 )
 from sqlalchemy.orm import Mapped, mapped_column, declarative_base
@@ -158,3 +158,51 @@ class Audit(Base):
         DateTime, default=datetime.utcnow, index=True, nullable=False,
         comment="Event timestamp (UTC)"
     )
+
+
+class Exposure(Base):
+    """
+    Aggregated evaluation results for experiment analysis.
+
+    - One row per (tenant, flag, variant, rule, time bucket); `count` is
+      added to by each flush, never one row per evaluation.
+    - rule_id '' means the default distribution / flag-off path.
+    - unique_users: HyperLogLog registers (see app.services.exposures), merged on flush.
+    """
+    __tablename__ = "exposures"
+    __table_args__ = (
+        UniqueConstraint("tenant_id", "flag_key", "bucket_start", "variant", "rule_id", name="uq_exposures_bucket"),
+    )
+
+    id: Mapped[int] = mapped_column(
+        primary_key=True, autoincrement=True,
+        comment="Surrogate numeric identifier"
+    )
+    tenant_id: Mapped[str] = mapped_column(
+        String(64), nullable=False,
+        comment="Tenant namespace identifier"
+    )
+    flag_key: Mapped[str] = mapped_column(
+        String(128), nullable=False,
+        comment="Evaluated flag key"
+    )
+    variant: Mapped[str] = mapped_column(
+        String(128), nullable=False,
+        comment="Variant served"
+    )
+    rule_id: Mapped[str] = mapped_column(
+        String(128), nullable=False, default="",
+        comment="Matched rule id, '' when no rule matched"
+    )
+    bucket_start: Mapped[datetime] = mapped_column(
+        DateTime, nullable=False,
+        comment="Start of the aggregation bucket (UTC)"
+    )
+    count: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0,
+        comment="Evaluations in the bucket"
+    )
+    unique_users: Mapped[Optional[bytes]] = mapped_column(
+        LargeBinary, nullable=True,
+        comment="HyperLogLog registers over user ids, when unique counting is on"
+    )
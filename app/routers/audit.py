@@ -1,13 +1,50 @@
-from fastapi import APIRouter, Depends, HTTPException
+import json
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.deps import get_db, require_tenant
-from app.services.audit import list_audit
+from app.deps import ReadSessionLocal, get_read_db, require_tenant, require_scopes
+from app.schemas import AuditOut, AuditPage
+from app.services.audit import audit_to_dict, list_audit, stream_audit
+from app.utils.dates import naive_utc
 
 router = APIRouter(prefix="/v1/audit", tags=["audit"])
+READ = [Depends(require_scopes("audit:r"))]
 
-@router.get("")
-async def list_audit_entries(tenant: str = Depends(require_tenant)):
-    # TODO (candidate):
-    # - Query audit entries by tenant with optional filters (entity, entity_key, time window)
-    # - Return in reverse chronological order
-    raise HTTPException(status_code=501, detail="Not implemented")
\ No newline at end of file
+@router.get("", response_model=AuditPage, dependencies=READ)
+async def list_audit_entries(
+    tenant: str = Depends(require_tenant),
+    db: AsyncSession = Depends(get_read_db),
+    entity: Optional[str] = Query(None, pattern="^(flag|segment)$"),
+    entity_key: Optional[str] = None,
+    since: Optional[datetime] = Query(None, description="Inclusive lower bound on ts (UTC)"),
+    until: Optional[datetime] = Query(None, description="Exclusive upper bound on ts (UTC)"),
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="`next_cursor` from the previous page"),
+):
+    """Reverse-chronological audit entries, cursor-paginated."""
+    try:
+        rows, next_cursor = await list_audit(db, tenant, entity=entity, entity_key=entity_key, since=naive_utc(since),
+                                             until=naive_utc(until), cursor=cursor, limit=limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return AuditPage(items=[AuditOut(**audit_to_dict(a)) for a in rows], next_cursor=next_cursor)
+
+@router.get("/export", dependencies=READ)
+async def export_audit_entries(
+    tenant: str = Depends(require_tenant),
+    entity: Optional[str] = Query(None, pattern="^(flag|segment)$"),
+    entity_key: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+):
+    """Chronological NDJSON export streamed from a server-side cursor; memory stays flat."""
+    since, until = naive_utc(since), naive_utc(until)
+    async def lines():
+        # Own session: the request-scoped one is closed before the body streams.
+        async with ReadSessionLocal() as db:
+            async for a in stream_audit(db, tenant, entity=entity, entity_key=entity_key, since=since, until=until):
+                yield json.dumps(audit_to_dict(a)) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
@@ -0,0 +1,34 @@
+import json
+from dataclasses import asdict
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.deps import ReadSessionLocal, get_db, get_actor, require_scopes, require_tenant
+from app.services.bulk import FLAGS, SEGMENTS, export_entities, import_entities, iter_ndjson
+
+router = APIRouter(prefix="/v1", tags=["bulk"])
+
+def _register(path: str, kind):
+    @router.post(f"/{path}/import", name=f"import_{path}", dependencies=[Depends(require_scopes(f"{path}:rw"))])
+    async def bulk_import(request: Request, tenant: str = Depends(require_tenant),
+                          db: AsyncSession = Depends(get_db), actor: str = Depends(get_actor)):
+        """
+        Upsert from an NDJSON body (one FlagIn/SegmentIn per line), read
+        incrementally. The report counts created / updated / unchanged rows
+        and lists the first invalid lines.
+        """
+        report = await import_entities(db, kind, tenant, actor, iter_ndjson(request.stream()))
+        return asdict(report)
+
+    @router.get(f"/{path}/export", name=f"export_{path}", dependencies=[Depends(require_scopes(f"{path}:r"))])
+    async def bulk_export(tenant: str = Depends(require_tenant)):
+        """Stream the tenant's rows as NDJSON in import format."""
+        async def lines():
+            async with ReadSessionLocal() as db:
+                async for item in export_entities(db, kind, tenant):
+                    yield json.dumps(item) + "\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+_register("flags", FLAGS)
+_register("segments", SEGMENTS)
@@ -1,22 +1,351 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import hashlib
+import json
+from typing import Any, Callable, Coroutine, Dict, Iterator, List, Optional, Sequence
+from fastapi import APIRouter, Depends, HTTPException, Header, Request, Response, status, File, Form, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.routing import APIRoute
+from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from app.deps import get_db, require_tenant
-from app.schemas import EvaluateRequest, EvaluateResponse
-from app.models import Flag
-from app.services.flag_eval import evaluate_flag
+from app.config import settings
+from app.deps import fresh_reads, get_read_db, require_auth, require_tenant, require_scopes
+from app.schemas import EvaluateRequest, EvaluateResponse, EvaluateBatchRequest, EvaluateAllRequest, FlagIn, SegmentMatchRequest, SegmentMatchResponse
+from app.services.flag_eval import CompiledFlag, RuleTiming
+from app.services.ruleset import (
+    CompiledFlagCache, SegmentSnapshot, TenantRuleset, load_flag, load_flags, load_ruleset_version, load_segments,
+    ruleset_version,
+)
+from app.services.shared_ruleset import RulesetStore
+from app.services.segment_index import SegmentIndex, SegmentIndexCache
+from app.services.simulate import load_population, simulate
 from app.services.cache import TTLCache
+from app.services.changes import ChangeEvent, bus
+from app.services.exposures import aggregator as exposures
+from app.services.fast_evaluate import evaluation_body, parse_evaluate
+from app.utils.metrics import count_evaluation
+from app.utils.profiling import current_trace, stage
 
 router = APIRouter(prefix="/v1", tags=["evaluate"])
-cache = TTLCache(ttl_seconds=15)
+_read_scope = require_scopes("flags:r")
+READ = [Depends(_read_scope)]
+# Routes that hand out segment criteria or memberships also need what GET /v1/segments does.
+READ_WITH_SEGMENTS = [Depends(require_scopes("flags:r", "segments:r"))]
+cache = TTLCache(
+    ttl_seconds=settings.cache_ttl_seconds,
+    stale_seconds=settings.cache_stale_seconds,
+    max_entries=settings.cache_max_entries,
+    tenant_quota=settings.cache_tenant_quota,
+    name="evaluate",
+)
+plans = CompiledFlagCache()
+segment_indexes = SegmentIndexCache()
+shared = RulesetStore(settings.ruleset_dir) if settings.ruleset_dir else None
 
-@router.post("/evaluate", response_model=EvaluateResponse, status_code=status.HTTP_200_OK)
-async def evaluate(_: EvaluateRequest, tenant: str = Depends(require_tenant)):
+@bus.subscribe
+def _on_change(event: ChangeEvent):
+    if event.entity == "flag":
+        cache.invalidate(f"{event.tenant}:flag:{event.key}")
+        cache.invalidate(f"{event.tenant}:ruleset")
+        fresh_reads.mark(f"{event.tenant}:flag:{event.key}")
+        fresh_reads.mark(f"{event.tenant}:ruleset")
+        plans.invalidate(event.tenant, event.key)
+    elif event.entity == "segment":
+        cache.invalidate(f"{event.tenant}:segments")
+        cache.invalidate(f"{event.tenant}:ruleset")
+        fresh_reads.mark(f"{event.tenant}:segments")
+        fresh_reads.mark(f"{event.tenant}:ruleset")
+        plans.invalidate_segment(event.tenant, event.key)
+        segment_indexes.invalidate(event.tenant)
+    elif event.entity == "tenant":
+        cache.invalidate_prefix(f"{event.tenant}:")
+        fresh_reads.mark_prefix(f"{event.tenant}:")
+        plans.invalidate(event.tenant)
+        segment_indexes.invalidate(event.tenant)
+    elif event.entity == "all":
+        cache.clear()
+        fresh_reads.mark_prefix("")
+        plans.clear()
+        segment_indexes.clear()
+
+# Users per NDJSON chunk handed to the ASGI server.
+BATCH_CHUNK_USERS = 64
+
+async def _load_flag(tenant: str, flag_key: str):
+    with stage("db"):
+        async with fresh_reads.session(f"{tenant}:flag:{flag_key}")() as db:
+            return await load_flag(db, tenant, flag_key)
+
+async def _load_segments(tenant: str) -> SegmentSnapshot:
+    with stage("db"):
+        async with fresh_reads.session(f"{tenant}:segments")() as db:
+            return await load_segments(db, tenant)
+
+async def get_segments(tenant: str) -> SegmentSnapshot:
+    return await cache.get_or_load(f"{tenant}:segments", lambda: _load_segments(tenant))
+
+def _ruleset(tenant: str, version: str, flags: Sequence[Dict[str, Any]], segments: SegmentSnapshot) -> TenantRuleset:
+    return TenantRuleset(
+        version=version,
+        flags=flags,
+        plans=tuple(plans.get(tenant, f, segments) for f in flags),
+        segments=segments,
+    )
+
+async def _load_shared_ruleset(store: RulesetStore, tenant: str) -> TenantRuleset:
+    """
+    Ruleset from the host's shared store (RULESET_DIR). Only keys and
+    timestamps are read to check the published version; the first worker to
+    see a new version loads the rows and publishes it for the others.
+    """
+    async with fresh_reads.session(f"{tenant}:ruleset")() as db:
+        version = await load_ruleset_version(db, tenant)
+        current = store.open(tenant)
+        if current is None or current.version != version:
+            flags = await load_flags(db, tenant)
+            segments = await load_segments(db, tenant)
+            current = await run_in_threadpool(store.publish, tenant, ruleset_version(flags, segments), flags, segments)
+    segments = current.segments()
+    cache.set(f"{tenant}:segments", segments)
+    return _ruleset(tenant, current.version, current.flags(), segments)
+
+async def _load_ruleset(tenant: str) -> TenantRuleset:
+    if shared is not None:
+        return await _load_shared_ruleset(shared, tenant)
+    with stage("db"):
+        async with fresh_reads.session(f"{tenant}:ruleset")() as db:
+            flags = await load_flags(db, tenant)
+    segments = await get_segments(tenant)
+    return _ruleset(tenant, ruleset_version(flags, segments), tuple(flags), segments)
+
+def prime(tenant: str, flags: List[Dict[str, Any]], segments: SegmentSnapshot):
+    """Seed the caches for one tenant (warm start): flag rows, segments, compiled plans and the ruleset."""
+    cache.set(f"{tenant}:segments", segments)
+    for flag in flags:
+        cache.set(f"{tenant}:flag:{flag['key']}", flag)
+    version = ruleset_version(flags, segments)
+    if shared is not None:
+        # Every worker primes every tenant; only the first to get here writes this version for the host.
+        current = shared.open(tenant)
+        if current is None or current.version != version:
+            current = shared.publish(tenant, version, flags, segments)
+        cache.set(f"{tenant}:ruleset", _ruleset(tenant, version, current.flags(), segments))
+    else:
+        cache.set(f"{tenant}:ruleset", _ruleset(tenant, version, tuple(flags), segments))
+
+async def get_ruleset(tenant: str) -> TenantRuleset:
+    return await cache.get_or_load(f"{tenant}:ruleset", lambda: _load_ruleset(tenant))
+
+async def get_plan(tenant: str, flag_key: str) -> CompiledFlag:
+    """
+    Resolve the compiled plan for (tenant, flag_key); 404 when missing.
+
+    Flag rows and segments come through the single-flight TTL cache with
+    their own sessions, so a cache hit never checks out a DB connection.
+    """
+    with stage("cache"):
+        flag = await cache.get_or_load(f"{tenant}:flag:{flag_key}", lambda: _load_flag(tenant, flag_key))
+        if flag is None:
+            raise HTTPException(status_code=404, detail="Flag not found")
+        segments = await get_segments(tenant)
+    with stage("compile"):
+        return plans.get(tenant, flag, segments)
+
+async def _evaluate_one(tenant: str, flag_key: str, user: Dict[str, Any]) -> Dict[str, Any]:
+    plan = await get_plan(tenant, flag_key)
+    trace = current_trace()
+    with stage("match"):
+        if trace is None:
+            result = plan.evaluate(tenant, user)
+        else:
+            timings: List[RuleTiming] = []
+            result = plan.evaluate(tenant, user, rule_timings=timings)
+            trace.add_rules(plan.key, timings)
+    count_evaluation(result)
+    exposures.record(tenant, plan.key, result, user.get("id"))
+    return result
+
+def _validated_response(result: Dict[str, Any]) -> Response:
+    return JSONResponse(EvaluateResponse.model_validate(result).model_dump(mode="json"))
+
+async def _fast_evaluate(request: Request) -> Optional[Response]:
+    """
+    /v1/evaluate for a well-formed JSON body with the tenant header present;
+    None sends the request down the regular validated route instead, which
+    produces the same 401/403/422 it always has. Dependencies run in the
+    route's order: the READ scope check, then require_tenant (called
+    directly rather than in the threadpool FastAPI uses for sync deps).
+    """
+    content_type = request.headers.get("content-type")
+    if content_type is not None and content_type != "application/json":
+        return None
+    parsed = parse_evaluate(await request.body())
+    if parsed is None:
+        return None
+    await _read_scope(await require_auth(request))
+    tenant = request.headers.get("x-tenant-id")
+    if tenant is None:
+        return None
+    result = await _evaluate_one(require_tenant(tenant), *parsed)
+    with stage("serialize"):
+        body = evaluation_body(result)
+        if body is None:
+            return _validated_response(result)
+        return Response(body, media_type="application/json")
+
+class FastEvaluateRoute(APIRoute):
+    """Tries `_fast_evaluate` first when EVALUATE_FAST_PATH is on, the FastAPI handler otherwise."""
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        validated = super().get_route_handler()
+
+        async def handler(request: Request) -> Response:
+            if settings.evaluate_fast_path:
+                response = await _fast_evaluate(request)
+                if response is not None:
+                    return response
+            return await validated(request)
+
+        return handler
+
+async def evaluate(body: EvaluateRequest, tenant: str = Depends(require_tenant)):
+    result = await _evaluate_one(tenant, body.flag_key, body.user)
+    # Serialized here rather than by FastAPI so the stage is measurable; same validation and bytes.
+    with stage("serialize"):
+        return _validated_response(result)
+
+router.add_api_route("/evaluate", evaluate, methods=["POST"], response_model=EvaluateResponse,
+                     status_code=status.HTTP_200_OK, dependencies=READ, route_class_override=FastEvaluateRoute)
+
+def _batch_lines(tenant: str, compiled: List[CompiledFlag], users: List[Dict[str, Any]],
+                 index: Optional[SegmentIndex]) -> Iterator[bytes]:
+    buf: List[str] = []
+    for i, user in enumerate(users, 1):
+        uid = user.get("id")
+        # Segment membership resolved once per user and shared by all of the user's flags.
+        members = index.members(user.get("attributes") or {}) if index is not None else None
+        for plan in compiled:
+            result = plan.evaluate(tenant, user, members=members)
+            count_evaluation(result)
+            exposures.record(tenant, plan.key, result, uid)
+            buf.append(json.dumps({"user_id": uid, "flag_key": plan.key, **result}))
+        if i % BATCH_CHUNK_USERS == 0:
+            yield ("\n".join(buf) + "\n").encode()
+            buf.clear()
+    if buf:
+        yield ("\n".join(buf) + "\n").encode()
+
+@router.post("/evaluate/batch", dependencies=READ)
+async def evaluate_batch(body: EvaluateBatchRequest, tenant: str = Depends(require_tenant), db: AsyncSession = Depends(get_read_db)):
+    """
+    Evaluate flags x users in one call. `flag_keys` omitted means every active
+    flag. Streams NDJSON, one {user_id, flag_key, variant, reason, rule_id,
+    details} object per line, grouped by user in request order.
+    """
+    flags = await load_flags(db, tenant, body.flag_keys)
+    if body.flag_keys is not None:
+        missing = sorted(set(body.flag_keys) - {f["key"] for f in flags})
+        if missing:
+            raise HTTPException(status_code=404, detail={"message": "Flag not found", "flag_keys": missing})
+    segments = await get_segments(tenant)
+    compiled = [plans.get(tenant, f, segments) for f in flags]
+    index = segment_indexes.get(tenant, segments) if any(p.segment_refs for p in compiled) else None
+    return StreamingResponse(_batch_lines(tenant, compiled, body.users, index), media_type="application/x-ndjson")
+
+def _user_hash(user: Dict[str, Any]) -> str:
+    canonical = json.dumps(user, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()[:16]
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+    return "*" in tags or etag in tags
+
+@router.post("/evaluate/all", dependencies=READ)
+async def evaluate_all(body: EvaluateAllRequest, tenant: str = Depends(require_tenant),
+                       if_none_match: Optional[str] = Header(None)):
+    """
+    Bootstrap: evaluate every active flag for one user.
+
+    The ETag is (tenant ruleset version, user hash); a matching If-None-Match
+    gets a 304 before any flag is evaluated or serialized.
+    """
+    with stage("cache"):
+        ruleset = await get_ruleset(tenant)
+    etag = f'"{ruleset.version}.{_user_hash(body.user)}"'
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    with stage("match"):
+        members = None
+        if any(p.segment_refs for p in ruleset.plans):
+            members = segment_indexes.get(tenant, ruleset.segments).members(body.user.get("attributes") or {})
+        flags = {p.key: p.evaluate(tenant, body.user, members=members) for p in ruleset.plans}
+    uid = body.user.get("id")
+    for key, result in flags.items():
+        count_evaluation(result)
+        exposures.record(tenant, key, result, uid)
+    with stage("serialize"):
+        return JSONResponse({"version": ruleset.version, "flags": flags}, headers={"ETag": etag})
+
+@router.get("/ruleset", dependencies=READ_WITH_SEGMENTS)
+async def get_tenant_ruleset(tenant: str = Depends(require_tenant), if_none_match: Optional[str] = Header(None)):
+    """
+    The tenant's active flags and segments for client-side evaluation (see sdk/).
+    Each flag and segment carries its own version so clients recompile only what
+    changed; a matching If-None-Match gets a 304.
+    """
+    ruleset = await get_ruleset(tenant)
+    etag = f'"{ruleset.version}"'
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return JSONResponse({
+        "version": ruleset.version,
+        "flags": list(ruleset.flags),
+        "segments": [
+            {"key": k, "criteria": c, "version": ruleset.segments.versions.get(k)}
+            for k, c in sorted(ruleset.segments.criteria.items())
+        ],
+    }, headers={"ETag": etag})
+
+@router.post("/evaluate/segments", response_model=SegmentMatchResponse, dependencies=READ_WITH_SEGMENTS)
+async def matching_segments(body: SegmentMatchRequest, tenant: str = Depends(require_tenant)):
+    """Debug: every segment the user belongs to, answered from the tenant's inverted index."""
+    index = segment_indexes.get(tenant, await get_segments(tenant))
+    return SegmentMatchResponse(segments=sorted(index.members(body.user.get("attributes") or {})))
+
+def _parse_flag(raw: str, field: str) -> Dict[str, Any]:
+    try:
+        return FlagIn.model_validate_json(raw).model_dump(exclude_none=True)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail={"field": field, "errors": e.errors(include_url=False)})
+
+@router.post("/evaluate/simulate", dependencies=READ)
+async def simulate_rollout(
+    population: UploadFile = File(...),
+    flag_key: Optional[str] = Form(None),
+    flag: Optional[str] = Form(None),
+    proposed: Optional[str] = Form(None),
+    tenant: str = Depends(require_tenant),
+    db: AsyncSession = Depends(get_read_db),
+):
     """
-    TODO (candidate):
-    - Load flag by (tenant, flag_key) from DB (or cache; add TTL cache)
-    - Call app.services.flag_eval.evaluate_flag(flag, tenant, body.user)
-    - Return EvaluateResponse with variant/reason/rule_id/details
-    - Handle 404 when flag is missing
+    Dry-run a flag over a population file (CSV or .parquet; `id`/`user_id`
+    column plus attribute columns). The baseline is `flag` (FlagIn JSON) or the
+    stored flag `flag_key`; pass `proposed` to get the blast radius of a change.
     """
-    raise HTTPException(status_code=501, detail="Not implemented")
\ No newline at end of file
+    if flag is not None:
+        current = _parse_flag(flag, "flag")
+    elif flag_key is not None:
+        stored = await load_flag(db, tenant, flag_key)
+        if stored is None:
+            raise HTTPException(status_code=404, detail="Flag not found")
+        current = stored
+    else:
+        raise HTTPException(status_code=422, detail="flag or flag_key required")
+    change = _parse_flag(proposed, "proposed") if proposed is not None else None
+    segments = await get_segments(tenant)
+    try:
+        pop = load_population(await population.read(), population.filename or "")
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=422, detail=f"Invalid population: {e}")
+    return await run_in_threadpool(simulate, tenant, current, pop, segments.criteria, change)
@@ -0,0 +1,35 @@
+from datetime import datetime, timedelta
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
+from app.deps import get_read_db, require_tenant, require_scopes
+from app.schemas import ExposureReport, ExposureSlice
+from app.services.exposures import exposure_report
+from app.utils.dates import naive_utc
+
+router = APIRouter(prefix="/v1/exposures", tags=["exposures"])
+READ = [Depends(require_scopes("flags:r"))]
+
+@router.get("/{flag_key}", response_model=ExposureReport, dependencies=READ)
+async def get_exposures(
+    flag_key: str,
+    tenant: str = Depends(require_tenant),
+    db: AsyncSession = Depends(get_read_db),
+    since: Optional[datetime] = Query(None, description="Inclusive, UTC; default 24h before `until`"),
+    until: Optional[datetime] = Query(None, description="Exclusive, UTC; default now"),
+    interval: Optional[int] = Query(None, ge=1, description="Slice width in seconds, a multiple of the bucket size"),
+):
+    """
+    Exposure counts per (time slice, variant, rule) for one flag. Counts lag
+    by up to EXPOSURE_FLUSH_SECONDS; unique_users is an estimate, null when
+    unique counting is off.
+    """
+    bucket = settings.exposure_bucket_seconds
+    interval = interval or bucket
+    if interval % bucket:
+        raise HTTPException(status_code=400, detail=f"interval must be a multiple of {bucket} seconds")
+    until = naive_utc(until) or datetime.utcnow()
+    since = naive_utc(since) or until - timedelta(days=1)
+    slices = await exposure_report(db, tenant, flag_key, since, until, interval)
+    return ExposureReport(flag_key=flag_key, interval=interval, slices=[ExposureSlice(**s) for s in slices])
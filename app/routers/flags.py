@@ -1,28 +1,127 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
-from app.deps import require_tenant
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.deps import get_db, get_read_db, get_actor, require_tenant, require_scopes
+from app.models import Flag
 from app.schemas import FlagIn, FlagOut
+from app.services.audit import record_audit
+from app.services.changes import ChangeEvent, bus
 
 router = APIRouter(prefix="/v1/flags", tags=["flags"])
+READ = [Depends(require_scopes("flags:r"))]
+WRITE = [Depends(require_scopes("flags:rw"))]
 
-@router.post("", response_model=FlagOut, status_code=status.HTTP_201_CREATED)
-async def create_flag(_: FlagIn, tenant: str = Depends(require_tenant)):
-    # TODO: implement idempotent create (tenant+key), persist, audit, cache bust
-    raise HTTPException(status_code=501, detail="Not implemented")
+def _fields(body: FlagIn) -> Dict[str, Any]:
+    data = body.model_dump(exclude={"key"})
+    return {k: data[k] for k in ("description", "state", "variants", "rules")}
 
-@router.get("", response_model=List[FlagOut])
-async def list_flags(tenant: str = Depends(require_tenant)):
-    # TODO: pagination & filters
-    raise HTTPException(status_code=501, detail="Not implemented")
+def _snapshot(flag: Flag) -> Dict[str, Any]:
+    return {"description": flag.description, "state": flag.state, "variants": flag.variants, "rules": flag.rules}
 
-@router.get("/{key}", response_model=FlagOut)
-async def get_flag(key: str, tenant: str = Depends(require_tenant)):
-    raise HTTPException(status_code=501, detail="Not implemented")
+def _out(flag: Flag) -> FlagOut:
+    return FlagOut(key=flag.key, **_snapshot(flag))
 
-@router.put("/{key}", response_model=FlagOut)
-async def update_flag(key: str, _: FlagIn, tenant: str = Depends(require_tenant)):
-    raise HTTPException(status_code=501, detail="Not implemented")
+async def _get(db: AsyncSession, tenant: str, key: str, include_deleted: bool = False) -> Optional[Flag]:
+    stmt = select(Flag).where(Flag.tenant_id == tenant, Flag.key == key)
+    if not include_deleted:
+        stmt = stmt.where(Flag.deleted_at.is_(None))
+    return (await db.execute(stmt)).scalar_one_or_none()
 
-@router.delete("/{key}", status_code=204)
-async def delete_flag(key: str, tenant: str = Depends(require_tenant)):
-    raise HTTPException(status_code=501, detail="Not implemented")
+async def _publish(flag: Flag, action: str):
+    await bus.publish(ChangeEvent(flag.tenant_id, "flag", flag.key, flag.updated_at.isoformat(), action))
+
+@router.post("", response_model=FlagOut, status_code=status.HTTP_201_CREATED, dependencies=WRITE)
+async def create_flag(body: FlagIn, response: Response, tenant: str = Depends(require_tenant),
+                      db: AsyncSession = Depends(get_db), actor: str = Depends(get_actor)):
+    """Idempotent upsert by (tenant, key): 201 when created (or revived after delete), 200 otherwise."""
+    try:
+        return await _upsert(db, body, response, tenant, actor)
+    except IntegrityError:
+        # A concurrent create of the same key won the insert; apply ours over it.
+        await db.rollback()
+        return await _upsert(db, body, response, tenant, actor)
+
+async def _upsert(db: AsyncSession, body: FlagIn, response: Response, tenant: str, actor: str) -> FlagOut:
+    fields = _fields(body)
+    flag = await _get(db, tenant, body.key, include_deleted=True)
+    action = "create"
+    if flag is not None and flag.deleted_at is None:
+        response.status_code = status.HTTP_200_OK
+        before = _snapshot(flag)
+        if before == fields:
+            return _out(flag)
+        for k, v in fields.items():
+            setattr(flag, k, v)
+        action = "update"
+        await record_audit(db, tenant, actor, "flag", body.key, "update", before, fields)
+    elif flag is not None:
+        for k, v in fields.items():
+            setattr(flag, k, v)
+        flag.deleted_at = None
+        await record_audit(db, tenant, actor, "flag", body.key, "create", None, fields)
+    else:
+        flag = Flag(tenant_id=tenant, key=body.key, **fields)
+        db.add(flag)
+        await record_audit(db, tenant, actor, "flag", body.key, "create", None, fields)
+    await db.commit()
+    await _publish(flag, action)
+    return _out(flag)
+
+@router.get("", response_model=List[FlagOut], dependencies=READ)
+async def list_flags(
+    tenant: str = Depends(require_tenant),
+    db: AsyncSession = Depends(get_read_db),
+    limit: int = Query(50, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    state: Optional[str] = Query(None, pattern="^(on|off)$"),
+    q: Optional[str] = Query(None, description="Substring match on key or description"),
+):
+    """Active flags ordered by key; paginate with `limit`/`offset`."""
+    stmt = select(Flag).where(Flag.tenant_id == tenant, Flag.deleted_at.is_(None))
+    if state:
+        stmt = stmt.where(Flag.state == state)
+    if q:
+        like = f"%{q}%"
+        stmt = stmt.where(or_(Flag.key.like(like), Flag.description.like(like)))
+    rows = (await db.execute(stmt.order_by(Flag.key).limit(limit).offset(offset))).scalars().all()
+    return [_out(f) for f in rows]
+
+@router.get("/{key}", response_model=FlagOut, dependencies=READ)
+async def get_flag(key: str, tenant: str = Depends(require_tenant), db: AsyncSession = Depends(get_read_db)):
+    flag = await _get(db, tenant, key)
+    if flag is None:
+        raise HTTPException(status_code=404, detail="Flag not found")
+    return _out(flag)
+
+@router.put("/{key}", response_model=FlagOut, dependencies=WRITE)
+async def update_flag(key: str, body: FlagIn, tenant: str = Depends(require_tenant),
+                      db: AsyncSession = Depends(get_db), actor: str = Depends(get_actor)):
+    flag = await _get(db, tenant, key)
+    if flag is None:
+        raise HTTPException(status_code=404, detail="Flag not found")
+    before, fields = _snapshot(flag), _fields(body)
+    if before == fields:
+        return _out(flag)
+    for k, v in fields.items():
+        setattr(flag, k, v)
+    await record_audit(db, tenant, actor, "flag", key, "update", before, fields)
+    await db.commit()
+    await _publish(flag, "update")
+    return _out(flag)
+
+@router.delete("/{key}", status_code=204, dependencies=WRITE)
+async def delete_flag(key: str, tenant: str = Depends(require_tenant),
+                      db: AsyncSession = Depends(get_db), actor: str = Depends(get_actor)):
+    """Soft delete: sets deleted_at; the flag stops listing and evaluating."""
+    flag = await _get(db, tenant, key)
+    if flag is None:
+        raise HTTPException(status_code=404, detail="Flag not found")
+    before = _snapshot(flag)
+    flag.deleted_at = datetime.utcnow()
+    await record_audit(db, tenant, actor, "flag", key, "delete", before, None, durable=True)
+    await db.commit()
+    await _publish(flag, "delete")
+    return Response(status_code=204)
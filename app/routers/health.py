@@ -1,5 +1,6 @@
 from fastapi import APIRouter
 from fastapi.responses import PlainTextResponse
+from app.services.snapshot import warm
 
 router = APIRouter()
 
@@ -7,4 +8,8 @@ router = APIRouter()
 async def healthz(): return "ok"
 
 @router.get("/readyz", response_class=PlainTextResponse)
-async def readyz(): return "ready"
+async def readyz():
+    """503 until this worker's caches are warm (see app.services.snapshot)."""
+    if not warm.ready.is_set():
+        return PlainTextResponse("warming", status_code=503)
+    return "ready"
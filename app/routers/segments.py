@@ -1,39 +1,119 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from app.deps import get_db, require_tenant
+from sqlalchemy.exc import IntegrityError
+from app.config import settings
+from app.deps import fresh_reads, get_db, get_read_db, get_actor, require_tenant, require_scopes
 from app.schemas import SegmentIn, SegmentOut
 from app.models import Segment
 from app.services.audit import record_audit
 from app.services.cache import TTLCache
+from app.services.changes import ChangeEvent, bus
 
 router = APIRouter(prefix="/v1/segments", tags=["segments"])
+READ = [Depends(require_scopes("segments:r"))]
+WRITE = [Depends(require_scopes("segments:rw"))]
+cache = TTLCache(ttl_seconds=settings.cache_ttl_seconds, max_entries=settings.cache_max_entries, name="segments")
 
-@router.post("", response_model=SegmentOut, status_code=status.HTTP_201_CREATED)
-async def create_segment(_: SegmentIn, tenant: str = Depends(require_tenant)):
-    # TODO (candidate):
-    # - Idempotent create by (tenant, key)
-    # - Persist criteria (JSON) and timestamps
-    # - Record audit entry; invalidate any segment caches
-    raise HTTPException(status_code=501, detail="Not implemented")
+@bus.subscribe
+def _on_change(event: ChangeEvent):
+    if event.entity == "segment":
+        cache.invalidate(f"{event.tenant}:segment:{event.key}")
+        fresh_reads.mark(f"{event.tenant}:segment:{event.key}")
+    elif event.entity == "tenant":
+        cache.invalidate_prefix(f"{event.tenant}:")
+        fresh_reads.mark_prefix(f"{event.tenant}:")
+    elif event.entity == "all":
+        cache.clear()
+        fresh_reads.mark_prefix("")
 
-@router.get("", response_model=List[SegmentOut])
-async def list_segments(tenant: str = Depends(require_tenant)):
-    # TODO (candidate): Pagination + optional filters
-    raise HTTPException(status_code=501, detail="Not implemented")
+async def _get(db: AsyncSession, tenant: str, key: str) -> Optional[Segment]:
+    return (await db.execute(select(Segment).where(Segment.tenant_id == tenant, Segment.key == key))).scalar_one_or_none()
 
-@router.get("/{key}", response_model=SegmentOut)
+@router.post("", response_model=SegmentOut, status_code=status.HTTP_201_CREATED, dependencies=WRITE)
+async def create_segment(body: SegmentIn, response: Response, tenant: str = Depends(require_tenant),
+                         db: AsyncSession = Depends(get_db), actor: str = Depends(get_actor)):
+    """Idempotent upsert by (tenant, key): 201 when created, 200 otherwise."""
+    try:
+        return await _upsert(db, body, response, tenant, actor)
+    except IntegrityError:
+        # A concurrent create of the same key won the insert; apply ours over it.
+        await db.rollback()
+        return await _upsert(db, body, response, tenant, actor)
+
+async def _upsert(db: AsyncSession, body: SegmentIn, response: Response, tenant: str, actor: str) -> SegmentOut:
+    seg = await _get(db, tenant, body.key)
+    action = "create"
+    if seg is not None:
+        action = "update"
+        response.status_code = status.HTTP_200_OK
+        if seg.criteria == body.criteria:
+            return SegmentOut(key=seg.key, criteria=seg.criteria)
+        before = {"criteria": seg.criteria}
+        seg.criteria = body.criteria
+        await record_audit(db, tenant, actor, "segment", body.key, "update", before, {"criteria": body.criteria})
+    else:
+        seg = Segment(tenant_id=tenant, key=body.key, criteria=body.criteria)
+        db.add(seg)
+        await record_audit(db, tenant, actor, "segment", body.key, "create", None, {"criteria": body.criteria})
+    await db.commit()
+    await bus.publish(ChangeEvent(tenant, "segment", seg.key, seg.updated_at.isoformat(), action))
+    return SegmentOut(key=seg.key, criteria=seg.criteria)
+
+@router.get("", response_model=List[SegmentOut], dependencies=READ)
+async def list_segments(
+    tenant: str = Depends(require_tenant),
+    db: AsyncSession = Depends(get_read_db),
+    limit: int = Query(50, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    q: Optional[str] = Query(None, description="Substring match on key"),
+):
+    """Segments ordered by key; paginate with `limit`/`offset`."""
+    stmt = select(Segment).where(Segment.tenant_id == tenant)
+    if q:
+        stmt = stmt.where(Segment.key.like(f"%{q}%"))
+    rows = (await db.execute(stmt.order_by(Segment.key).limit(limit).offset(offset))).scalars().all()
+    return [SegmentOut(key=s.key, criteria=s.criteria) for s in rows]
+
+@router.get("/{key}", response_model=SegmentOut, dependencies=READ)
 async def get_segment(key: str, tenant: str = Depends(require_tenant)):
-    # TODO (candidate): Fetch by (tenant, key); 404 when missing
-    raise HTTPException(status_code=501, detail="Not implemented")
-
-@router.put("/{key}", response_model=SegmentOut)
-async def update_segment(key: str, _: SegmentIn, tenant: str = Depends(require_tenant)):
-    # TODO (candidate): Update criteria; audit before/after; cache-bust
-    raise HTTPException(status_code=501, detail="Not implemented")
-
-@router.delete("/{key}", status_code=204)
-async def delete_segment(key: str, tenant: str = Depends(require_tenant)):
-    # TODO (candidate): Soft-delete or hard-delete; audit; cache-bust
-    raise HTTPException(status_code=501, detail="Not implemented")
\ No newline at end of file
+    ck = f"{tenant}:segment:{key}"
+    out = cache.get(ck)
+    if out is None:
+        async with fresh_reads.session(ck)() as db:
+            seg = await _get(db, tenant, key)
+        if seg is None:
+            raise HTTPException(status_code=404, detail="Segment not found")
+        out = SegmentOut(key=seg.key, criteria=seg.criteria)
+        cache.set(ck, out)
+    return out
+
+@router.put("/{key}", response_model=SegmentOut, dependencies=WRITE)
+async def update_segment(key: str, body: SegmentIn, tenant: str = Depends(require_tenant),
+                         db: AsyncSession = Depends(get_db), actor: str = Depends(get_actor)):
+    seg = await _get(db, tenant, key)
+    if seg is None:
+        raise HTTPException(status_code=404, detail="Segment not found")
+    if seg.criteria != body.criteria:
+        before = {"criteria": seg.criteria}
+        seg.criteria = body.criteria
+        await record_audit(db, tenant, actor, "segment", key, "update", before, {"criteria": body.criteria})
+        await db.commit()
+        await bus.publish(ChangeEvent(tenant, "segment", key, seg.updated_at.isoformat(), "update"))
+    return SegmentOut(key=seg.key, criteria=seg.criteria)
+
+@router.delete("/{key}", status_code=204, dependencies=WRITE)
+async def delete_segment(key: str, tenant: str = Depends(require_tenant),
+                         db: AsyncSession = Depends(get_db), actor: str = Depends(get_actor)):
+    """Hard delete; rules still naming the segment simply stop matching."""
+    seg = await _get(db, tenant, key)
+    if seg is None:
+        raise HTTPException(status_code=404, detail="Segment not found")
+    # Durable: the polling change bus learns about hard deletes from this row.
+    await record_audit(db, tenant, actor, "segment", key, "delete", {"criteria": seg.criteria}, None, durable=True)
+    await db.delete(seg)
+    await db.commit()
+    await bus.publish(ChangeEvent(tenant, "segment", key, datetime.utcnow().isoformat(), "delete"))
+    return Response(status_code=204)
@@ -0,0 +1,22 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, Header
+from fastapi.responses import StreamingResponse
+from app.deps import require_tenant, require_scopes
+from app.services.stream import feed
+
+router = APIRouter(prefix="/v1", tags=["stream"])
+READ = [Depends(require_scopes("flags:r"))]
+
+@router.get("/stream", dependencies=READ)
+async def change_stream(tenant: str = Depends(require_tenant), last_event_id: Optional[str] = Header(None)):
+    """
+    Server-sent events for the tenant's flag and segment writes:
+    `event: change` with {entity, key, version, action}. Reconnect with
+    Last-Event-ID to replay what was missed; `event: reset` means the gap
+    can't be replayed and the client should refetch (e.g. GET /v1/ruleset).
+    """
+    return StreamingResponse(
+        feed.listen(tenant, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,3 +1,4 @@
+from datetime import datetime
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel, Field
 
@@ -50,8 +51,47 @@ class EvaluateRequest(BaseModel):
     flag_key: str
     user: Dict[str, Any]
 
+class EvaluateBatchRequest(BaseModel):
+    flag_keys: Optional[List[str]] = None  # None evaluates every active flag
+    users: List[Dict[str, Any]] = Field(min_length=1)
+
+class EvaluateAllRequest(BaseModel):
+    user: Dict[str, Any]
+
 class EvaluateResponse(BaseModel):
     variant: str
     reason: str
     rule_id: Optional[str] = None
     details: Dict[str, Any] = {}
+
+class SegmentMatchRequest(BaseModel):
+    user: Dict[str, Any]
+
+class SegmentMatchResponse(BaseModel):
+    segments: List[str]
+
+class AuditOut(BaseModel):
+    id: int
+    ts: str
+    actor: str
+    entity: str
+    entity_key: str
+    action: str
+    before: Optional[Dict[str, Any]] = None
+    after: Optional[Dict[str, Any]] = None
+
+class AuditPage(BaseModel):
+    items: List[AuditOut]
+    next_cursor: Optional[str] = None
+
+class ExposureSlice(BaseModel):
+    start: datetime
+    variant: str
+    rule_id: Optional[str] = None
+    count: int
+    unique_users: Optional[int] = None
+
+class ExposureReport(BaseModel):
+    flag_key: str
+    interval: int
+    slices: List[ExposureSlice]
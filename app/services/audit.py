@@ -1,16 +1,319 @@
 # app/services/audit.py
-from typing import Optional
+import asyncio
+import base64
+import json
+import logging
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
 from datetime import datetime
 
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import and_, event, insert, or_, select
+from sqlalchemy.exc import InterfaceError, OperationalError, TimeoutError as PoolTimeout
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy.orm import Session
 
+from app.config import settings
+from app.deps import SessionLocal
 from app.models import Audit
 
-async def record_audit(db: AsyncSession, tenant: str, actor: str, entity: str, entity_key: str, action: str, before, after):
-    # TODO: persist audit entries
-    return
+log = logging.getLogger(__name__)
+# Audit rows the writer gave up on, one record each with the full entry, for replay.
+dead_letters = logging.getLogger(__name__ + ".dead_letter")
 
-async def list_audit(db: AsyncSession, tenant: str, *, entity: Optional[str]=None, entity_key: Optional[str]=None, limit: int=100):
-    # TODO: query & filter audit log
-    raise NotImplementedError("audit listing not implemented")
+AUDIT_QUEUE_DEPTH = Gauge("audit_queue_depth", "Audit entries committed but not yet written")
+AUDIT_FLUSH_SECONDS = Histogram("audit_flush_seconds", "Latency of one batched audit INSERT",
+                                buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+AUDIT_ROWS = Counter("audit_rows_total", "Audit rows written", ["mode"])
+AUDIT_FLUSH_FAILURES = Counter("audit_flush_failures_total", "Batched audit INSERTs that failed")
+AUDIT_DEAD_LETTERS = Counter("audit_dead_letter_total", "Audit rows dropped to the dead-letter log", ["reason"])
+
+# Failures that say nothing about the rows themselves (connection loss, locks, pool exhaustion).
+_TRANSIENT = (OperationalError, InterfaceError, PoolTimeout, OSError, asyncio.TimeoutError)
+
+_PENDING = "audit_pending"
+
+
+class AuditWriter:
+    """
+    Background writer that turns audit entries into multi-row INSERTs.
+
+    Entries are staged on the caller's session and only queued when that
+    session commits, so a rolled-back change never produces an audit row.
+    Capacity is reserved at staging time; when the queue is full the entry
+    is either written in the caller's transaction (`on_full="sync"`) or the
+    caller waits for the flusher to make room (`on_full="block"`).
+
+    A failed flush is retried with exponential backoff (capped at
+    `retry_max_seconds`). After `max_retries` failures in a row the front
+    batch is bisected: the halves that insert are kept, and a row that fails
+    on its own goes to the dead-letter log instead of blocking the queue.
+    Transient errors (see _TRANSIENT) never condemn rows; they just retry.
+    """
+
+    def __init__(self, max_queue: int = 10_000, batch_size: int = 500, flush_interval: float = 0.2, on_full: str = "sync",
+                 max_retries: int = 5, retry_max_seconds: float = 30.0):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_full = on_full
+        self.max_retries = max_retries
+        self.retry_max_seconds = retry_max_seconds
+        self._queue: Deque[Dict[str, Any]] = deque()
+        self._reserved = 0
+        self._wakeup = asyncio.Event()
+        self._space = asyncio.Event()
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._stopping = False
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def _has_room(self) -> bool:
+        return len(self._queue) + self._reserved < self.max_queue
+
+    async def stage(self, db: AsyncSession, entry: Dict[str, Any]) -> bool:
+        """Stage `entry` on `db`; False means no room and the caller must write it itself."""
+        while not self._has_room():
+            if self.on_full != "block":
+                return False
+            self._space.clear()
+            await self._space.wait()
+        if not db.in_transaction():
+            db.sync_session.begin()
+        db.info.setdefault(_PENDING, []).append(entry)
+        self._reserved += 1
+        return True
+
+    def _committed(self, entries: List[Dict[str, Any]]):
+        self._reserved -= len(entries)
+        self._queue.extend(entries)
+        AUDIT_QUEUE_DEPTH.set(len(self._queue))
+        if len(self._queue) >= self.batch_size:
+            self._wakeup.set()
+
+    def _released(self, entries: List[Dict[str, Any]]):
+        self._reserved -= len(entries)
+        self._space.set()
+
+    async def start(self):
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flusher after writing everything already queued (or dead-lettering what can't be)."""
+        if self._task is not None:
+            # Let a write in progress finish: cancelling it mid-statement can leave the connection holding locks.
+            self._stopping = True
+            self._wakeup.set()
+            try:
+                await self._task
+            finally:
+                self._task = None
+                self._stopping = False
+        while self._queue:
+            try:
+                await self.flush()
+            except Exception:
+                try:
+                    await self._isolate()
+                except Exception as e:
+                    log.exception("audit writer stopping with unwritten entries")
+                    while self._queue:
+                        self._dead_letter(self._queue.popleft(), "shutdown", e)
+                    AUDIT_QUEUE_DEPTH.set(0)
+
+    async def _run(self):
+        failures = 0
+        while not self._stopping:
+            delay = self.flush_interval if not failures else min(self.flush_interval * 2 ** failures,
+                                                                 self.retry_max_seconds)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while self._queue and not self._stopping:
+                try:
+                    if failures >= self.max_retries:
+                        log.error("audit flush keeps failing; isolating bad rows", extra={"attempts": failures})
+                        await self._isolate()
+                    else:
+                        await self.flush()
+                    failures = 0
+                except Exception:
+                    failures += 1
+                    log.exception("audit flush failed; retrying", extra={"attempts": failures})
+                    break
+
+    def _take(self) -> List[Dict[str, Any]]:
+        return [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+
+    async def _write(self, batch: List[Dict[str, Any]]):
+        start = time.perf_counter()
+        try:
+            async with SessionLocal() as db:
+                await db.execute(insert(Audit), batch)
+                await db.commit()
+        except Exception:
+            AUDIT_FLUSH_FAILURES.inc()
+            raise
+        AUDIT_FLUSH_SECONDS.observe(time.perf_counter() - start)
+        AUDIT_ROWS.labels(mode="batched").inc(len(batch))
+
+    async def flush(self):
+        batch = self._take()
+        if not batch:
+            return
+        try:
+            await self._write(batch)
+        except BaseException:
+            self._queue.extendleft(reversed(batch))
+            raise
+        finally:
+            AUDIT_QUEUE_DEPTH.set(len(self._queue))
+        self._space.set()
+
+    async def _isolate(self):
+        """
+        Write the front batch in bisected chunks down to single rows, dead-
+        lettering rows that fail alone. A transient error puts everything not
+        yet written back at the front of the queue and re-raises.
+        """
+        pending = [self._take()]  # a stack: the last chunk holds the oldest rows
+        try:
+            while pending:
+                rows = pending.pop()
+                if not rows:
+                    continue
+                try:
+                    await self._write(rows)
+                except _TRANSIENT:
+                    pending.append(rows)
+                    raise
+                except Exception as e:
+                    if len(rows) == 1:
+                        self._dead_letter(rows[0], "rejected", e)
+                    else:
+                        mid = len(rows) // 2
+                        pending += [rows[mid:], rows[:mid]]
+                except BaseException:
+                    pending.append(rows)
+                    raise
+        finally:
+            for rows in pending:
+                self._queue.extendleft(reversed(rows))
+            AUDIT_QUEUE_DEPTH.set(len(self._queue))
+            self._space.set()
+
+    @staticmethod
+    def _dead_letter(entry: Dict[str, Any], reason: str, error: BaseException):
+        AUDIT_DEAD_LETTERS.labels(reason).inc()
+        dead_letters.error("audit entry dropped", extra={"audit_entry": entry, "reason": reason, "error": repr(error)})
+
+
+writer = AuditWriter(
+    max_queue=settings.audit_queue_size,
+    batch_size=settings.audit_batch_size,
+    flush_interval=settings.audit_flush_seconds,
+    on_full=settings.audit_on_full,
+    max_retries=settings.audit_max_retries,
+    retry_max_seconds=settings.audit_retry_max_seconds,
+)
+
+
+@event.listens_for(Session, "after_commit")
+def _audit_after_commit(session: Session):
+    entries = session.info.pop(_PENDING, None)
+    if entries:
+        writer._committed(entries)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _audit_after_transaction_end(session: Session, transaction):
+    if transaction.parent is None:
+        entries = session.info.pop(_PENDING, None)
+        if entries:  # rolled back or closed without commit
+            writer._released(entries)
+
+
+async def record_audit(db: AsyncSession, tenant: str, actor: str, entity: str, entity_key: str, action: str, before, after,
+                       *, durable: bool = False):
+    """
+    Record an audit entry for a change made on `db`.
+
+    With AUDIT_MODE=async (and the writer running) the row is written by the
+    background batcher once `db` commits. `durable=True`, AUDIT_MODE=transactional
+    or a full queue add it to the caller's transaction instead, so it commits
+    or rolls back with the change.
+    """
+    entry = dict(tenant_id=tenant, actor=actor, entity=entity, entity_key=entity_key,
+                 action=action, before=before, after=after, ts=datetime.utcnow())
+    if not durable and settings.audit_mode == "async" and writer.running:
+        if await writer.stage(db, entry):
+            return
+        AUDIT_ROWS.labels(mode="sync_fallback").inc()
+    else:
+        AUDIT_ROWS.labels(mode="transactional").inc()
+    db.add(Audit(**entry))
+
+def audit_to_dict(a: Audit) -> Dict[str, Any]:
+    return {
+        "id": a.id, "ts": a.ts.isoformat(), "actor": a.actor, "entity": a.entity,
+        "entity_key": a.entity_key, "action": a.action, "before": a.before, "after": a.after,
+    }
+
+def encode_cursor(ts: datetime, id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([ts.isoformat(), id]).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_cursor; raises ValueError on anything malformed."""
+    try:
+        ts, id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(ts), int(id)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError("invalid cursor") from e
+
+def _filtered(tenant: str, entity: Optional[str], entity_key: Optional[str], since: Optional[datetime], until: Optional[datetime]):
+    stmt = select(Audit).where(Audit.tenant_id == tenant)
+    if entity:
+        stmt = stmt.where(Audit.entity == entity)
+    if entity_key:
+        stmt = stmt.where(Audit.entity_key == entity_key)
+    if since:
+        stmt = stmt.where(Audit.ts >= since)
+    if until:
+        stmt = stmt.where(Audit.ts < until)
+    return stmt
+
+async def list_audit(db: AsyncSession, tenant: str, *, entity: Optional[str]=None, entity_key: Optional[str]=None,
+                     since: Optional[datetime]=None, until: Optional[datetime]=None,
+                     cursor: Optional[str]=None, limit: int=100) -> Tuple[List[Audit], Optional[str]]:
+    """
+    Newest-first page of audit entries plus the cursor for the next page (None on the last).
+
+    Keyset pagination on (ts, id) over ix_audit_tenant_ts: each page costs the
+    same however deep it is, and rows inserted meanwhile don't shift pages.
+    """
+    stmt = _filtered(tenant, entity, entity_key, since, until)
+    if cursor:
+        c_ts, c_id = decode_cursor(cursor)
+        stmt = stmt.where(or_(Audit.ts < c_ts, and_(Audit.ts == c_ts, Audit.id < c_id)))
+    rows = list((await db.execute(stmt.order_by(Audit.ts.desc(), Audit.id.desc()).limit(limit + 1))).scalars())
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].ts, rows[-1].id)
+
+async def stream_audit(db: AsyncSession, tenant: str, *, entity: Optional[str]=None, entity_key: Optional[str]=None,
+                       since: Optional[datetime]=None, until: Optional[datetime]=None,
+                       batch_size: int=1000) -> AsyncIterator[Audit]:
+    """Oldest-first iteration over a server-side cursor, `batch_size` rows in memory at a time."""
+    stmt = _filtered(tenant, entity, entity_key, since, until).order_by(Audit.ts, Audit.id)
+    result = await db.stream(stmt.execution_options(yield_per=batch_size))
+    async for partition in result.scalars().partitions():
+        for row in partition:
+            yield row
+        db.expunge_all()
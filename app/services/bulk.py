@@ -0,0 +1,164 @@
+# app/services/bulk.py
+import json
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, AsyncIterable, AsyncIterator, Dict, List, Tuple, Type
+
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Audit, Flag, Segment
+from app.schemas import FlagIn, SegmentIn
+from app.services.changes import ChangeEvent, bus
+
+MAX_REPORTED_ERRORS = 100
+
+
+@dataclass
+class ImportReport:
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    failed: int = 0
+    errors: List[Dict[str, Any]] = field(default_factory=list)
+
+    def error(self, line: int, message: Any):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": message})
+
+
+@dataclass(frozen=True)
+class _Kind:
+    entity: str
+    model: Type[Any]
+    schema: Type[BaseModel]
+    fields: Tuple[str, ...]
+
+
+FLAGS = _Kind("flag", Flag, FlagIn, ("description", "state", "variants", "rules"))
+SEGMENTS = _Kind("segment", Segment, SegmentIn, ("criteria",))
+KINDS = {"flags": FLAGS, "segments": SEGMENTS}
+
+
+async def iter_ndjson(chunks: AsyncIterable[bytes]) -> AsyncIterator[Tuple[int, Any]]:
+    """(line_number, parsed JSON or the ValueError) for each non-blank line of a byte stream."""
+    buf = b""
+    lineno = 0
+
+    def parse(raw: bytes):
+        try:
+            return json.loads(raw)
+        except ValueError as e:
+            return e
+
+    async for chunk in chunks:
+        buf += chunk
+        *lines, buf = buf.split(b"\n")
+        for raw in lines:
+            lineno += 1
+            if raw.strip():
+                yield lineno, parse(raw)
+    if buf.strip():
+        yield lineno + 1, parse(buf)
+
+
+def insert_for(db: AsyncSession):
+    """The dialect's INSERT construct, for ON CONFLICT upserts on SQLite and Postgres."""
+    if db.bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        return pg_insert
+    from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+    return sqlite_insert
+
+
+async def _upsert_chunk(db: AsyncSession, kind: _Kind, tenant: str, actor: str,
+                        items: List[Dict[str, Any]], report: ImportReport):
+    model = kind.model
+    existing = {}
+    stmt = select(model).where(model.tenant_id == tenant, model.key.in_([i["key"] for i in items]))
+    for row in (await db.execute(stmt)).scalars():
+        live = getattr(row, "deleted_at", None) is None
+        existing[row.key] = {f: getattr(row, f) for f in kind.fields} if live else None
+
+    now = datetime.utcnow()
+    rows, audits = [], []
+    for item in items:
+        after = {f: item[f] for f in kind.fields}
+        before = existing.get(item["key"])
+        if before == after:
+            report.unchanged += 1
+            continue
+        action = "update" if before is not None else "create"
+        if action == "update":
+            report.updated += 1
+        else:
+            report.created += 1
+        row = {"tenant_id": tenant, "key": item["key"], **after, "created_at": now, "updated_at": now}
+        if kind is FLAGS:
+            row["deleted_at"] = None
+        rows.append(row)
+        audits.append(dict(tenant_id=tenant, actor=actor, entity=kind.entity, entity_key=item["key"],
+                           action=action, before=before, after=after, ts=now))
+    if not rows:
+        return
+    ins = insert_for(db)(model).values(rows)
+    update_cols = kind.fields + ("updated_at",) + (("deleted_at",) if kind is FLAGS else ())
+    await db.execute(ins.on_conflict_do_update(
+        index_elements=["tenant_id", "key"],
+        set_={c: ins.excluded[c] for c in update_cols},
+    ))
+    await db.execute(insert(Audit), audits)
+
+
+async def import_entities(db: AsyncSession, kind: _Kind, tenant: str, actor: str,
+                          records: AsyncIterable[Tuple[int, Any]], chunk_size: int = 500) -> ImportReport:
+    """
+    Validate NDJSON records against FlagIn/SegmentIn in chunks and upsert each
+    chunk with one INSERT .. ON CONFLICT (tenant_id, key) plus one multi-row
+    audit INSERT, committing per chunk. Invalid lines are reported and skipped;
+    the last occurrence of a key within a chunk wins. Caches are invalidated
+    once for the tenant at the end.
+    """
+    report = ImportReport()
+    chunk: Dict[str, Dict[str, Any]] = {}
+    try:
+        async for lineno, record in records:
+            if isinstance(record, ValueError):
+                report.error(lineno, f"invalid JSON: {record}")
+                continue
+            try:
+                item = kind.schema.model_validate(record).model_dump(mode="json")
+            except ValidationError as e:
+                report.error(lineno, e.errors(include_url=False, include_context=False))
+                continue
+            chunk[item["key"]] = item
+            if len(chunk) >= chunk_size:
+                await _upsert_chunk(db, kind, tenant, actor, list(chunk.values()), report)
+                await db.commit()
+                chunk.clear()
+        if chunk:
+            await _upsert_chunk(db, kind, tenant, actor, list(chunk.values()), report)
+            await db.commit()
+    finally:
+        if report.created or report.updated:
+            await bus.publish(ChangeEvent.tenant_wide(tenant))
+    return report
+
+
+def _export_row(kind: _Kind, row: Any) -> Dict[str, Any]:
+    return {"key": row.key, **{f: getattr(row, f) for f in kind.fields}}
+
+
+async def export_entities(db: AsyncSession, kind: _Kind, tenant: str, batch_size: int = 1000) -> AsyncIterator[Dict[str, Any]]:
+    """Stream a tenant's flags (active only) or segments ordered by key, `batch_size` rows at a time."""
+    model = kind.model
+    stmt = select(model).where(model.tenant_id == tenant)
+    if kind is FLAGS:
+        stmt = stmt.where(Flag.deleted_at.is_(None))
+    result = await db.stream(stmt.order_by(model.key).execution_options(yield_per=batch_size))
+    async for partition in result.scalars().partitions():
+        for row in partition:
+            yield _export_row(kind, row)
+        db.expunge_all()
@@ -1,25 +1,206 @@
+import asyncio
 import time
-from typing import Any
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from prometheus_client import Counter
+
+CACHE_HITS = Counter("cache_hits_total", "Cache hits", ["cache", "state"])
+CACHE_MISSES = Counter("cache_misses_total", "Cache misses", ["cache"])
+CACHE_EVICTIONS = Counter("cache_evictions_total", "Cache evictions", ["cache", "reason"])
+CACHE_COALESCED = Counter("cache_loads_coalesced_total", "Loads that waited on an in-flight load of the same key", ["cache"])
+
+
+class _Entry:
+    __slots__ = ("expires", "value")
+
+    def __init__(self, expires: float, value: Any):
+        self.expires = expires
+        self.value = value
+
+
+def _prefixes(key: str):
+    """':'-delimited prefixes of a key: 'acme:flag:x' -> 'acme:', 'acme:flag:'."""
+    i = key.find(":")
+    while i != -1:
+        yield key[: i + 1]
+        i = key.find(":", i + 1)
+
 
 class TTLCache:
-    def __init__(self, ttl_seconds: int = 30):
+    """
+    Bounded LRU cache with per-entry TTL.
+
+    Keys are ':'-delimited strings whose first segment is the tenant
+    (e.g. 'acme:flag:new_checkout'). Each tenant holds at most `tenant_quota`
+    entries and the whole cache at most `max_entries`. `invalidate_prefix` on a
+    ':' boundary is served from an index instead of scanning the store.
+
+    `get_or_load` adds single-flight loading (concurrent misses share one
+    loader call) and stale-while-revalidate: for `stale_seconds` past expiry
+    the old value is served while one background task refreshes it.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: int = 30,
+        *,
+        max_entries: int = 10_000,
+        tenant_quota: Optional[int] = None,
+        stale_seconds: float = 0,
+        name: str = "default",
+    ):
         self.ttl = ttl_seconds
-        self.store: dict[str, tuple[float, Any]] = {}
+        self.max_entries = max_entries
+        self.tenant_quota = tenant_quota
+        self.stale = stale_seconds
+        self.name = name
+        self.store: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._index: Dict[str, Set[str]] = {}
+        self._tenants: Dict[str, "OrderedDict[str, None]"] = {}
+        self._inflight: Dict[str, "asyncio.Task[Any]"] = {}
+        self._hit = CACHE_HITS.labels(cache=name, state="fresh")
+        self._stale_hit = CACHE_HITS.labels(cache=name, state="stale")
+        self._miss = CACHE_MISSES.labels(cache=name)
+        self._coalesced = CACHE_COALESCED.labels(cache=name)
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def _touch(self, key: str):
+        self.store.move_to_end(key)
+        self._tenants[key.split(":", 1)[0]].move_to_end(key)
+
+    def _remove(self, key: str, reason: str):
+        if self.store.pop(key, None) is None:
+            return
+        for p in _prefixes(key):
+            keys = self._index.get(p)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._index[p]
+        tenant = key.split(":", 1)[0]
+        tkeys = self._tenants.get(tenant)
+        if tkeys is not None:
+            tkeys.pop(key, None)
+            if not tkeys:
+                del self._tenants[tenant]
+        CACHE_EVICTIONS.labels(cache=self.name, reason=reason).inc()
 
     def get(self, key: str):
         v = self.store.get(key)
-        if not v:
+        if v is None:
+            self._miss.inc()
             return None
-        expires, data = v
-        if time.time() > expires:
-            self.store.pop(key, None)
+        if time.monotonic() > v.expires:
+            if time.monotonic() > v.expires + self.stale:
+                self._remove(key, "expired")
+            self._miss.inc()
             return None
-        return data
+        self._touch(key)
+        self._hit.inc()
+        return v.value
 
     def set(self, key: str, value: Any):
-        self.store[key] = (time.time() + self.ttl, value)
+        now = time.monotonic()
+        if key in self.store:
+            self.store[key] = _Entry(now + self.ttl, value)
+            self._touch(key)
+            return
+        self._sweep(now)
+        tenant = key.split(":", 1)[0]
+        tkeys = self._tenants.setdefault(tenant, OrderedDict())
+        if self.tenant_quota is not None and len(tkeys) >= self.tenant_quota:
+            self._remove(next(iter(tkeys)), "quota")
+            tkeys = self._tenants.setdefault(tenant, OrderedDict())
+        while len(self.store) >= self.max_entries:
+            self._remove(next(iter(self.store)), "lru")
+        self.store[key] = _Entry(now + self.ttl, value)
+        tkeys[key] = None
+        for p in _prefixes(key):
+            self._index.setdefault(p, set()).add(key)
+
+    def _sweep(self, now: float, budget: int = 4):
+        # Amortized cleanup: drop a few dead entries from the LRU end per write.
+        it = iter(self.store.items())
+        dead = []
+        for _ in range(budget):
+            item = next(it, None)
+            if item is None:
+                break
+            if now > item[1].expires + self.stale:
+                dead.append(item[0])
+        for k in dead:
+            self._remove(k, "expired")
+
+    def purge_expired(self):
+        now = time.monotonic()
+        for k in [k for k, e in self.store.items() if now > e.expires + self.stale]:
+            self._remove(k, "expired")
+
+    def invalidate(self, key: str):
+        # Detaching the in-flight load keeps its result, which may predate the write, out of the cache.
+        self._inflight.pop(key, None)
+        self._remove(key, "invalidated")
 
     def invalidate_prefix(self, prefix: str):
-        for k in list(self.store.keys()):
-            if k.startswith(prefix):
-                self.store.pop(k, None)
+        for k in [k for k in self._inflight if k.startswith(prefix)]:
+            del self._inflight[k]
+        keys = self._index.get(prefix)
+        if keys is None and not prefix.endswith(":"):
+            keys = {k for k in self.store if k.startswith(prefix)}
+        for k in list(keys or ()):
+            self._remove(k, "invalidated")
+
+    def clear(self):
+        self._inflight.clear()
+        for k in list(self.store):
+            self._remove(k, "invalidated")
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Return the cached value for `key`, calling `loader` on a miss. A `None`
+        result is returned but not cached.
+        """
+        entry = self.store.get(key)
+        if entry is not None:
+            now = time.monotonic()
+            if now <= entry.expires:
+                self._touch(key)
+                self._hit.inc()
+                return entry.value
+            if now <= entry.expires + self.stale:
+                self._touch(key)
+                self._stale_hit.inc()
+                if key not in self._inflight:
+                    self._start_load(key, loader)
+                return entry.value
+            self._remove(key, "expired")
+        self._miss.inc()
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._start_load(key, loader)
+        else:
+            self._coalesced.inc()
+        # Shielded so a cancelled caller doesn't abort the load other callers share.
+        return await asyncio.shield(task)
+
+    def _start_load(self, key: str, loader: Callable[[], Awaitable[Any]]) -> "asyncio.Task[Any]":
+        task = asyncio.create_task(self._fill(key, loader))
+        self._inflight[key] = task
+        # Retrieve the exception so an unawaited failed refresh doesn't log a warning.
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return task
+
+    async def _fill(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await loader()
+        finally:
+            # Still registered unless `key` was invalidated (and perhaps reloaded) meanwhile.
+            current = self._inflight.get(key) is asyncio.current_task()
+            if current:
+                del self._inflight[key]
+        if value is not None and current:
+            self.set(key, value)
+        return value
@@ -0,0 +1,328 @@
+# app/services/changes.py
+import asyncio
+import json
+import logging
+import secrets
+from collections import Counter
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Protocol, Tuple
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.config import settings
+from app.deps import SessionLocal, engine
+from app.models import Audit, Flag, Segment
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ChangeEvent:
+    """
+    A committed write to a flag or segment. `version` is the row's updated_at
+    (ISO 8601). entity='tenant' (key '*') means "anything in the tenant may
+    have changed", used for bulk writes; entity='all' (tenant '*') means the
+    same for every tenant, used when a transport may have missed events.
+    `action` is create/update/delete when the writer knows it; the polling
+    transport can only tell update from delete.
+    """
+    tenant: str
+    entity: str  # 'flag' | 'segment' | 'tenant' | 'all'
+    key: str
+    version: str
+    action: str = "update"  # 'create' | 'update' | 'delete' | 'bulk' | 'resync'
+
+    @classmethod
+    def tenant_wide(cls, tenant: str) -> "ChangeEvent":
+        return cls(tenant, "tenant", "*", datetime.utcnow().isoformat(), "bulk")
+
+    @classmethod
+    def everything(cls) -> "ChangeEvent":
+        return cls("*", "all", "*", datetime.utcnow().isoformat(), "resync")
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, raw: str) -> "ChangeEvent":
+        return cls(**json.loads(raw))
+
+
+Handler = Callable[[ChangeEvent], None]
+Dispatch = Callable[[ChangeEvent], None]
+
+
+class Transport(Protocol):
+    """Carries events between workers. Local delivery is done by ChangeBus itself."""
+
+    async def start(self, dispatch: Dispatch) -> None: ...
+    async def publish(self, event: ChangeEvent) -> None: ...
+    async def stop(self) -> None: ...
+
+
+class InProcessTransport:
+    """Single-process backend (tests, one worker): local dispatch is all there is."""
+
+    async def start(self, dispatch: Dispatch) -> None:
+        return
+
+    async def publish(self, event: ChangeEvent) -> None:
+        return
+
+    async def stop(self) -> None:
+        return
+
+
+class PostgresNotifyTransport:
+    """
+    LISTEN on a dedicated asyncpg connection; NOTIFY through a pooled
+    connection from `engine`, so concurrent publishes never share the
+    listener's connection. Payloads carry this worker's origin token, which
+    is how it skips its own events (already dispatched locally).
+
+    A lost listener reconnects with exponential backoff, up to `retry_max`
+    seconds between attempts. Notifications sent while it was down are gone,
+    so every reconnect dispatches ChangeEvent.everything().
+    """
+
+    channel = "ff_changes"
+
+    def __init__(self, dsn: str, engine: AsyncEngine, retry_min: float = 0.5, retry_max: float = 30.0,
+                 ping_seconds: float = 30.0):
+        self.dsn = dsn.replace("postgresql+asyncpg://", "postgresql://", 1)
+        self.engine = engine
+        self.retry_min = retry_min
+        self.retry_max = retry_max
+        self.ping_seconds = ping_seconds
+        self.origin = secrets.token_hex(8)
+        self._conn: Any = None
+        self._lost = asyncio.Event()
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    async def start(self, dispatch: Dispatch) -> None:
+        await self._listen(dispatch)
+        self._task = asyncio.create_task(self._supervise(dispatch))
+
+    async def _listen(self, dispatch: Dispatch) -> None:
+        import asyncpg  # type: ignore[import-untyped]
+
+        def on_notify(conn, pid, channel, payload):
+            origin, _, raw = payload.partition(" ")
+            if origin == self.origin:
+                return
+            try:
+                dispatch(ChangeEvent.from_json(raw))
+            except (ValueError, TypeError):
+                log.warning("dropping malformed change notification", extra={"payload": payload})
+
+        self._lost.clear()
+        conn = await asyncpg.connect(self.dsn)
+        try:
+            conn.add_termination_listener(lambda c: self._lost.set())
+            await conn.add_listener(self.channel, on_notify)
+        except BaseException:
+            conn.terminate()
+            raise
+        self._conn = conn
+
+    async def _alive(self) -> bool:
+        """Wait up to ping_seconds for the listener to drop, then ping it; False once it is gone."""
+        try:
+            await asyncio.wait_for(self._lost.wait(), self.ping_seconds)
+            return False
+        except asyncio.TimeoutError:
+            pass
+        try:
+            await asyncio.wait_for(self._conn.execute("SELECT 1"), self.ping_seconds)
+            return True
+        except Exception:
+            return False
+
+    async def _supervise(self, dispatch: Dispatch) -> None:
+        while True:
+            if await self._alive():
+                continue
+            log.warning("change listener lost; reconnecting")
+            await self._close()
+            delay = self.retry_min
+            while True:
+                try:
+                    await self._listen(dispatch)
+                    break
+                except Exception:
+                    log.exception("change listener reconnect failed", extra={"retry_in": delay})
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, self.retry_max)
+            dispatch(ChangeEvent.everything())
+
+    async def publish(self, event: ChangeEvent) -> None:
+        async with self.engine.begin() as conn:
+            await conn.execute(text("SELECT pg_notify(:channel, :payload)"),
+                               {"channel": self.channel, "payload": f"{self.origin} {event.to_json()}"})
+
+    async def _close(self) -> None:
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            try:
+                await conn.close(timeout=5)
+            except Exception:
+                conn.terminate()
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._close()
+
+
+class PollingTransport:
+    """
+    Fallback for databases without LISTEN/NOTIFY (SQLite). Every `interval`
+    seconds it reads flags and segments whose updated_at reached the
+    watermark minus `overlap`, plus audit 'delete' rows by their ts the same
+    way (segment deletes are hard deletes and leave no updated_at behind).
+
+    updated_at is stamped by the writing worker before commit, so a row can
+    become visible after rows with later timestamps; re-reading the overlap
+    window catches it. Rows already reported at the same version (audit
+    rows: the same id) are skipped, so the window costs no repeat events.
+    """
+
+    # A tenant with more changes than this in one poll gets a single tenant-wide event.
+    collapse_threshold = 100
+
+    def __init__(self, interval: float = 2.0, overlap: float = 10.0):
+        self.interval = interval
+        self.overlap = timedelta(seconds=overlap)
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._wm: Dict[str, Optional[datetime]] = {"flag": None, "segment": None, "audit": None}
+        # Per scan: identity -> timestamp of what was last reported, for rows inside the window.
+        self._seen: Dict[str, Dict[Tuple[Any, ...], datetime]] = {"flag": {}, "segment": {}, "audit": {}}
+
+    async def start(self, dispatch: Dispatch) -> None:
+        async with SessionLocal() as db:
+            self._wm["flag"] = (await db.execute(select(func.max(Flag.updated_at)))).scalar()
+            self._wm["segment"] = (await db.execute(select(func.max(Segment.updated_at)))).scalar()
+            self._wm["audit"] = (await db.execute(select(func.max(Audit.ts)))).scalar()
+        await self.poll()  # only records what the overlap window already holds
+        self._task = asyncio.create_task(self._run(dispatch))
+
+    async def _run(self, dispatch: Dispatch) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                for event in await self.poll():
+                    dispatch(event)
+            except Exception:
+                log.exception("change poll failed")
+
+    def _fresh(self, scan: str, ident: Tuple[Any, ...], ts: datetime) -> bool:
+        """Whether (ident, ts) is news for `scan`; advances its watermark."""
+        seen = self._seen[scan]
+        if seen.get(ident) == ts:
+            return False
+        seen[ident] = ts
+        wm = self._wm[scan]
+        self._wm[scan] = ts if wm is None else max(wm, ts)
+        return True
+
+    def _prune(self, scan: str):
+        wm = self._wm[scan]
+        if wm is not None:
+            horizon = wm - self.overlap
+            seen = self._seen[scan]
+            for ident in [i for i, ts in seen.items() if ts < horizon]:
+                del seen[ident]
+
+    async def poll(self) -> List[ChangeEvent]:
+        events: List[ChangeEvent] = []
+        async with SessionLocal() as db:
+            for model, entity in ((Flag, "flag"), (Segment, "segment")):
+                wm = self._wm[entity]
+                stmt = select(model.tenant_id, model.key, model.updated_at).order_by(model.updated_at)
+                if wm is not None:
+                    stmt = stmt.where(model.updated_at >= wm - self.overlap)
+                for tenant, key, updated_at in (await db.execute(stmt)).all():
+                    if self._fresh(entity, (tenant, key), updated_at):
+                        events.append(ChangeEvent(tenant, entity, key, updated_at.isoformat()))
+                self._prune(entity)
+            deletes = (select(Audit.id, Audit.tenant_id, Audit.entity, Audit.entity_key, Audit.ts)
+                       .where(Audit.action == "delete").order_by(Audit.ts))
+            if self._wm["audit"] is not None:
+                deletes = deletes.where(Audit.ts >= self._wm["audit"] - self.overlap)
+            for audit_id, tenant, entity, key, ts in (await db.execute(deletes)).all():
+                if self._fresh("audit", (audit_id,), ts):
+                    events.append(ChangeEvent(tenant, entity, key, ts.isoformat(), "delete"))
+            self._prune("audit")
+        per_tenant = Counter(e.tenant for e in events)
+        bulk = {t for t, n in per_tenant.items() if n > self.collapse_threshold}
+        if bulk:
+            events = [e for e in events if e.tenant not in bulk] + [ChangeEvent.tenant_wide(t) for t in sorted(bulk)]
+        return events
+
+    async def publish(self, event: ChangeEvent) -> None:
+        return
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+class ChangeBus:
+    """
+    Fan-out of flag/segment change events to cache subscribers.
+
+    `publish` dispatches to this worker's handlers immediately and hands the
+    event to the transport so other workers invalidate too. Handlers must be
+    idempotent: an event can arrive more than once.
+    """
+
+    def __init__(self, transport: Transport):
+        self.transport = transport
+        self._handlers: List[Handler] = []
+
+    def subscribe(self, handler: Handler) -> Handler:
+        self._handlers.append(handler)
+        return handler
+
+    def dispatch(self, event: ChangeEvent) -> None:
+        for handler in self._handlers:
+            try:
+                handler(event)
+            except Exception:
+                log.exception("change handler failed")
+
+    async def publish(self, event: ChangeEvent) -> None:
+        self.dispatch(event)
+        try:
+            await self.transport.publish(event)
+        except Exception:
+            log.exception("change publish failed; other workers fall back to TTL expiry")
+
+    async def start(self) -> None:
+        await self.transport.start(self.dispatch)
+
+    async def stop(self) -> None:
+        await self.transport.stop()
+
+
+def build_transport(kind: str, dsn: str) -> Transport:
+    if kind == "auto":
+        kind = "postgres" if dsn.startswith("postgresql") else "polling"
+    if kind == "postgres":
+        return PostgresNotifyTransport(dsn, engine)
+    if kind == "polling":
+        return PollingTransport(settings.change_poll_seconds, settings.change_overlap_seconds)
+    if kind == "inprocess":
+        return InProcessTransport()
+    raise ValueError(f"unknown change bus backend: {kind}")
+
+
+bus = ChangeBus(build_transport(settings.change_bus, settings.db_dsn))
@@ -0,0 +1,238 @@
+# app/services/exposures.py
+import asyncio
+import hashlib
+import logging
+import math
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from prometheus_client import Counter, Histogram
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.deps import SessionLocal
+from app.models import Exposure
+from app.services.bulk import insert_for
+
+log = logging.getLogger(__name__)
+
+EXPOSURE_ROWS = Counter("exposure_rows_flushed_total", "Exposure aggregates upserted")
+EXPOSURE_DROPPED = Counter("exposure_dropped_total", "Evaluations not counted because the aggregate table was full")
+EXPOSURE_FLUSH_SECONDS = Histogram("exposure_flush_seconds", "Latency of one exposure flush",
+                                   buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+
+HLL_P = 10
+HLL_M = 1 << HLL_P
+
+
+class HyperLogLog:
+    """
+    Unique-count sketch: 2**10 one-byte registers (1 KiB, ~3% standard error).
+    Registers merge by element-wise max, so per-flush sketches fold into the
+    stored row and buckets roll up into longer intervals.
+    """
+    __slots__ = ("registers",)
+
+    def __init__(self, registers: Optional[bytes] = None):
+        self.registers = bytearray(registers) if registers else bytearray(HLL_M)
+
+    def add(self, item: str):
+        h = int.from_bytes(hashlib.blake2b(item.encode(), digest_size=8).digest(), "big")
+        idx = h >> (64 - HLL_P)
+        rest = h & ((1 << (64 - HLL_P)) - 1)
+        rank = (64 - HLL_P) - rest.bit_length() + 1
+        if rank > self.registers[idx]:
+            self.registers[idx] = rank
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+        return self
+
+    def estimate(self) -> int:
+        alpha = 0.7213 / (1 + 1.079 / HLL_M)
+        raw = alpha * HLL_M * HLL_M / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * HLL_M and zeros:
+            return round(HLL_M * math.log(HLL_M / zeros))  # linear counting for small cardinalities
+        return round(raw)
+
+
+# (tenant, flag_key, variant, rule_id, bucket_start epoch seconds)
+Key = Tuple[str, str, str, str, int]
+
+
+class _Aggregate:
+    __slots__ = ("count", "hll")
+
+    def __init__(self, unique: bool):
+        self.count = 0
+        self.hll = HyperLogLog() if unique else None
+
+
+class ExposureAggregator:
+    """
+    In-memory exposure counters flushed to the `exposures` table in bulk.
+
+    `record` is a dict lookup and an integer add (plus one hash when unique
+    counting is on); nothing touches the database on the evaluate path. A
+    background task swaps the table out every `flush_interval` seconds and
+    upserts it, adding counts and merging sketches into existing rows. A
+    failed flush folds its counts back in for the next attempt. Past
+    `max_keys` distinct aggregates new keys are dropped and counted.
+    """
+
+    def __init__(self, bucket_seconds: int = 60, flush_interval: float = 10.0, max_keys: int = 100_000,
+                 unique_users: bool = False):
+        self.bucket_seconds = bucket_seconds
+        self.flush_interval = flush_interval
+        self.max_keys = max_keys
+        self.unique_users = unique_users
+        self._pending: Dict[Key, _Aggregate] = {}
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._lock = asyncio.Lock()
+
+    def record(self, tenant: str, flag_key: str, result: Mapping[str, Any], user_id: Any = None,
+               now: Optional[float] = None):
+        bucket = int(time.time() if now is None else now) // self.bucket_seconds * self.bucket_seconds
+        key = (tenant, flag_key, result["variant"], result.get("rule_id") or "", bucket)
+        agg = self._pending.get(key)
+        if agg is None:
+            if len(self._pending) >= self.max_keys:
+                EXPOSURE_DROPPED.inc()
+                return
+            agg = self._pending[key] = _Aggregate(self.unique_users)
+        agg.count += 1
+        if agg.hll is not None and user_id is not None:
+            agg.hll.add(str(user_id))
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flusher and write what's pending."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                log.exception("exposure flush failed; counts kept for the next attempt")
+
+    async def flush(self):
+        async with self._lock:
+            batch, self._pending = self._pending, {}
+            if not batch:
+                return
+            start = time.perf_counter()
+            try:
+                async with SessionLocal() as db:
+                    await _upsert(db, batch)
+                    await db.commit()
+            except BaseException:
+                self._restore(batch)
+                raise
+            EXPOSURE_FLUSH_SECONDS.observe(time.perf_counter() - start)
+            EXPOSURE_ROWS.inc(len(batch))
+
+    def _restore(self, batch: Dict[Key, _Aggregate]):
+        for key, agg in batch.items():
+            cur = self._pending.get(key)
+            if cur is None:
+                self._pending[key] = agg
+                continue
+            cur.count += agg.count
+            if cur.hll is not None and agg.hll is not None:
+                cur.hll.merge(agg.hll)
+
+
+def _bucket_dt(epoch: int) -> datetime:
+    return datetime.fromtimestamp(epoch, timezone.utc).replace(tzinfo=None)
+
+
+async def _upsert(db: AsyncSession, batch: Dict[Key, _Aggregate]):
+    items = sorted((((t, f, v, r, _bucket_dt(b)), agg) for (t, f, v, r, b), agg in batch.items()), key=lambda kv: kv[0])
+    keys = [k for k, _ in items]
+    ins = insert_for(db)(Exposure)
+    index_elements = ["tenant_id", "flag_key", "bucket_start", "variant", "rule_id"]
+    sketches: Dict[Tuple[Any, ...], bytes] = {}
+    if any(agg.hll is not None for _, agg in items):
+        # Sketches can't be merged in SQL portably, so the stored registers are read, merged here and written
+        # back. Creating any missing rows first and reading with FOR UPDATE (Postgres; on SQLite the insert
+        # already holds the database write lock) keeps another worker's flush out until this one commits.
+        # Keys are sorted so concurrent flushes lock rows in the same order.
+        placeholders = [dict(tenant_id=k[0], flag_key=k[1], variant=k[2], rule_id=k[3], bucket_start=k[4], count=0)
+                        for k in keys]
+        for i in range(0, len(placeholders), 500):
+            await db.execute(ins.on_conflict_do_nothing(index_elements=index_elements), placeholders[i:i + 500])
+        cols = (Exposure.tenant_id, Exposure.flag_key, Exposure.variant, Exposure.rule_id, Exposure.bucket_start)
+        for i in range(0, len(keys), 500):
+            result = await db.execute(select(*cols, Exposure.unique_users).where(tuple_(*cols).in_(keys[i:i + 500]))
+                                      .order_by(*cols).with_for_update())
+            for *k, registers in result:
+                if registers:
+                    sketches[tuple(k)] = registers
+    rows: List[Dict[str, Any]] = []
+    for key, agg in items:
+        registers = None
+        if agg.hll is not None:
+            stored = sketches.get(key)
+            registers = bytes(agg.hll.merge(HyperLogLog(stored)).registers if stored else agg.hll.registers)
+        rows.append(dict(tenant_id=key[0], flag_key=key[1], variant=key[2], rule_id=key[3], bucket_start=key[4],
+                         count=agg.count, unique_users=registers))
+    stmt = ins.on_conflict_do_update(
+        index_elements=index_elements,
+        set_={"count": Exposure.count + ins.excluded.count, "unique_users": ins.excluded.unique_users},
+    )
+    for i in range(0, len(rows), 500):
+        await db.execute(stmt, rows[i:i + 500])
+
+
+async def exposure_report(db: AsyncSession, tenant: str, flag_key: str, since: datetime, until: datetime,
+                          interval: int) -> List[Dict[str, Any]]:
+    """
+    Flushed exposure counts for one flag in [since, until), rolled up into
+    `interval`-second slices (a multiple of the bucket size), one entry per
+    (slice, variant, rule_id), oldest first.
+    """
+    stmt = (select(Exposure)
+            .where(Exposure.tenant_id == tenant, Exposure.flag_key == flag_key,
+                   Exposure.bucket_start >= since, Exposure.bucket_start < until)
+            .order_by(Exposure.bucket_start))
+    slices: Dict[Tuple[datetime, str, str], Tuple[int, Optional[HyperLogLog]]] = {}
+    for row in (await db.execute(stmt)).scalars():
+        epoch = int(row.bucket_start.replace(tzinfo=timezone.utc).timestamp())
+        start = _bucket_dt(epoch // interval * interval)
+        k = (start, row.variant, row.rule_id)
+        count, hll = slices.get(k, (0, None))
+        if row.unique_users:
+            hll = HyperLogLog(row.unique_users) if hll is None else hll.merge(HyperLogLog(row.unique_users))
+        slices[k] = (count + row.count, hll)
+    return [
+        {"start": start, "variant": variant, "rule_id": rule_id or None, "count": count,
+         "unique_users": hll.estimate() if hll is not None else None}
+        for (start, variant, rule_id), (count, hll) in sorted(slices.items(), key=lambda kv: kv[0])
+    ]
+
+
+aggregator = ExposureAggregator(
+    bucket_seconds=settings.exposure_bucket_seconds,
+    flush_interval=settings.exposure_flush_seconds,
+    max_keys=settings.exposure_max_keys,
+    unique_users=settings.exposure_unique_users,
+)
@@ -0,0 +1,69 @@
+# app/services/fast_evaluate.py
+"""
+Pydantic-free request parsing and response encoding for /v1/evaluate.
+
+Both halves only handle the common shape and return None for anything else,
+so the caller can fall back to the validated path and produce exactly the
+response (or the 422) it always has. Responses are byte-for-byte what
+Starlette's JSONResponse would send for the same EvaluateResponse.
+"""
+import json
+import math
+from functools import lru_cache
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+try:
+    import orjson
+
+    _loads = orjson.loads
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    _loads = json.loads
+
+
+def parse_evaluate(body: bytes) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """
+    (flag_key, user) when `body` is JSON EvaluateRequest would accept as is:
+    an object with a string `flag_key` and an object `user`. None otherwise,
+    including anything orjson rejects that the stdlib parser might not.
+    """
+    try:
+        doc = _loads(body)
+    except ValueError:
+        return None
+    if type(doc) is not dict:
+        return None
+    flag_key, user = doc.get("flag_key"), doc.get("user")
+    if type(flag_key) is not str or type(user) is not dict:
+        return None
+    return flag_key, user
+
+
+def _dumps(value: Any) -> bytes:
+    # JSONResponse.render's settings.
+    return json.dumps(value, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+@lru_cache(maxsize=4096)
+def _head(variant: str, reason: str, rule_id: Optional[str]) -> bytes:
+    """Everything up to `details` for one outcome, encoded once and reused."""
+    return (b'{"variant":' + _dumps(variant) + b',"reason":' + _dumps(reason)
+            + b',"rule_id":' + _dumps(rule_id) + b',"details":')
+
+
+def evaluation_body(result: Mapping[str, Any]) -> Optional[bytes]:
+    """
+    The EvaluateResponse JSON for an evaluation result: a cached head plus
+    `{}` (flag off) or the bucket, which json.dumps writes as repr(float).
+    None for anything EvaluateResponse might coerce or reject.
+    """
+    variant, reason, rule_id = result["variant"], result["reason"], result["rule_id"]
+    if type(variant) is not str or type(reason) is not str or (rule_id is not None and type(rule_id) is not str):
+        return None
+    details = result["details"]
+    if not details:
+        return _head(variant, reason, rule_id) + b"{}}"
+    if len(details) == 1:
+        bucket = details.get("bucket")
+        if type(bucket) is float and math.isfinite(bucket):
+            return b"".join((_head(variant, reason, rule_id), b'{"bucket":', repr(bucket).encode(), b"}}"))
+    return None
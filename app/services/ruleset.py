@@ -0,0 +1,204 @@
+# app/services/ruleset.py
+import hashlib
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Flag, Segment
+from app.services.flag_eval import CompiledFlag, compile_flag, segment_refs
+
+
+def flag_to_dict(flag: Flag) -> Dict[str, Any]:
+    return {
+        "key": flag.key,
+        "description": flag.description,
+        "state": flag.state,
+        "variants": flag.variants or [],
+        "rules": flag.rules or [],
+        "version": flag.updated_at.isoformat() if flag.updated_at else "",
+    }
+
+
+@dataclass(frozen=True)
+class SegmentSnapshot:
+    """A tenant's segments as {key: criteria} plus {key: version} for plan validation."""
+    criteria: Dict[str, Dict[str, Any]]
+    versions: Dict[str, str]
+
+
+async def load_flag(db: AsyncSession, tenant: str, key: str) -> Optional[Dict[str, Any]]:
+    row = (await db.execute(
+        select(Flag).where(Flag.tenant_id == tenant, Flag.key == key, Flag.deleted_at.is_(None))
+    )).scalar_one_or_none()
+    return flag_to_dict(row) if row else None
+
+
+async def load_flags(db: AsyncSession, tenant: str, keys: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+    """Load active flags for a tenant in one query; all of them when `keys` is None."""
+    stmt = select(Flag).where(Flag.tenant_id == tenant, Flag.deleted_at.is_(None))
+    if keys is not None:
+        stmt = stmt.where(Flag.key.in_(list(keys)))
+    rows = (await db.execute(stmt.order_by(Flag.key))).scalars().all()
+    return [flag_to_dict(r) for r in rows]
+
+
+async def load_segments(db: AsyncSession, tenant: str) -> SegmentSnapshot:
+    rows = (await db.execute(select(Segment).where(Segment.tenant_id == tenant))).scalars().all()
+    return SegmentSnapshot(
+        criteria={s.key: s.criteria or {} for s in rows},
+        versions={s.key: s.updated_at.isoformat() if s.updated_at else "" for s in rows},
+    )
+
+
+class DependencyIndex:
+    """
+    Per-tenant segment -> flag dependency graph.
+
+    Edges are the segments a flag's rules name (anywhere in nested
+    all/any/not trees) and the segments a segment's criteria name.
+    `dependents` follows segment->segment edges, so flags that reach a
+    segment only through another segment are included.
+    """
+
+    def __init__(self):
+        self._flag_refs: Dict[str, Dict[str, Set[str]]] = {}      # tenant -> flag -> segments
+        self._flags_by_seg: Dict[str, Dict[str, Set[str]]] = {}   # tenant -> segment -> flags
+        self._seg_refs: Dict[str, Dict[str, Set[str]]] = {}       # tenant -> segment -> segments
+        self._segs_by_seg: Dict[str, Dict[str, Set[str]]] = {}    # tenant -> segment -> segments naming it
+
+    @staticmethod
+    def _relink(fwd: Dict[str, Set[str]], rev: Dict[str, Set[str]], node: str, refs: Iterable[str]):
+        for old in fwd.pop(node, ()):
+            users = rev.get(old)
+            if users is not None:
+                users.discard(node)
+                if not users:
+                    del rev[old]
+        new = set(refs)
+        if new:
+            fwd[node] = new
+            for ref in new:
+                rev.setdefault(ref, set()).add(node)
+
+    def update_flag(self, tenant: str, key: str, rules: Optional[Iterable[Mapping[str, Any]]]):
+        """Record the segments a flag's rules reference; `rules=None` forgets the flag."""
+        refs: Set[str] = set()
+        for r in rules or ():
+            refs |= segment_refs(r.get("when"))
+        self._relink(self._flag_refs.setdefault(tenant, {}), self._flags_by_seg.setdefault(tenant, {}), key, refs)
+
+    def update_segment(self, tenant: str, key: str, criteria: Optional[Mapping[str, Any]]):
+        """Record the segments a segment's criteria reference; `criteria=None` forgets it."""
+        self._relink(self._seg_refs.setdefault(tenant, {}), self._segs_by_seg.setdefault(tenant, {}), key, segment_refs(criteria))
+
+    def segments(self, tenant: str) -> Set[str]:
+        return set(self._seg_refs.get(tenant, ()))
+
+    def dependents(self, tenant: str, segment: str) -> Set[str]:
+        """Flag keys whose evaluation can change when `segment` changes."""
+        flags_by_seg = self._flags_by_seg.get(tenant, {})
+        segs_by_seg = self._segs_by_seg.get(tenant, {})
+        seen = {segment}
+        stack = [segment]
+        flags: Set[str] = set()
+        while stack:
+            seg = stack.pop()
+            flags |= flags_by_seg.get(seg, set())
+            for parent in segs_by_seg.get(seg, ()):
+                if parent not in seen:
+                    seen.add(parent)
+                    stack.append(parent)
+        return flags
+
+
+class CompiledFlagCache:
+    """
+    Compiled evaluation plans keyed by (tenant, flag_key).
+
+    A plan is reused while the flag's version and the versions of every
+    segment it references are unchanged; otherwise it is recompiled. `deps`
+    is kept current from every flag compiled and every segment snapshot seen,
+    so `invalidate_segment` drops only the plans that depend on a segment.
+    """
+
+    def __init__(self):
+        self._plans: Dict[Tuple[str, str], Tuple[str, Tuple[Tuple[str, Optional[str]], ...], CompiledFlag]] = {}
+        self._snapshots: Dict[str, SegmentSnapshot] = {}
+        self.deps = DependencyIndex()
+
+    def get(self, tenant: str, flag: Dict[str, Any], segments: SegmentSnapshot) -> CompiledFlag:
+        if self._snapshots.get(tenant) is not segments:
+            for key in self.deps.segments(tenant) - segments.criteria.keys():
+                self.deps.update_segment(tenant, key, None)
+            for key, criteria in segments.criteria.items():
+                self.deps.update_segment(tenant, key, criteria)
+            self._snapshots[tenant] = segments
+        cache_key = (tenant, flag["key"])
+        entry = self._plans.get(cache_key)
+        if entry is not None:
+            version, seg_versions, plan = entry
+            if version == flag.get("version") and all(segments.versions.get(k) == v for k, v in seg_versions):
+                return plan
+        plan = compile_flag(flag, segments.criteria)
+        seg_versions = tuple((k, segments.versions.get(k)) for k in sorted(plan.segment_refs))
+        self._plans[cache_key] = (flag.get("version", ""), seg_versions, plan)
+        self.deps.update_flag(tenant, flag["key"], flag.get("rules"))
+        return plan
+
+    def invalidate(self, tenant: str, flag_key: Optional[str] = None):
+        if flag_key is not None:
+            self._plans.pop((tenant, flag_key), None)
+            self.deps.update_flag(tenant, flag_key, None)
+            return
+        for k in [k for k in self._plans if k[0] == tenant]:
+            self._plans.pop(k, None)
+        self._snapshots.pop(tenant, None)
+
+    def clear(self):
+        self._plans.clear()
+        self._snapshots.clear()
+        self.deps = DependencyIndex()
+
+    def invalidate_segment(self, tenant: str, segment: str) -> Set[str]:
+        """Drop plans of flags that depend on `segment`; returns their keys."""
+        affected = self.deps.dependents(tenant, segment)
+        for key in affected:
+            self._plans.pop((tenant, key), None)
+        return affected
+
+
+@dataclass(frozen=True)
+class TenantRuleset:
+    """
+    Every active flag of a tenant compiled against one segment snapshot.
+    `version` changes whenever any flag or segment is added, edited or removed.
+    `flags` is a tuple, or a lazy view over the shared store (see
+    app.services.shared_ruleset) when RULESET_DIR is set.
+    """
+    version: str
+    flags: Sequence[Dict[str, Any]]
+    plans: Tuple[CompiledFlag, ...]
+    segments: SegmentSnapshot
+
+
+def _version_hash(flags: Iterable[Tuple[str, str]], segments: Iterable[Tuple[str, str]]) -> str:
+    h = hashlib.sha256()
+    for key, version in sorted(flags):
+        h.update(f"f\0{key}\0{version}\n".encode())
+    for key, version in sorted(segments):
+        h.update(f"s\0{key}\0{version}\n".encode())
+    return h.hexdigest()[:24]
+
+
+def ruleset_version(flags: Sequence[Mapping[str, Any]], segments: SegmentSnapshot) -> str:
+    return _version_hash(((f["key"], f.get("version", "")) for f in flags), segments.versions.items())
+
+
+async def load_ruleset_version(db: AsyncSession, tenant: str) -> str:
+    """`ruleset_version` from keys and timestamps alone, without loading rules or criteria."""
+    flags = await db.execute(select(Flag.key, Flag.updated_at).where(Flag.tenant_id == tenant, Flag.deleted_at.is_(None)))
+    segments = await db.execute(select(Segment.key, Segment.updated_at).where(Segment.tenant_id == tenant))
+    return _version_hash(((k, ts.isoformat() if ts else "") for k, ts in flags),
+                         ((k, ts.isoformat() if ts else "") for k, ts in segments))
@@ -0,0 +1,151 @@
+# app/services/segment_index.py
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from typing import Any, Dict, FrozenSet, List, Mapping, Optional, Tuple
+
+from app.services.flag_eval import EvalContext, Predicate, compile_segments, split_attr
+
+_RANGE_OPS = ("_lte", "_gte", "_lt", "_gt")
+
+
+def _is_number(v: Any) -> bool:
+    return isinstance(v, (int, float))
+
+
+def _conjunction(node: Any, out: List[Tuple[str, Optional[str], Any]]) -> bool:
+    """
+    Flatten criteria into ANDed (attr, op, value) leaves. Returns False when
+    the tree needs the general evaluator (any/not/segment/_in/_ne, or values
+    the index can't key on).
+    """
+    if not isinstance(node, dict):
+        return False
+    for kind, arg in node.items():
+        if kind == "all" and isinstance(arg, list):
+            if not all(_conjunction(c, out) for c in arg):
+                return False
+        elif kind == "attr" and isinstance(arg, dict):
+            for name, value in arg.items():
+                attr, op = split_attr(name)
+                if op is None:
+                    if isinstance(value, (list, dict)):
+                        return False
+                    out.append((attr, None, value))
+                elif op in _RANGE_OPS and _is_number(value):
+                    out.append((attr, op, value))
+                else:
+                    return False
+        else:
+            return False
+    return True
+
+
+class _RangeIndex:
+    """Sorted thresholds for one (attr, op); `match(v)` yields segments whose bound admits v."""
+    __slots__ = ("op", "thresholds", "segments")
+
+    def __init__(self, op: str, entries: List[Tuple[Any, int]]):
+        entries.sort(key=lambda e: e[0])
+        self.op = op
+        self.thresholds = [t for t, _ in entries]
+        self.segments = [s for _, s in entries]
+
+    def match(self, v: Any) -> List[int]:
+        op, t = self.op, self.thresholds
+        if op == "_lte":
+            return self.segments[bisect_left(t, v):]
+        if op == "_lt":
+            return self.segments[bisect_right(t, v):]
+        if op == "_gte":
+            return self.segments[:bisect_right(t, v)]
+        return self.segments[:bisect_left(t, v)]
+
+
+class SegmentIndex:
+    """
+    Inverted index over a tenant's segments for "which segments is this user in".
+
+    Segments whose criteria are a conjunction of equality and numeric range
+    predicates are answered by counting satisfied predicates: equality leaves
+    sit in a hash map keyed by (attr, value), range leaves in sorted threshold
+    lists per (attr, op). A user costs one lookup per attribute rather than a
+    pass over every segment. Anything else (any/not/segment refs/_in/_ne) is a
+    residual segment checked with its compiled predicate.
+    """
+
+    def __init__(self, segments: Mapping[str, Any]):
+        self.keys: List[str] = []
+        self._required: List[int] = []
+        self._always: List[str] = []
+        self._eq: Dict[Tuple[str, Any], List[int]] = defaultdict(list)
+        ranges: Dict[Tuple[str, str], List[Tuple[Any, int]]] = defaultdict(list)
+        residual: List[str] = []
+        for key, criteria in segments.items():
+            leaves: List[Tuple[str, Optional[str], Any]] = []
+            if not _conjunction(criteria or {}, leaves):
+                residual.append(key)
+                continue
+            if not leaves:
+                self._always.append(key)
+                continue
+            idx = len(self.keys)
+            self.keys.append(key)
+            self._required.append(len(leaves))
+            for attr, op, value in leaves:
+                if op is None:
+                    self._eq[(attr, value)].append(idx)
+                else:
+                    ranges[(attr, op)].append((value, idx))
+        self._ranges: Dict[str, List[_RangeIndex]] = defaultdict(list)
+        for (attr, op), entries in ranges.items():
+            self._ranges[attr].append(_RangeIndex(op, entries))
+        self._eq = dict(self._eq)
+        self._ranges = dict(self._ranges)
+        predicates = compile_segments(segments) if residual else {}
+        self._residual: List[Tuple[str, Predicate]] = [(k, predicates[k]) for k in residual]
+
+    def members(self, attrs: Mapping[str, Any]) -> FrozenSet[str]:
+        """Every segment key `attrs` satisfies."""
+        counts: Dict[int, int] = defaultdict(int)
+        eq, ranges = self._eq, self._ranges
+        for attr, value in attrs.items():
+            try:
+                hits = eq.get((attr, value))
+            except TypeError:  # unhashable attribute value
+                hits = None
+            if hits:
+                for i in hits:
+                    counts[i] += 1
+            if _is_number(value):
+                for r in ranges.get(attr, ()):
+                    for i in r.match(value):
+                        counts[i] += 1
+        required, keys = self._required, self.keys
+        out = {keys[i] for i, c in counts.items() if c == required[i]}
+        out.update(self._always)
+        if self._residual:
+            memo = {k: True for k in out}
+            ctx = EvalContext(attrs, 0.0, memo)
+            out.update(k for k, pred in self._residual if pred(ctx))
+        return frozenset(out)
+
+
+class SegmentIndexCache:
+    """One `SegmentIndex` per tenant, rebuilt when the tenant's segment snapshot object changes."""
+
+    def __init__(self):
+        self._by_tenant: Dict[str, Tuple[Any, SegmentIndex]] = {}
+
+    def get(self, tenant: str, snapshot: Any) -> SegmentIndex:
+        entry = self._by_tenant.get(tenant)
+        if entry is not None and entry[0] is snapshot:
+            return entry[1]
+        index = SegmentIndex(snapshot.criteria)
+        self._by_tenant[tenant] = (snapshot, index)
+        return index
+
+    def invalidate(self, tenant: str):
+        self._by_tenant.pop(tenant, None)
+
+    def clear(self):
+        self._by_tenant.clear()
@@ -0,0 +1,364 @@
+# app/services/shared_ruleset.py
+import logging
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from bisect import bisect_left
+from collections.abc import Sequence as SequenceABC
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+from urllib.parse import quote
+
+from prometheus_client import Counter
+
+from app.services.ruleset import SegmentSnapshot
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not on POSIX: concurrent publishes may both write
+    fcntl = None  # type: ignore[assignment]
+
+log = logging.getLogger(__name__)
+
+RULESET_PUBLISHED = Counter("ruleset_published_total", "Compact rulesets written to the shared store")
+RULESET_MAPPED = Counter("ruleset_mapped_total", "Shared ruleset files mapped by this worker")
+
+MAGIC = b"FFRS"
+FORMAT = 1
+
+# magic, format, version, n_strings, n_flags, n_segments, strings_off, flags_off, segments_off
+_HEADER = struct.Struct("<4sH24sIIIIII")
+_U32 = struct.Struct("<I")
+_I64 = struct.Struct("<q")
+_F64 = struct.Struct("<d")
+# key, description, state, version (string refs), variants, rules (value offsets)
+_FLAG = struct.Struct("<IIIIII")
+# key, version (string refs), criteria (value offset)
+_SEGMENT = struct.Struct("<III")
+_NONE = 0xFFFFFFFF
+
+# Value tags. _T_WEIGHTS is a packed [{key, weight}] list: n, key refs, then f64 weights.
+_T_NONE, _T_FALSE, _T_TRUE, _T_INT, _T_FLOAT, _T_STR, _T_LIST, _T_DICT, _T_BIGINT, _T_WEIGHTS = range(10)
+
+
+class _Writer:
+    def __init__(self):
+        self.strings: Dict[str, int] = {}
+        self.values = bytearray()
+
+    def ref(self, s: Optional[str]) -> int:
+        if s is None:
+            return _NONE
+        i = self.strings.get(s)
+        if i is None:
+            i = self.strings[s] = len(self.strings)
+        return i
+
+    def value(self, v: Any) -> int:
+        off = len(self.values)
+        self._emit(v)
+        return off
+
+    def _emit(self, v: Any):
+        out = self.values
+        if v is None:
+            out.append(_T_NONE)
+        elif v is True or v is False:
+            out.append(_T_TRUE if v else _T_FALSE)
+        elif isinstance(v, int):
+            if -(1 << 63) <= v < (1 << 63):
+                out.append(_T_INT)
+                out += _I64.pack(v)
+            else:
+                out.append(_T_BIGINT)
+                out += _U32.pack(self.ref(str(v)))
+        elif isinstance(v, float):
+            out.append(_T_FLOAT)
+            out += _F64.pack(v)
+        elif isinstance(v, str):
+            out.append(_T_STR)
+            out += _U32.pack(self.ref(v))
+        elif isinstance(v, (list, tuple)):
+            if v and all(_is_weight(x) for x in v):
+                self._weights(v)
+                return
+            out.append(_T_LIST)
+            out += _U32.pack(len(v))
+            for x in v:
+                self._emit(x)
+        elif isinstance(v, Mapping):
+            out.append(_T_DICT)
+            out += _U32.pack(len(v))
+            for k, x in v.items():
+                out += _U32.pack(self.ref(str(k)))
+                self._emit(x)
+        else:
+            raise TypeError(f"cannot encode {type(v).__name__}")
+
+    def _weights(self, variants: Sequence[Mapping[str, Any]]):
+        out = self.values
+        ints = all(type(x["weight"]) is int for x in variants)
+        out.append(_T_WEIGHTS)
+        out += struct.pack("<IB", len(variants), ints)
+        out += struct.pack(f"<{len(variants)}I", *(self.ref(x["key"]) for x in variants))
+        out += struct.pack(f"<{len(variants)}d", *(float(x["weight"]) for x in variants))
+
+
+def _is_weight(x: Any) -> bool:
+    return (isinstance(x, dict) and len(x) == 2 and isinstance(x.get("key"), str)
+            and type(x.get("weight")) in (int, float) and abs(x["weight"]) < (1 << 53))
+
+
+def encode(version: str, flags: Sequence[Mapping[str, Any]], segments: SegmentSnapshot) -> bytes:
+    """
+    Pack a tenant ruleset into the compact shared format: one string table
+    (every key, variant, attribute name and string value stored once), a
+    fixed-width flag table sorted by key for binary search, a segment table,
+    and a tagged value area holding rules, criteria and packed weight tables.
+    """
+    w = _Writer()
+    flag_rows = []
+    for f in sorted(flags, key=lambda f: f["key"]):
+        flag_rows.append(_FLAG.pack(
+            w.ref(f["key"]), w.ref(f.get("description")), w.ref(f.get("state", "off")), w.ref(f.get("version", "")),
+            w.value(f.get("variants") or []), w.value(f.get("rules") or []),
+        ))
+    seg_rows = []
+    for key in sorted(segments.criteria):
+        seg_rows.append(_SEGMENT.pack(w.ref(key), w.ref(segments.versions.get(key, "")),
+                                      w.value(segments.criteria[key])))
+
+    encoded = [s.encode() for s in w.strings]
+    offsets, pos = [], 0
+    for b in encoded:
+        offsets.append(pos)
+        pos += len(b)
+    offsets.append(pos)
+    string_table = struct.pack(f"<{len(offsets)}I", *offsets) + b"".join(encoded)
+
+    strings_off = _HEADER.size
+    flags_off = strings_off + len(string_table)
+    segments_off = flags_off + len(flag_rows) * _FLAG.size
+    values_off = segments_off + len(seg_rows) * _SEGMENT.size
+    # Value offsets were taken relative to the value area; make them absolute.
+    flag_rows = [_FLAG.pack(*row[:4], row[4] + values_off, row[5] + values_off)
+                 for row in (_FLAG.unpack(r) for r in flag_rows)]
+    seg_rows = [_SEGMENT.pack(k, v, c + values_off) for k, v, c in (_SEGMENT.unpack(r) for r in seg_rows)]
+    header = _HEADER.pack(MAGIC, FORMAT, version.encode().ljust(24, b"\0")[:24], len(encoded), len(flag_rows),
+                          len(seg_rows), strings_off, flags_off, segments_off)
+    return b"".join([header, string_table, *flag_rows, *seg_rows, bytes(w.values)])
+
+
+class SharedRuleset:
+    """
+    Read-only view over an encoded ruleset (usually an mmap shared by every
+    worker). Nothing is decoded up front: `flag` binary-searches the flag
+    table and builds that one dict, with strings interned so plans compiled
+    from it share keys and attribute names with the rest of the process.
+    """
+
+    def __init__(self, buf: Any):
+        self._buf = memoryview(buf)
+        magic, fmt, version, n_str, n_flags, n_segs, s_off, f_off, g_off = _HEADER.unpack_from(self._buf, 0)
+        if magic != MAGIC or fmt != FORMAT:
+            raise ValueError("not a compact ruleset")
+        self.version = version.rstrip(b"\0").decode()
+        self._n_strings, self._n_flags, self._n_segments = n_str, n_flags, n_segs
+        self._strings_off, self._flags_off, self._segments_off = s_off, f_off, g_off
+        self._blob_off = s_off + (n_str + 1) * 4
+        self._strings: List[Optional[str]] = [None] * n_str
+        self._keys: Optional[List[str]] = None
+
+    def close(self):
+        self._buf.release()
+
+    def __len__(self) -> int:
+        return self._n_flags
+
+    def string(self, i: int) -> Optional[str]:
+        if i == _NONE:
+            return None
+        s = self._strings[i]
+        if s is None:
+            start, end = struct.unpack_from("<II", self._buf, self._strings_off + i * 4)
+            s = self._strings[i] = sys.intern(str(self._buf[self._blob_off + start:self._blob_off + end], "utf-8"))
+        return s
+
+    def _text(self, i: int) -> str:
+        """`string` for references the encoder always fills (keys, segment versions, big ints)."""
+        s = self.string(i)
+        if s is None:
+            raise ValueError("missing string reference")
+        return s
+
+    def keys(self) -> List[str]:
+        if self._keys is None:
+            self._keys = [self._text(_U32.unpack_from(self._buf, self._flags_off + i * _FLAG.size)[0])
+                          for i in range(self._n_flags)]
+        return self._keys
+
+    def flag_at(self, i: int) -> Dict[str, Any]:
+        key, desc, state, version, variants, rules = _FLAG.unpack_from(self._buf, self._flags_off + i * _FLAG.size)
+        return {
+            "key": self.string(key),
+            "description": self.string(desc),
+            "state": self.string(state),
+            "variants": self._value(variants)[0],
+            "rules": self._value(rules)[0],
+            "version": self.string(version),
+        }
+
+    def flag(self, key: str) -> Optional[Dict[str, Any]]:
+        keys = self.keys()
+        i = bisect_left(keys, key)
+        return self.flag_at(i) if i < len(keys) and keys[i] == key else None
+
+    def flags(self) -> "FlagView":
+        return FlagView(self)
+
+    def segments(self) -> SegmentSnapshot:
+        criteria, versions = {}, {}
+        for i in range(self._n_segments):
+            key, version, off = _SEGMENT.unpack_from(self._buf, self._segments_off + i * _SEGMENT.size)
+            k = self._text(key)
+            criteria[k] = self._value(off)[0]
+            versions[k] = self._text(version)
+        return SegmentSnapshot(criteria=criteria, versions=versions)
+
+    def _value(self, off: int) -> Tuple[Any, int]:
+        buf = self._buf
+        tag = buf[off]
+        off += 1
+        if tag == _T_STR:
+            return self.string(_U32.unpack_from(buf, off)[0]), off + 4
+        if tag == _T_DICT:
+            n = _U32.unpack_from(buf, off)[0]
+            off += 4
+            d = {}
+            for _ in range(n):
+                k = self.string(_U32.unpack_from(buf, off)[0])
+                d[k], off = self._value(off + 4)
+            return d, off
+        if tag == _T_LIST:
+            n = _U32.unpack_from(buf, off)[0]
+            off += 4
+            items = []
+            for _ in range(n):
+                v, off = self._value(off)
+                items.append(v)
+            return items, off
+        if tag == _T_WEIGHTS:
+            n, ints = struct.unpack_from("<IB", buf, off)
+            off += 5
+            refs = struct.unpack_from(f"<{n}I", buf, off)
+            weights = struct.unpack_from(f"<{n}d", buf, off + 4 * n)
+            cast = int if ints else float
+            return [{"key": self.string(r), "weight": cast(wt)} for r, wt in zip(refs, weights)], off + 12 * n
+        if tag == _T_INT:
+            return _I64.unpack_from(buf, off)[0], off + 8
+        if tag == _T_FLOAT:
+            return _F64.unpack_from(buf, off)[0], off + 8
+        if tag == _T_BIGINT:
+            return int(self._text(_U32.unpack_from(buf, off)[0])), off + 4
+        if tag in (_T_NONE, _T_FALSE, _T_TRUE):
+            return (None, False, True)[tag], off
+        raise ValueError(f"bad value tag {tag} at {off - 1}")
+
+
+class FlagView(SequenceABC):
+    """The flags of a `SharedRuleset` as a sequence of dicts, decoded on access."""
+
+    def __init__(self, ruleset: SharedRuleset):
+        self.ruleset = ruleset
+
+    def __len__(self) -> int:
+        return len(self.ruleset)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.ruleset.flag_at(j) for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self.ruleset.flag_at(i)
+
+
+class RulesetStore:
+    """
+    Compact rulesets shared by every worker on a host through the page cache.
+
+    Each tenant has one file in `directory`. `publish` writes a new version
+    to a temp file and `os.replace`s it in, so readers see either the old
+    ruleset or the new one; a worker still holding the old mapping keeps
+    reading the old inode until it lets go. `open` re-maps only when the
+    file has been replaced since the last call (one `stat`). Publishing holds
+    a per-tenant lock file, so workers racing to publish the same version
+    write it once.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._open: Dict[str, Tuple[Tuple[int, int, int], SharedRuleset]] = {}
+
+    def path(self, tenant: str) -> str:
+        return os.path.join(self.directory, quote(tenant, safe="") + ".ffrs")
+
+    def open(self, tenant: str) -> Optional[SharedRuleset]:
+        path = self.path(tenant)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            self._open.pop(tenant, None)
+            return None
+        ident = (st.st_ino, st.st_mtime_ns, st.st_size)
+        entry = self._open.get(tenant)
+        if entry is not None and entry[0] == ident:
+            return entry[1]
+        try:
+            with open(path, "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            ruleset = SharedRuleset(mapped)
+        except (OSError, ValueError, struct.error):
+            log.warning("ignoring unreadable shared ruleset", extra={"ruleset_path": path})
+            return None
+        # The previous mapping is left to the GC: requests may still be decoding from it.
+        self._open[tenant] = (ident, ruleset)
+        RULESET_MAPPED.inc()
+        return ruleset
+
+    @contextmanager
+    def _locked(self, tenant: str) -> Iterator[None]:
+        if fcntl is None:
+            yield
+            return
+        with open(self.path(tenant) + ".lock", "wb") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def publish(self, tenant: str, version: str, flags: Sequence[Mapping[str, Any]],
+                segments: SegmentSnapshot) -> SharedRuleset:
+        """Write `version` unless the store already holds it; returns the mapped ruleset."""
+        with self._locked(tenant):
+            current = self.open(tenant)
+            if current is not None and current.version == version:
+                return current
+            fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=".ruleset-")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(encode(version, flags, segments))
+                os.replace(tmp, self.path(tenant))
+            except BaseException:
+                os.unlink(tmp)
+                raise
+            RULESET_PUBLISHED.inc()
+        ruleset = self.open(tenant)
+        if ruleset is None:
+            raise OSError(f"published ruleset for {tenant!r} is unreadable")
+        return ruleset
@@ -0,0 +1,259 @@
+# app/services/snapshot.py
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from prometheus_client import Gauge, Histogram
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.deps import ReadSessionLocal
+from app.models import Audit, Flag, Segment
+from app.services.changes import ChangeEvent, bus
+from app.services.ruleset import SegmentSnapshot, flag_to_dict
+
+log = logging.getLogger(__name__)
+
+FORMAT = 1
+
+SNAPSHOT_AGE = Gauge("snapshot_age_seconds", "Age of the snapshot this worker warmed from (0: warmed from the DB)")
+WARM_SECONDS = Histogram("warm_start_seconds", "Time from startup to a warm cache", ["source"],
+                         buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
+
+
+@dataclass
+class TenantState:
+    flags: Dict[str, Dict[str, Any]] = field(default_factory=dict)  # key -> flag_to_dict()
+    segments: Dict[str, Dict[str, Any]] = field(default_factory=dict)  # key -> criteria
+    segment_versions: Dict[str, str] = field(default_factory=dict)
+
+    def segment_snapshot(self) -> SegmentSnapshot:
+        return SegmentSnapshot(criteria=dict(self.segments), versions=dict(self.segment_versions))
+
+
+@dataclass
+class Snapshot:
+    """
+    Every tenant's active flags and segments as of `watermark` (the newest
+    updated_at seen; rows changed at or after it, less
+    CHANGE_OVERLAP_SECONDS, are re-read on catch-up).
+    """
+    watermark: Optional[datetime]
+    written_at: float
+    tenants: Dict[str, TenantState]
+
+    def to_json(self) -> bytes:
+        return json.dumps({
+            "format": FORMAT,
+            "watermark": self.watermark.isoformat() if self.watermark else None,
+            "written_at": self.written_at,
+            "tenants": {
+                t: {"flags": list(s.flags.values()),
+                    "segments": [{"key": k, "criteria": c, "version": s.segment_versions.get(k, "")}
+                                 for k, c in s.segments.items()]}
+                for t, s in self.tenants.items()
+            },
+        }, separators=(",", ":")).encode()
+
+    @classmethod
+    def from_json(cls, raw: bytes) -> "Snapshot":
+        doc = json.loads(raw)
+        if doc.get("format") != FORMAT:
+            raise ValueError(f"unsupported snapshot format {doc.get('format')!r}")
+        tenants = {}
+        for t, d in doc["tenants"].items():
+            tenants[t] = TenantState(
+                flags={f["key"]: f for f in d["flags"]},
+                segments={s["key"]: s["criteria"] for s in d["segments"]},
+                segment_versions={s["key"]: s["version"] for s in d["segments"]},
+            )
+        wm = doc.get("watermark")
+        return cls(datetime.fromisoformat(wm) if wm else None, float(doc["written_at"]), tenants)
+
+
+async def _max_updated(db: AsyncSession) -> Optional[datetime]:
+    flags = (await db.execute(select(func.max(Flag.updated_at)))).scalar()
+    segments = (await db.execute(select(func.max(Segment.updated_at)))).scalar()
+    return max((t for t in (flags, segments) if t is not None), default=None)
+
+
+async def collect(db: AsyncSession) -> Snapshot:
+    """Full snapshot straight from the database."""
+    written_at = time.time()
+    watermark = await _max_updated(db)
+    tenants: Dict[str, TenantState] = {}
+    for row in (await db.execute(select(Flag).where(Flag.deleted_at.is_(None)))).scalars():
+        tenants.setdefault(row.tenant_id, TenantState()).flags[row.key] = flag_to_dict(row)
+    for row in (await db.execute(select(Segment))).scalars():
+        state = tenants.setdefault(row.tenant_id, TenantState())
+        state.segments[row.key] = row.criteria or {}
+        state.segment_versions[row.key] = row.updated_at.isoformat() if row.updated_at else ""
+    return Snapshot(watermark, written_at, tenants)
+
+
+async def catch_up(db: AsyncSession, snap: Snapshot, overlap: float = settings.change_overlap_seconds) -> int:
+    """
+    Apply writes made since `snap` was taken, in place. Flags and segments
+    changed at or after the watermark minus `overlap` seconds are re-read
+    (soft-deleted flags are dropped): updated_at is stamped before commit,
+    so a row committed after the snapshot can carry an older timestamp.
+    Hard-deleted segments are found through their audit rows, the same way.
+    Returns the number of rows applied.
+    """
+    applied = 0
+    new_wm = snap.watermark
+    lag = timedelta(seconds=overlap)
+    flag_q, seg_q = select(Flag), select(Segment)
+    if snap.watermark is not None:
+        flag_q = flag_q.where(Flag.updated_at >= snap.watermark - lag)
+        seg_q = seg_q.where(Segment.updated_at >= snap.watermark - lag)
+    for row in (await db.execute(flag_q)).scalars():
+        state = snap.tenants.setdefault(row.tenant_id, TenantState())
+        if row.deleted_at is None:
+            state.flags[row.key] = flag_to_dict(row)
+        else:
+            state.flags.pop(row.key, None)
+        new_wm = max(new_wm, row.updated_at) if new_wm else row.updated_at
+        applied += 1
+    live = set()
+    for row in (await db.execute(seg_q)).scalars():
+        live.add((row.tenant_id, row.key))
+        state = snap.tenants.setdefault(row.tenant_id, TenantState())
+        state.segments[row.key] = row.criteria or {}
+        state.segment_versions[row.key] = row.updated_at.isoformat() if row.updated_at else ""
+        new_wm = max(new_wm, row.updated_at) if new_wm else row.updated_at
+        applied += 1
+    deletes = select(Audit.tenant_id, Audit.entity_key).where(
+        Audit.entity == "segment", Audit.action == "delete",
+        Audit.ts >= datetime.utcfromtimestamp(snap.written_at) - lag)
+    for tenant, key in (await db.execute(deletes)).all():
+        if (tenant, key) in live:  # re-created since
+            continue
+        deleted_from = snap.tenants.get(tenant)
+        if deleted_from is not None and deleted_from.segments.pop(key, None) is not None:
+            deleted_from.segment_versions.pop(key, None)
+            applied += 1
+    snap.watermark = new_wm
+    return applied
+
+
+def read_snapshot(path: str) -> Optional[Snapshot]:
+    try:
+        with open(path, "rb") as f:
+            return Snapshot.from_json(f.read())
+    except FileNotFoundError:
+        return None
+    except (ValueError, KeyError, TypeError):
+        log.warning("ignoring unreadable snapshot", extra={"snapshot_path": path})
+        return None
+
+
+def write_snapshot(path: str, snap: Snapshot):
+    """Atomic: readers see the old file or the new one, never a partial write."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".snapshot-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(snap.to_json())
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+Prime = Callable[[str, List[Dict[str, Any]], SegmentSnapshot], None]
+
+
+class WarmStart:
+    """
+    Boot-time cache warm-up and readiness.
+
+    `run` loads the snapshot file when there is one (else reads everything
+    from the DB), catches up on writes since, and hands each tenant to
+    `prime`. Tenants that see a change event while warming are skipped
+    rather than primed with data the event may have outdated. `ready` flips
+    once that is done, or failed: a worker that couldn't warm still serves,
+    just cold. With a path set, the file is rewritten every `interval`
+    seconds and on shutdown, for the next boot.
+    """
+
+    def __init__(self, session_factory: Callable[[], Any], path: Optional[str] = None, interval: float = 300.0):
+        self.session_factory = session_factory
+        self.path = path
+        self.interval = interval
+        self.ready = asyncio.Event()
+        self._touched: Set[str] = set()
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    def on_change(self, event: ChangeEvent):
+        if not self.ready.is_set():
+            self._touched.add(event.tenant)
+
+    async def run(self, prime: Prime):
+        start = time.perf_counter()
+        source = "db"
+        try:
+            async with self.session_factory() as db:
+                snap = read_snapshot(self.path) if self.path else None
+                if snap is not None:
+                    source = "file"
+                    SNAPSHOT_AGE.set(max(0.0, time.time() - snap.written_at))
+                    await catch_up(db, snap)
+                else:
+                    SNAPSHOT_AGE.set(0)
+                    snap = await collect(db)
+            for tenant, state in snap.tenants.items():
+                if tenant in self._touched or "*" in self._touched:  # '*': ChangeEvent.everything()
+                    continue
+                prime(tenant, sorted(state.flags.values(), key=lambda f: f["key"]), state.segment_snapshot())
+            WARM_SECONDS.labels(source).observe(time.perf_counter() - start)
+            log.info("cache warm", extra={"source": source, "tenants": len(snap.tenants)})
+        except Exception:
+            log.exception("warm start failed; serving cold")
+        finally:
+            self.ready.set()
+
+    async def write(self):
+        if not self.path:
+            return
+        async with self.session_factory() as db:
+            snap = await collect(db)
+        await asyncio.get_running_loop().run_in_executor(None, write_snapshot, self.path, snap)
+
+    async def start(self, prime: Prime):
+        self._task = asyncio.create_task(self._run(prime))
+
+    async def _run(self, prime: Prime):
+        await self.run(prime)
+        if not self.path:
+            return
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.write()
+            except Exception:
+                log.exception("snapshot write failed")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.write()
+        except Exception:
+            log.exception("snapshot write failed")
+
+
+warm = WarmStart(ReadSessionLocal, settings.snapshot_path, settings.snapshot_interval_seconds)
+bus.subscribe(warm.on_change)
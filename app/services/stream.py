@@ -0,0 +1,140 @@
+# app/services/stream.py
+import asyncio
+import json
+import secrets
+from collections import deque
+from dataclasses import dataclass, field, replace
+from typing import AsyncIterator, Deque, Dict, List, Optional, Set, Tuple
+
+from prometheus_client import Counter, Gauge
+
+from app.config import settings
+from app.services.changes import ChangeEvent, bus
+
+STREAM_CONNECTIONS = Gauge("stream_connections", "Open change-feed (SSE) connections")
+STREAM_DROPPED = Counter("stream_dropped_total", "Change-feed connections dropped for falling behind")
+
+
+@dataclass(eq=False)
+class _Subscriber:
+    queue: "asyncio.Queue[Optional[Tuple[int, ChangeEvent]]]"
+
+
+@dataclass
+class _TenantFeed:
+    replay: Deque[Tuple[int, ChangeEvent]]
+    subscribers: Set[_Subscriber] = field(default_factory=set)
+    # Highest sequence number pushed out of `replay`; resuming from before it would miss events.
+    evicted_through: int = 0
+
+
+class ChangeFeed:
+    """
+    Per-tenant fan-out of ChangeEvents to SSE connections.
+
+    Event ids are "<epoch>-<seq>": `seq` is a per-worker counter and `epoch`
+    is random per feed, so a Last-Event-ID from another worker (or from
+    before a restart, on any host) is recognised and answered with a `reset`
+    event telling the client to resync, as is one older than the replay
+    buffer or ahead of the counter.
+
+    Each connection owns a bounded queue. A connection whose queue fills up
+    is dropped rather than buffered: its stream ends, and the client
+    reconnects with Last-Event-ID and replays from the buffer if it can.
+    """
+
+    def __init__(self, replay_size: int = 1_000, queue_size: int = 256, heartbeat: float = 15.0):
+        self.replay_size = replay_size
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self.epoch = secrets.token_hex(8)
+        self._seq = 0
+        self._tenants: Dict[str, _TenantFeed] = {}
+
+    def _feed(self, tenant: str) -> _TenantFeed:
+        feed = self._tenants.get(tenant)
+        if feed is None:
+            feed = self._tenants[tenant] = _TenantFeed(deque())
+        return feed
+
+    def dispatch(self, event: ChangeEvent) -> None:
+        if event.entity == "all":
+            # Clients see it as a tenant-wide change in each tenant with a feed.
+            for tenant in list(self._tenants):
+                self.dispatch(replace(event, tenant=tenant, entity="tenant"))
+            return
+        self._seq += 1
+        item = (self._seq, event)
+        feed = self._feed(event.tenant)
+        if len(feed.replay) >= self.replay_size:
+            feed.evicted_through = feed.replay.popleft()[0]
+        feed.replay.append(item)
+        for sub in list(feed.subscribers):
+            try:
+                sub.queue.put_nowait(item)
+            except asyncio.QueueFull:
+                self._drop(feed, sub)
+
+    def _drop(self, feed: _TenantFeed, sub: _Subscriber) -> None:
+        feed.subscribers.discard(sub)
+        STREAM_DROPPED.inc()
+        # Make room for the wake-up sentinel; the connection closes on it.
+        while not sub.queue.empty():
+            sub.queue.get_nowait()
+        sub.queue.put_nowait(None)
+
+    def _resume(self, feed: _TenantFeed, last_event_id: Optional[str]) -> Tuple[List[Tuple[int, ChangeEvent]], bool]:
+        """(events after `last_event_id`, whether the client must resync instead)."""
+        if not last_event_id:
+            return [], False
+        epoch, _, seq = last_event_id.partition("-")
+        if epoch != self.epoch or not seq.isdigit():
+            return [], True
+        after = int(seq)
+        if after < feed.evicted_through or after > self._seq:
+            return [], True
+        return [item for item in feed.replay if item[0] > after], False
+
+    def event_id(self, seq: int) -> str:
+        return f"{self.epoch}-{seq}"
+
+    async def listen(self, tenant: str, last_event_id: Optional[str] = None) -> AsyncIterator[bytes]:
+        """SSE frames for one connection: replay/reset, then live events and heartbeats."""
+        feed = self._feed(tenant)
+        sub = _Subscriber(asyncio.Queue(self.queue_size))
+        # Registration and the replay snapshot happen without an await in
+        # between, so no event can fall between the two.
+        feed.subscribers.add(sub)
+        backlog, reset = self._resume(feed, last_event_id)
+        STREAM_CONNECTIONS.inc()
+        try:
+            yield b"retry: 3000\n\n"
+            if reset:
+                yield self._frame(self.event_id(self._seq), "reset", {"tenant": tenant})
+            for seq, event in backlog:
+                yield self._change(seq, event)
+            while True:
+                try:
+                    item = await asyncio.wait_for(sub.queue.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield b": ping\n\n"
+                    continue
+                if item is None:
+                    return
+                yield self._change(*item)
+        finally:
+            feed.subscribers.discard(sub)
+            STREAM_CONNECTIONS.dec()
+
+    def _change(self, seq: int, event: ChangeEvent) -> bytes:
+        return self._frame(self.event_id(seq), "change", {
+            "entity": event.entity, "key": event.key, "version": event.version, "action": event.action,
+        })
+
+    @staticmethod
+    def _frame(event_id: str, kind: str, data: dict) -> bytes:
+        return f"id: {event_id}\nevent: {kind}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+
+
+feed = ChangeFeed(settings.stream_replay_size, settings.stream_queue_size, settings.stream_heartbeat_seconds)
+bus.subscribe(feed.dispatch)
@@ -0,0 +1,9 @@
+from datetime import datetime, timezone
+from typing import Optional
+
+
+def naive_utc(ts: Optional[datetime]) -> Optional[datetime]:
+    """`ts` as the naive UTC the timestamp columns store; naive values are taken to be UTC already."""
+    if ts is None or ts.tzinfo is None:
+        return ts
+    return ts.astimezone(timezone.utc).replace(tzinfo=None)
@@ -1,20 +1,177 @@
-import logging, json, sys
+import atexit, json, logging, queue, random, sys, time, uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Mapping, Optional
 
-def setup_logging(level: str = "INFO"):
+from prometheus_client import Counter
+
+try:
+    import orjson
+
+    def _dumps(payload: Dict[str, Any]) -> str:
+        return orjson.dumps(payload, default=str).decode()
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    def _dumps(payload: Dict[str, Any]) -> str:
+        return json.dumps(payload, default=str)
+
+LOG_DROPPED = Counter("log_records_dropped_total", "Log records dropped because the log queue was full")
+
+# Set per request by RequestContextMiddleware; copied onto every record logged inside the request.
+request_context: ContextVar[Optional[Dict[str, Any]]] = ContextVar("request_context", default=None)
+
+_listener: Optional[QueueListener] = None
+
+# LogRecord attributes that aren't `extra=` fields.
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+_CONTEXT_FIELDS = ("path", "method", "tenant", "request_id")
+
+
+def setup_logging(level: str = "INFO", mode: str = "queue", queue_size: int = 10_000):
+    """
+    JSON logs on stdout. In "queue" mode the loop thread only enqueues
+    records; a listener thread formats and writes them, and a full queue
+    drops records (log_records_dropped_total) rather than blocking.
+    """
+    global _listener
+    shutdown_logging()
     handler = logging.StreamHandler(sys.stdout)
-    formatter = JsonFormatter()
-    handler.setFormatter(formatter)
+    handler.setFormatter(JsonFormatter())
     root = logging.getLogger()
     root.setLevel(level)
-    root.handlers = [handler]
+    if mode == "queue":
+        q: "queue.Queue[logging.LogRecord]" = queue.Queue(queue_size)
+        front: logging.Handler = NonBlockingQueueHandler(q)
+        _listener = QueueListener(q, handler, respect_handler_level=True)
+        _listener.start()
+    else:
+        front = handler
+    front.addFilter(ContextFilter())
+    root.handlers = [front]
+
+
+def shutdown_logging():
+    """Flush and stop the listener thread, if one is running; later records are written inline."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        root = logging.getLogger()
+        for h in _listener.handlers:
+            h.addFilter(ContextFilter())
+        root.handlers = list(_listener.handlers)
+        _listener = None
+
+atexit.register(shutdown_logging)
+
+
+class ContextFilter(logging.Filter):
+    """Copies the current request context onto the record, on the thread that logged it."""
+
+    def filter(self, record):
+        ctx = request_context.get()
+        if ctx is not None:
+            for k in _CONTEXT_FIELDS:
+                if k not in record.__dict__:
+                    setattr(record, k, ctx.get(k))
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_DROPPED.inc()
+
+    def prepare(self, record):
+        # Keep only what's picklable and cheap: the rendered message and
+        # traceback text. JSON formatting happens on the listener thread.
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
+
 
 class JsonFormatter(logging.Formatter):
     def format(self, record):
         payload = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
             "level": record.levelname,
             "message": record.getMessage(),
             "logger": record.name,
         }
+        for k, v in record.__dict__.items():
+            if k not in _RESERVED and v is not None:
+                payload[k] = v
         if record.exc_info:
             payload["exc_info"] = self.formatException(record.exc_info)
-        return json.dumps(payload)
+        elif record.exc_text:
+            payload["exc_info"] = record.exc_text
+        return _dumps(payload)
+
+
+class AccessLogSampler:
+    """
+    Keep-probability for a request's access log line. A tenant rate wins over
+    a route rate (route = path template, e.g. /v1/evaluate); unlisted
+    requests and any 5xx are always logged.
+    """
+
+    def __init__(self, route_rates: Mapping[str, float], tenant_rates: Mapping[str, float]):
+        self.route_rates = dict(route_rates)
+        self.tenant_rates = dict(tenant_rates)
+
+    def rate(self, route: str, tenant: Optional[str], status: int) -> float:
+        if status >= 500:
+            return 1.0
+        if tenant is not None and tenant in self.tenant_rates:
+            return self.tenant_rates[tenant]
+        return self.route_rates.get(route, 1.0)
+
+    def keep(self, route: str, tenant: Optional[str], status: int) -> bool:
+        rate = self.rate(route, tenant, status)
+        return rate >= 1.0 or random.random() < rate
+
+
+class RequestContextMiddleware:
+    """
+    Pure ASGI: binds path/method/tenant/request_id into `request_context`
+    for everything logged during the request, echoes X-Request-ID, and
+    writes one (sampled) access log line when the response is done.
+    """
+
+    def __init__(self, app, sampler: Optional[AccessLogSampler] = None):
+        self.app = app
+        self.sampler = sampler or AccessLogSampler({}, {})
+        self.log = logging.getLogger("app.access")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        request_id = headers.get(b"x-request-id", b"").decode("latin-1") or uuid.uuid4().hex
+        tenant = headers.get(b"x-tenant-id", b"").decode("latin-1") or None
+        ctx = {"path": scope["path"], "method": scope["method"], "tenant": tenant, "request_id": request_id}
+        token = request_context.set(ctx)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", ())) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = getattr(scope.get("route"), "path", None) or scope["path"]
+            if self.log.isEnabledFor(logging.INFO) and self.sampler.keep(route, tenant, status):
+                self.log.info("request", extra={
+                    "status": status, "route": route,
+                    "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+                })
+            request_context.reset(token)
@@ -0,0 +1,58 @@
+import time
+from prometheus_client import Counter, Gauge, Histogram
+
+REQUEST_COUNT = Counter("http_requests_total", "Total HTTP requests", ["path", "method", "status"])
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Time from request start to the last response byte", ["path", "method"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+IN_FLIGHT = Gauge("http_requests_in_flight", "Requests currently being served")
+EVAL_OUTCOMES = Counter("flag_evaluations_total", "Flag evaluation results", ["reason", "variant"])
+
+# Requests that matched no route share one label instead of one series per probed URL.
+UNMATCHED = "<unmatched>"
+
+
+def route_template(scope) -> str:
+    """The matched route's path template (/v1/flags/{key}), set in the scope by the router."""
+    return getattr(scope.get("route"), "path", None) or UNMATCHED
+
+
+def count_evaluation(result: dict):
+    EVAL_OUTCOMES.labels(result["reason"], result["variant"]).inc()
+
+
+class MetricsMiddleware:
+    """
+    Request count, latency and in-flight metrics as plain ASGI.
+
+    Unlike BaseHTTPMiddleware this adds no task or memory stream per request
+    and leaves streaming bodies alone; the latency covers the whole body.
+    Paths are labelled by route template, read back from the scope after the
+    router has matched, so /v1/flags/{key} is one series.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            IN_FLIGHT.dec()
+            path, method = route_template(scope), scope["method"]
+            REQUEST_LATENCY.labels(path, method).observe(time.perf_counter() - start)
+            REQUEST_COUNT.labels(path, method, status).inc()
@@ -0,0 +1,178 @@
+import asyncio
+import cProfile
+import logging
+import os
+import random
+import re
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+
+from prometheus_client import Counter, Histogram
+
+from app.utils.metrics import route_template
+
+log = logging.getLogger(__name__)
+
+STAGE_SECONDS = Histogram(
+    "request_stage_seconds", "Time spent in each stage of request handling", ["stage"],
+    buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+             0.25, 1.0),
+)
+PROFILES_WRITTEN = Counter("profiles_written_total", "cProfile dumps written to PROFILE_DIR", ["trigger"])
+
+# Scope a token needs for the profile header to be honoured when auth is on (see app.deps.may_profile).
+PROFILE_SCOPE = "debug:profile"
+
+
+class Trace:
+    """Stage and per-rule timings collected for one profiled request."""
+    __slots__ = ("stages", "rules")
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.rules: List[Tuple[str, Optional[str], int, bool]] = []  # (flag_key, rule_id, ns, matched)
+
+    def add_rules(self, flag_key: str, timings: List[Tuple[Optional[str], int, bool]]):
+        self.rules.extend((flag_key, rule_id, ns, hit) for rule_id, ns, hit in timings)
+
+    def server_timing(self, total: float) -> str:
+        """Server-Timing value: stages in first-seen order, then each rule tried, then the total (ms)."""
+        parts = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in self.stages.items()]
+        for flag_key, rule_id, ns, hit in self.rules:
+            desc = f"{flag_key}/{rule_id or '-'} {'match' if hit else 'miss'}".replace("\\", "\\\\").replace('"', '\\"')
+            parts.append(f'rule;desc="{desc}";dur={ns / 1e6:.3f}')
+        parts.append(f"total;dur={total * 1000:.3f}")
+        return ", ".join(parts)
+
+
+_trace: ContextVar[Optional[Trace]] = ContextVar("profile_trace", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    """The trace of the request being served, when it asked to be profiled."""
+    return _trace.get()
+
+
+_stage_metrics: Dict[str, Histogram] = {}
+
+
+class stage:
+    """
+    Time a block into request_stage_seconds{stage} and, for a profiled
+    request, into its trace. Repeated stages within a request add up.
+
+        with stage("db"):
+            row = await load_flag(db, tenant, key)
+    """
+    __slots__ = ("name", "_metric", "_start")
+
+    def __init__(self, name: str):
+        self.name = name
+        metric = _stage_metrics.get(name)
+        if metric is None:
+            metric = _stage_metrics[name] = STAGE_SECONDS.labels(name)
+        self._metric = metric
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self._start
+        self._metric.observe(elapsed)
+        trace = _trace.get()
+        if trace is not None:
+            trace.stages[self.name] = trace.stages.get(self.name, 0.0) + elapsed
+
+
+# cProfile hooks the whole interpreter; only one profile runs at a time.
+_profiling = False
+
+_UNSAFE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+class ProfilingMiddleware:
+    """
+    Opt-in request profiling as plain ASGI.
+
+    A request carrying `header` from a caller `authorize` accepts (given the
+    Authorization header) gets a Trace: stage timings (see `stage`) and, on
+    evaluate paths, per-rule match timings, returned in a Server-Timing
+    header. A header value of "cprofile" also runs cProfile over the request
+    and writes the stats to `profile_dir`. The header is ignored, at no
+    cost, for anyone else. Independently, `sample_rate` of all requests are
+    cProfiled into `profile_dir`. cProfile sees every coroutine the loop
+    runs meanwhile, so sampled dumps describe the process under load rather
+    than the one request in isolation.
+    """
+
+    def __init__(self, app, authorize: Callable[[str], bool], header: str = "X-Debug-Profile",
+                 profile_dir: Optional[str] = None, sample_rate: float = 0.0):
+        self.app = app
+        self.authorize = authorize
+        self.header = header.lower().encode()
+        self.profile_dir = profile_dir
+        self.sample_rate = sample_rate if profile_dir else 0.0
+        if profile_dir:
+            os.makedirs(profile_dir, exist_ok=True)
+
+    def _requested(self, scope) -> Optional[str]:
+        requested, authorization = None, ""
+        for name, value in scope["headers"]:
+            if name == self.header:
+                requested = value.decode("latin-1").strip().lower()
+            elif name == b"authorization":
+                authorization = value.decode("latin-1")
+        if requested is None or not self.authorize(authorization):
+            return None
+        return requested
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        requested = self._requested(scope)
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        if requested is None and not sampled:
+            await self.app(scope, receive, send)
+            return
+
+        global _profiling
+        trace = Trace()
+        token = _trace.set(trace)
+        profiler = None
+        if (sampled or requested == "cprofile") and self.profile_dir and not _profiling:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+                _profiling = True
+            except ValueError:  # another profiler (a debugger, say) owns the hook
+                profiler = None
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and requested is not None:
+                timing = trace.server_timing(time.perf_counter() - start)
+                message = {**message, "headers": [*message.get("headers", []),
+                                                  (b"server-timing", timing.encode("latin-1", "replace"))]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _trace.reset(token)
+            if profiler is not None:
+                profiler.disable()
+                _profiling = False
+                await self._dump(profiler, scope, "sample" if sampled else "header")
+
+    async def _dump(self, profiler: cProfile.Profile, scope, trigger: str):
+        assert self.profile_dir is not None  # profilers only start when there is somewhere to dump them
+        route = _UNSAFE.sub("_", route_template(scope)).strip("_") or "root"
+        path = os.path.join(self.profile_dir, f"{time.time_ns() // 1_000_000}-{scope['method']}-{route}-{trigger}.prof")
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, profiler.dump_stats, path)
+            PROFILES_WRITTEN.labels(trigger).inc()
+        except OSError:
+            log.exception("could not write profile", extra={"profile_path": path})
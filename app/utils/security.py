@@ -1,16 +1,129 @@
-from datetime import datetime, timedelta
+import hashlib
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, FrozenSet, Iterable, Optional
 from jose import jwt, JWTError
 from fastapi import HTTPException, status
+from prometheus_client import Counter, Gauge
 
 ALGO = "HS256"
 
+AUTH_VERIFICATIONS = Counter("auth_verifications_total", "Bearer token checks", ["result"])  # hit | miss | invalid | revoked
+AUTH_CACHE_ENTRIES = Gauge("auth_cache_entries", "Verified tokens held in the token cache")
+
 def issue_token(secret: str, client_id: str, scopes: list[str]) -> str:
-    now = datetime.utcnow()
+    now = datetime.now(timezone.utc)
     payload = {"sub": client_id, "scopes": scopes, "iat": now.timestamp(), "exp": (now + timedelta(hours=6)).timestamp()}
     return jwt.encode(payload, secret, algorithm=ALGO)
 
+def unauthorized(detail: str = "Invalid token") -> HTTPException:
+    return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=detail, headers={"WWW-Authenticate": "Bearer"})
+
 def verify_token(secret: str, token: str) -> dict:
     try:
-        return jwt.decode(token, secret, algorithms=[ALGO])
+        return jwt.decode(token, secret, algorithms=[ALGO], options={"require_exp": True})
     except JWTError:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+        raise unauthorized()
+
+def expand_scopes(scopes: Iterable[str]) -> FrozenSet[str]:
+    """Granted scopes plus what they imply: `<resource>:rw` also grants `<resource>:r`."""
+    out = set(scopes)
+    out.update(s[:-1] for s in list(out) if s.endswith(":rw"))
+    return frozenset(out)
+
+
+class Principal:
+    """Verified token claims with the expanded scope set precomputed once per token."""
+    __slots__ = ("claims", "scopes", "exp")
+
+    def __init__(self, claims: Dict[str, Any]):
+        self.claims = claims
+        raw = claims.get("scopes") or []
+        self.scopes = expand_scopes([raw] if isinstance(raw, str) else raw)
+        self.exp = float(claims["exp"])
+
+
+class TokenCache:
+    """
+    Verified tokens by SHA-256 of the token string, each held until its own
+    `exp`, LRU-bounded. A hit skips the HMAC check and claim parsing.
+
+    Revocation: `revoke(token)` denies one token until it expires;
+    `revoke_subject(sub)` denies every token for `sub` issued before now
+    (credential rotation). Both drop matching cached entries.
+    """
+
+    def __init__(self, secret: str, max_entries: int = 10_000):
+        self.secret = secret
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, Principal]" = OrderedDict()
+        self._revoked: Dict[bytes, float] = {}
+        self._subjects_revoked_at: Dict[str, float] = {}
+
+    @staticmethod
+    def _digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def verify(self, token: str) -> Principal:
+        digest = self._digest(token)
+        now = time.time()
+        principal = self._entries.get(digest)
+        if principal is not None and principal.exp > now:
+            self._entries.move_to_end(digest)
+            AUTH_VERIFICATIONS.labels("hit").inc()
+            return principal
+        if principal is not None:
+            del self._entries[digest]
+        if digest in self._revoked:
+            AUTH_VERIFICATIONS.labels("revoked").inc()
+            raise unauthorized("Token revoked")
+        try:
+            principal = Principal(verify_token(self.secret, token))
+        except HTTPException:
+            AUTH_VERIFICATIONS.labels("invalid").inc()
+            raise
+        if self._is_subject_revoked(principal):
+            AUTH_VERIFICATIONS.labels("revoked").inc()
+            raise unauthorized("Token revoked")
+        AUTH_VERIFICATIONS.labels("miss").inc()
+        self._entries[digest] = principal
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        AUTH_CACHE_ENTRIES.set(len(self._entries))
+        return principal
+
+    def _is_subject_revoked(self, principal: Principal) -> bool:
+        cutoff = self._subjects_revoked_at.get(str(principal.claims.get("sub")))
+        return cutoff is not None and float(principal.claims.get("iat") or 0) < cutoff
+
+    def revoke(self, token: str):
+        digest = self._digest(token)
+        principal = self._entries.pop(digest, None)
+        if principal is not None:
+            exp = principal.exp
+        else:
+            try:
+                exp = float(jwt.get_unverified_claims(token)["exp"])
+            except (JWTError, KeyError, TypeError, ValueError):
+                return  # not a token verify() would ever accept
+        self._revoked[digest] = exp
+        self._prune_revoked()
+        AUTH_CACHE_ENTRIES.set(len(self._entries))
+
+    def revoke_subject(self, sub: str, before: Optional[float] = None):
+        self._subjects_revoked_at[sub] = time.time() if before is None else before
+        for digest in [d for d, p in self._entries.items() if str(p.claims.get("sub")) == sub]:
+            principal = self._entries[digest]
+            if self._is_subject_revoked(principal):
+                del self._entries[digest]
+        AUTH_CACHE_ENTRIES.set(len(self._entries))
+
+    def _prune_revoked(self):
+        now = time.time()
+        for digest in [d for d, exp in self._revoked.items() if exp <= now]:
+            del self._revoked[digest]
+
+    def clear(self):
+        self._entries.clear()
+        AUTH_CACHE_ENTRIES.set(0)
@@ -0,0 +1,75 @@
+"""
+Run the benchmark suite, save results as JSON and compare with a baseline.
+
+    PYTHONPATH=. python -m benchmarks                         # everything, print table
+    PYTHONPATH=. python -m benchmarks -s eval_compiled -s cache_hit --scale 0.2
+    PYTHONPATH=. python -m benchmarks --out bench.json --baseline benchmarks/baseline.json --threshold 0.15
+
+Exits 1 when any scenario regresses past the threshold against --baseline.
+Runs against a throwaway SQLite database with auth off and the in-process
+change bus; no network access needed.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+
+# Before anything imports app.config.
+os.environ.setdefault("DB_DSN", f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench.db")
+os.environ.setdefault("AUTH_ENABLED", "false")
+os.environ.setdefault("CHANGE_BUS", "inprocess")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from benchmarks import runner  # noqa: E402
+from benchmarks.scenarios import SCENARIOS, Context, shutdown  # noqa: E402
+
+
+async def run(names, ctx: Context):
+    results = {}
+    try:
+        for name in names:
+            print(f"running {name} ...", file=sys.stderr)
+            results[name] = await SCENARIOS[name](ctx)
+    finally:
+        await shutdown()
+    return results
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("-s", "--scenario", action="append", choices=sorted(SCENARIOS), help="repeatable; default all")
+    p.add_argument("--scale", type=float, default=1.0, help="multiplier on iteration counts")
+    p.add_argument("--tenants", type=int, default=4)
+    p.add_argument("--flags", type=int, default=50)
+    p.add_argument("--rules", type=int, default=4)
+    p.add_argument("--segments", type=int, default=20)
+    p.add_argument("--concurrency", type=int, default=16)
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--out", help="write results JSON here")
+    p.add_argument("--baseline", help="results JSON to compare against")
+    p.add_argument("--threshold", type=float, default=0.2, help="allowed p95/throughput regression (0.2 = 20%%)")
+    args = p.parse_args(argv)
+
+    ctx = Context(scale=args.scale, tenants=args.tenants, flags=args.flags, rules=args.rules,
+                  segments=args.segments, concurrency=args.concurrency, seed=args.seed)
+    names = args.scenario or list(SCENARIOS)
+    results = asyncio.run(run(names, ctx))
+    print(runner.report(results))
+    data = runner.to_json(results, ctx.params())
+    if args.out:
+        runner.save(args.out, data)
+    if args.baseline:
+        if not os.path.exists(args.baseline):
+            print(f"no baseline at {args.baseline}; skipping comparison", file=sys.stderr)
+            return 0
+        lines, regressions = runner.compare(data, runner.load(args.baseline), args.threshold)
+        print("\n".join(["", f"vs {args.baseline}:"] + lines))
+        if regressions:
+            print(f"regressed: {', '.join(regressions)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
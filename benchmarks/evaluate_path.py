@@ -0,0 +1,121 @@
+"""
+Per-request CPU of /v1/evaluate with and without the fast path
+(EVALUATE_FAST_PATH; see app.services.fast_evaluate).
+
+Drives the full app (middleware, auth off, cached plans) in-process through
+raw ASGI calls against a throwaway SQLite database, once per mode, over a
+mix of flag-off, fixed-variant-rule and distribution outcomes. Also times
+the request parsing and response encoding steps on their own.
+
+    PYTHONPATH=. python -m benchmarks.evaluate_path [--requests 20000]
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+# Before anything imports app.config.
+os.environ.setdefault("DB_DSN", f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench.db")
+os.environ.setdefault("AUTH_ENABLED", "false")
+os.environ.setdefault("CHANGE_BUS", "inprocess")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from fastapi.responses import JSONResponse  # noqa: E402
+
+from app.config import settings  # noqa: E402
+from app.schemas import EvaluateRequest, EvaluateResponse  # noqa: E402
+from app.services.fast_evaluate import evaluation_body, parse_evaluate  # noqa: E402
+from benchmarks.runner import measure  # noqa: E402
+
+TENANT = "bench-eval"
+FLAGS = [
+    {"key": "killswitch", "state": "off", "variants": [{"key": "off", "weight": 1}], "rules": []},
+    {"key": "vip", "state": "on", "variants": [{"key": "a", "weight": 1}, {"key": "b", "weight": 1}],
+     "rules": [{"id": "vip", "when": {"attr": {"tier": "vip"}}, "rollout": {"variant": "b"}}]},
+    {"key": "split", "state": "on", "variants": [{"key": "a", "weight": 50}, {"key": "b", "weight": 50}], "rules": []},
+]
+
+
+async def _seed():
+    from app.deps import SessionLocal, engine
+    from app.models import Base, Flag
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with SessionLocal() as db:
+        for f in FLAGS:
+            db.add(Flag(tenant_id=TENANT, **f))
+        await db.commit()
+
+
+def _bodies(n: int):
+    return [json.dumps({"flag_key": FLAGS[i % len(FLAGS)]["key"],
+                        "user": {"id": f"u{i}", "attributes": {"tier": "vip" if i % 2 else "free", "country": "US"}}}
+                       ).encode() for i in range(n)]
+
+
+async def _drive(app, bodies) -> float:
+    """CPU seconds per request over `bodies`, after a warm-up pass."""
+    headers = [(b"content-type", b"application/json"), (b"x-tenant-id", TENANT.encode())]
+
+    async def send(message):
+        if message["type"] == "http.response.start" and message["status"] != 200:
+            raise RuntimeError(f"status {message['status']}")
+
+    async def call(body: bytes):
+        async def receive():
+            return {"type": "http.request", "body": body, "more_body": False}
+        scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+                 "scheme": "http", "path": "/v1/evaluate", "raw_path": b"/v1/evaluate", "root_path": "",
+                 "query_string": b"", "headers": headers, "client": ("127.0.0.1", 1), "server": ("bench", 80)}
+        await app(scope, receive, send)
+
+    for body in bodies[:500]:
+        await call(body)
+    start = time.process_time()
+    for body in bodies:
+        await call(body)
+    return (time.process_time() - start) / len(bodies)
+
+
+async def run(n: int) -> dict:
+    from app.main import app
+
+    await _seed()
+    bodies = _bodies(n)
+    results = {}
+    for name, fast in (("validated", False), ("fast", True)):
+        settings.evaluate_fast_path = fast
+        results[name] = await _drive(app, bodies) * 1e6
+    return results
+
+
+def _steps(n: int) -> dict:
+    body = _bodies(1)[0]
+    result = {"variant": "b", "reason": "rule_match", "rule_id": "vip", "details": {"bucket": 0.4213377}}
+    return {
+        "parse: EvaluateRequest": measure(lambda i: EvaluateRequest.model_validate_json(body), n).p50_us,
+        "parse: lean": measure(lambda i: parse_evaluate(body), n).p50_us,
+        "encode: EvaluateResponse+JSONResponse":
+            measure(lambda i: JSONResponse(EvaluateResponse.model_validate(result).model_dump(mode="json")), n).p50_us,
+        "encode: prebuilt head": measure(lambda i: evaluation_body(result), n).p50_us,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20_000)
+    args = parser.parse_args()
+    results = asyncio.run(run(args.requests))
+    saved = results["validated"] - results["fast"]
+    for name, us in results.items():
+        print(f"{name:>10}: {us:8.1f} us CPU/request")
+    print(f"     saved: {saved:8.1f} us CPU/request ({saved / results['validated']:.0%})")
+    for step, us in _steps(args.requests).items():
+        print(f"{step:>38}: {us:6.2f} us p50")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Per-request overhead of the metrics middleware.
+
+Drives three otherwise identical apps in-process through raw ASGI calls (no
+server, no HTTP client): no middleware, the previous BaseHTTPMiddleware
+implementation, and app.utils.metrics.MetricsMiddleware.
+
+    PYTHONPATH=. python -m benchmarks.middleware [--requests 20000]
+"""
+import argparse
+import asyncio
+import time
+
+from fastapi import FastAPI, Request
+from prometheus_client import CollectorRegistry, Counter
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.utils.metrics import MetricsMiddleware
+
+_legacy_count = Counter("http_requests_total", "Total HTTP requests", ["path", "method", "status"],
+                        registry=CollectorRegistry())
+
+
+class LegacyMetricsMiddleware(BaseHTTPMiddleware):
+    """The middleware app/main.py used before, kept for comparison."""
+
+    async def dispatch(self, request: Request, call_next):
+        response = None
+        try:
+            response = await call_next(request)
+            return response
+        finally:
+            status = getattr(response, "status_code", 500)
+            _legacy_count.labels(path=request.url.path, method=request.method, status=status).inc()
+
+
+def build_app(middleware=None) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/v1/flags/{key}")
+    async def get_flag(key: str):
+        return {"key": key, "state": "on"}
+
+    if middleware is not None:
+        app.add_middleware(middleware)
+    return app
+
+
+async def _drive(app, n: int) -> float:
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        return None
+
+    def scope(i):
+        return {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+                "scheme": "http", "path": f"/v1/flags/f{i % 1000}", "raw_path": b"", "root_path": "",
+                "query_string": b"", "headers": [], "client": ("127.0.0.1", 1), "server": ("test", 80)}
+
+    for i in range(min(n, 500)):  # warm-up
+        await app(scope(i), receive, send)
+    start = time.perf_counter()
+    for i in range(n):
+        await app(scope(i), receive, send)
+    return time.perf_counter() - start
+
+
+def run(n: int) -> dict:
+    results = {}
+    for name, mw in (("none", None), ("base_http", LegacyMetricsMiddleware), ("asgi", MetricsMiddleware)):
+        elapsed = asyncio.run(_drive(build_app(mw), n))
+        results[name] = elapsed / n * 1e6
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20_000)
+    args = parser.parse_args()
+    results = run(args.requests)
+    base = results["none"]
+    for name, us in results.items():
+        print(f"{name:>10}: {us:8.1f} us/request  (+{us - base:6.1f} us over no middleware)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Timing, reporting and baseline comparison for the benchmark scenarios."""
+import asyncio
+import json
+import platform
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+@dataclass
+class Result:
+    ops: int
+    seconds: float
+    throughput: float  # ops/s
+    p50_us: float
+    p95_us: float
+    p99_us: float
+
+    @classmethod
+    def from_samples(cls, samples_ns: List[int], wall: float) -> "Result":
+        samples_ns.sort()
+        n = len(samples_ns)
+
+        def pct(p: float) -> float:
+            return samples_ns[min(n - 1, int(p * n))] / 1000
+
+        return cls(ops=n, seconds=round(wall, 4), throughput=round(n / wall, 1),
+                   p50_us=round(pct(0.50), 2), p95_us=round(pct(0.95), 2), p99_us=round(pct(0.99), 2))
+
+
+def measure(fn: Callable[[int], Any], n: int, warmup: int = 100) -> Result:
+    """Call fn(i) `n` times, timing each call."""
+    for i in range(min(warmup, n)):
+        fn(i)
+    clock = time.perf_counter_ns
+    samples = [0] * n
+    start = time.perf_counter()
+    for i in range(n):
+        t0 = clock()
+        fn(i)
+        samples[i] = clock() - t0
+    return Result.from_samples(samples, time.perf_counter() - start)
+
+
+async def measure_async(fn: Callable[[int], Awaitable[Any]], n: int, concurrency: int = 1, warmup: int = 20) -> Result:
+    """Run `n` calls of `await fn(i)` spread over `concurrency` workers, timing each call."""
+    for i in range(min(warmup, n)):
+        await fn(i)
+    clock = time.perf_counter_ns
+    samples: List[int] = []
+    counter = iter(range(n))
+
+    async def worker():
+        for i in counter:
+            t0 = clock()
+            await fn(i)
+            samples.append(clock() - t0)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return Result.from_samples(samples, time.perf_counter() - start)
+
+
+def report(results: Dict[str, Result]) -> str:
+    lines = [f"{'scenario':<28}{'ops/s':>12}{'p50 us':>11}{'p95 us':>11}{'p99 us':>11}"]
+    for name, r in results.items():
+        lines.append(f"{name:<28}{r.throughput:>12.1f}{r.p50_us:>11.1f}{r.p95_us:>11.1f}{r.p99_us:>11.1f}")
+    return "\n".join(lines)
+
+
+def to_json(results: Dict[str, Result], params: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "params": params,
+        },
+        "scenarios": {name: asdict(r) for name, r in results.items()},
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> Tuple[List[str], List[str]]:
+    """
+    (report lines, regressions) for scenarios present in both runs. A
+    scenario regresses when its p95 grows, or its throughput drops, by more
+    than `threshold` (0.2 = 20%).
+    """
+    lines, regressions = [], []
+    base = baseline.get("scenarios", {})
+    for name, cur in current["scenarios"].items():
+        old: Optional[Dict[str, Any]] = base.get(name)
+        if old is None:
+            lines.append(f"{name:<28} (no baseline)")
+            continue
+        p95 = cur["p95_us"] / old["p95_us"] - 1 if old["p95_us"] else 0.0
+        tput = cur["throughput"] / old["throughput"] - 1 if old["throughput"] else 0.0
+        bad = p95 > threshold or tput < -threshold
+        lines.append(f"{name:<28} p95 {p95:+7.1%}  throughput {tput:+7.1%}{'  REGRESSION' if bad else ''}")
+        if bad:
+            regressions.append(name)
+    return lines, regressions
+
+
+def load(path: str) -> Dict[str, Any]:
+    with open(path) as f:
+        return json.load(f)
+
+
+def save(path: str, data: Dict[str, Any]):
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+        f.write("\n")
+
@@ -0,0 +1,189 @@
+"""
+Benchmark scenarios. Each takes a `Context` and returns a `runner.Result`.
+
+In-process scenarios exercise the evaluator and cache directly; `http_*`
+scenarios drive the full ASGI app (middleware, routing, validation, SQLite)
+in-process through httpx, so nothing touches the network.
+"""
+import asyncio
+import itertools
+import random
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List
+
+from app.services.cache import TTLCache
+from app.services.flag_eval import compile_flag, evaluate_flag
+from app.services.segment_index import SegmentIndex
+from benchmarks.runner import Result, measure, measure_async
+from scripts.seed import synthetic_tenants, synthetic_user
+
+
+@dataclass
+class Context:
+    scale: float = 1.0
+    tenants: int = 4
+    flags: int = 50
+    rules: int = 4
+    segments: int = 20
+    users: int = 2_000
+    concurrency: int = 16
+    seed: int = 42
+    data: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    user_pool: List[Dict[str, Any]] = field(default_factory=list)
+
+    def __post_init__(self):
+        self.data = synthetic_tenants(self.tenants, self.flags, self.rules, self.segments, self.seed)
+        rng = random.Random(self.seed)
+        self.user_pool = [synthetic_user(rng, i) for i in range(self.users)]
+
+    def n(self, base: int) -> int:
+        return max(10, int(base * self.scale))
+
+    def params(self) -> Dict[str, Any]:
+        return {k: getattr(self, k) for k in ("scale", "tenants", "flags", "rules", "segments", "users", "concurrency", "seed")}
+
+
+SCENARIOS: Dict[str, Callable[[Context], Awaitable[Result]]] = {}
+
+
+def scenario(fn: Callable[[Context], Awaitable[Result]]):
+    SCENARIOS[fn.__name__] = fn
+    return fn
+
+
+def _workload(ctx: Context):
+    """(tenant, flag, segments) triples cycled against the user pool."""
+    return [(t, f, d["segments"]) for t, d in ctx.data.items() for f in d["flags"]]
+
+
+@scenario
+async def eval_interpreted(ctx: Context) -> Result:
+    """evaluate_flag: compile + evaluate per call (the uncached path)."""
+    work, users = _workload(ctx), ctx.user_pool
+    return measure(lambda i: evaluate_flag(work[i % len(work)][1], work[i % len(work)][0], users[i % len(users)],
+                                           work[i % len(work)][2]), ctx.n(20_000))
+
+
+@scenario
+async def eval_compiled(ctx: Context) -> Result:
+    """CompiledFlag.evaluate on plans built once (the cached hot path)."""
+    plans = [(t, compile_flag(f, segs)) for t, f, segs in _workload(ctx)]
+    users = ctx.user_pool
+    return measure(lambda i: plans[i % len(plans)][1].evaluate(plans[i % len(plans)][0], users[i % len(users)]),
+                   ctx.n(200_000))
+
+
+@scenario
+async def eval_all_flags_indexed(ctx: Context) -> Result:
+    """One user against every flag of a tenant, segment membership from the inverted index (bootstrap)."""
+    tenant, d = next(iter(ctx.data.items()))
+    plans = [compile_flag(f, d["segments"]) for f in d["flags"]]
+    index = SegmentIndex(d["segments"])
+    users = ctx.user_pool
+
+    def run(i: int):
+        user = users[i % len(users)]
+        members = index.members(user["attributes"])
+        for p in plans:
+            p.evaluate(tenant, user, members=members)
+
+    return measure(run, ctx.n(5_000))
+
+
+@scenario
+async def cache_hit(ctx: Context) -> Result:
+    cache = TTLCache(ttl_seconds=3600, name="bench")
+    keys = [f"t:flag:{i}" for i in range(1000)]
+    for k in keys:
+        cache.set(k, k)
+
+    async def load():
+        return None
+
+    return await measure_async(lambda i: cache.get_or_load(keys[i % len(keys)], load), ctx.n(200_000))
+
+
+@scenario
+async def cache_miss(ctx: Context) -> Result:
+    cache = TTLCache(ttl_seconds=3600, max_entries=10_000, name="bench")
+    seq = itertools.count()
+
+    async def load():
+        await asyncio.sleep(0)
+        return 1
+
+    return await measure_async(lambda i: cache.get_or_load(f"t:flag:{next(seq)}", load), ctx.n(50_000))
+
+
+# --- full stack -------------------------------------------------------------
+
+_app_ready = False
+
+
+async def _client(ctx: Context):
+    """An httpx client on the app, with the synthetic tenants seeded once per process."""
+    global _app_ready
+    import httpx
+    from app.deps import engine
+    from app.main import app
+    from app.models import Base
+    from scripts.seed import seed_synthetic
+
+    if not _app_ready:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        await seed_synthetic(ctx.tenants, ctx.flags, ctx.rules, ctx.segments, ctx.seed)
+        await app.router.startup()
+        _app_ready = True
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+
+
+async def shutdown():
+    if _app_ready:
+        from app.main import app
+        await app.router.shutdown()
+
+
+@scenario
+async def http_evaluate(ctx: Context) -> Result:
+    work, users = _workload(ctx), ctx.user_pool
+    async with await _client(ctx) as ac:
+        async def call(i: int):
+            tenant, flag, _ = work[i % len(work)]
+            r = await ac.post("/v1/evaluate", headers={"X-Tenant-ID": tenant},
+                              json={"flag_key": flag["key"], "user": users[i % len(users)]})
+            r.raise_for_status()
+        return await measure_async(call, ctx.n(5_000), ctx.concurrency)
+
+
+@scenario
+async def http_evaluate_batch(ctx: Context) -> Result:
+    """100 users x every flag of the tenant per request, NDJSON fully read."""
+    tenants, users = list(ctx.data), ctx.user_pool
+    async with await _client(ctx) as ac:
+        async def call(i: int):
+            start = (i * 100) % len(users)
+            r = await ac.post("/v1/evaluate/batch", headers={"X-Tenant-ID": tenants[i % len(tenants)]},
+                              json={"users": users[start:start + 100] or users[:100]})
+            r.raise_for_status()
+        return await measure_async(call, ctx.n(100), max(1, ctx.concurrency // 4))
+
+
+@scenario
+async def http_crud(ctx: Context) -> Result:
+    """Mixed read/write: update, get and list flags (2 reads per write)."""
+    work = _workload(ctx)
+    async with await _client(ctx) as ac:
+        async def call(i: int):
+            tenant, flag, _ = work[i % len(work)]
+            h = {"X-Tenant-ID": tenant}
+            op = i % 3
+            if op == 0:
+                body = {**flag, "description": f"bench {i}"}
+                r = await ac.put(f"/v1/flags/{flag['key']}", headers=h, json=body)
+            elif op == 1:
+                r = await ac.get(f"/v1/flags/{flag['key']}", headers=h)
+            else:
+                r = await ac.get("/v1/flags", headers=h, params={"limit": 50})
+            r.raise_for_status()
+        return await measure_async(call, ctx.n(2_000), ctx.concurrency)
@@ -0,0 +1,135 @@
+"""
+Per-worker memory and evaluation latency: per-process ruleset dicts vs the
+compact mmap-shared store (app.services.shared_ruleset).
+
+Starts `--workers` fresh processes per mode, all holding every synthetic
+tenant's ruleset at once, and reports each worker's RSS and PSS growth
+(PSS splits shared pages between the processes mapping them, so it is the
+per-worker cost) plus flag lookup and evaluation latency.
+
+    PYTHONPATH=. python -m benchmarks.shared_ruleset [--workers 4 --tenants 20 --flags 200]
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import random
+import tempfile
+from typing import Any, Dict, Tuple
+
+from benchmarks.runner import measure
+
+
+def _memory_kib() -> Tuple[int, int]:
+    """(RSS, PSS) of this process in KiB; PSS falls back to RSS off Linux."""
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            fields = {line.split(":")[0]: int(line.split()[1]) for line in f if line.split()[-1] == "kB"}
+        return fields["Rss"], fields["Pss"]
+    except (OSError, KeyError):
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss, rss
+
+
+def _worker(mode: str, source: str, tenants: int, barrier, out):
+    from app.services.ruleset import SegmentSnapshot, TenantRuleset, ruleset_version
+    from app.services.flag_eval import compile_flag
+    from app.services.shared_ruleset import RulesetStore
+    from scripts.seed import synthetic_user
+
+    rng = random.Random(1)
+    users = [synthetic_user(rng, i) for i in range(500)]
+    before = _memory_kib()
+    rulesets: Dict[str, Any] = {}
+    if mode == "dict":
+        # What each worker holds today: flag dicts decoded from the database rows, plus plans.
+        with open(source) as f:
+            data = json.load(f)
+        for tenant, d in data.items():
+            segments = SegmentSnapshot(d["segments"], {k: "" for k in d["segments"]})
+            flags = tuple(d["flags"])
+            rulesets[tenant] = TenantRuleset(ruleset_version(flags, segments), flags,
+                                             tuple(compile_flag(x, segments.criteria) for x in flags), segments)
+        del data
+        by_key = {(t, x["key"]): x for t, r in rulesets.items() for x in r.flags}
+
+        def lookup(tenant, key):
+            return by_key[tenant, key]
+    else:
+        store = RulesetStore(source)
+        for i in range(tenants):
+            shared = store.open(f"t{i}")
+            segments = shared.segments()
+            flags = shared.flags()
+            rulesets[f"t{i}"] = TenantRuleset(shared.version, flags,
+                                              tuple(compile_flag(x, segments.criteria) for x in flags), segments)
+
+        def lookup(tenant, key):
+            return store.open(tenant).flag(key)
+
+    barrier.wait()  # every worker holds its rulesets: shared pages are now split between them
+    after = _memory_kib()
+    names = list(rulesets)
+    plans = [(t, p) for t in names for p in rulesets[t].plans]
+    keys = [(t, p.key) for t, p in plans]
+    lookups = measure(lambda i: lookup(*keys[i % len(keys)]), 20_000)
+    evals = measure(lambda i: plans[i % len(plans)][1].evaluate(plans[i % len(plans)][0], users[i % len(users)]),
+                    100_000)
+    out.put({"rss_kib": after[0] - before[0], "pss_kib": after[1] - before[1],
+             "lookup_p50_us": lookups.p50_us, "eval_p50_us": evals.p50_us, "eval_p95_us": evals.p95_us})
+    barrier.wait()
+
+
+def run(workers: int, tenants: int, flags: int, rules: int, segments: int) -> Dict[str, Dict[str, float]]:
+    from app.services.ruleset import SegmentSnapshot, ruleset_version
+    from app.services.shared_ruleset import RulesetStore
+    from scripts.seed import synthetic_tenants
+
+    data = synthetic_tenants(tenants, flags, rules, segments, seed=42)
+    ctx = mp.get_context("spawn")
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "tenants.json")
+        with open(source, "w") as f:
+            json.dump(data, f)
+        store_dir = os.path.join(tmp, "store")
+        store = RulesetStore(store_dir)
+        for i, (tenant, d) in enumerate(data.items()):
+            segs = SegmentSnapshot(d["segments"], {k: "" for k in d["segments"]})
+            store.publish(f"t{i}", ruleset_version(d["flags"], segs), d["flags"], segs)
+
+        for mode, src in (("dict", source), ("shared", store_dir)):
+            barrier, out = ctx.Barrier(workers), ctx.Queue()
+            procs = [ctx.Process(target=_worker, args=(mode, src, tenants, barrier, out)) for _ in range(workers)]
+            for p in procs:
+                p.start()
+            samples = [out.get() for _ in procs]
+            for p in procs:
+                p.join()
+            results[mode] = {k: sum(s[k] for s in samples) / len(samples) for k in samples[0]}
+        results["store_bytes"] = {"total": sum(os.path.getsize(os.path.join(store_dir, n)) for n in os.listdir(store_dir)),
+                                  "json": os.path.getsize(source)}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--tenants", type=int, default=20)
+    parser.add_argument("--flags", type=int, default=200)
+    parser.add_argument("--rules", type=int, default=4)
+    parser.add_argument("--segments", type=int, default=30)
+    args = parser.parse_args()
+    results = run(args.workers, args.tenants, args.flags, args.rules, args.segments)
+    sizes = results.pop("store_bytes")
+    print(f"{args.workers} workers x {args.tenants} tenants x {args.flags} flags; "
+          f"store {sizes['total'] / 1024:.0f} KiB vs {sizes['json'] / 1024:.0f} KiB JSON")
+    print(f"{'mode':>8}{'RSS KiB':>10}{'PSS KiB':>10}{'lookup p50 us':>15}{'eval p50 us':>13}{'eval p95 us':>13}")
+    for mode, r in results.items():
+        print(f"{mode:>8}{r['rss_kib']:>10.0f}{r['pss_kib']:>10.0f}{r['lookup_p50_us']:>15.2f}"
+              f"{r['eval_p50_us']:>13.2f}{r['eval_p95_us']:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+Bulk NDJSON import/export straight against the database.
+
+    PYTHONPATH=. python -m scripts.bulk export flags --tenant acme > flags.ndjson
+    PYTHONPATH=. python -m scripts.bulk import flags --tenant acme < flags.ndjson
+"""
+import argparse
+import asyncio
+import json
+import sys
+from dataclasses import asdict
+from app.deps import SessionLocal
+from app.services.bulk import KINDS, export_entities, import_entities, iter_ndjson
+
+async def _stdin_chunks(size: int = 1 << 16):
+    loop = asyncio.get_running_loop()
+    while True:
+        chunk = await loop.run_in_executor(None, sys.stdin.buffer.read, size)
+        if not chunk:
+            return
+        yield chunk
+
+async def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("action", choices=["import", "export"])
+    p.add_argument("entity", choices=sorted(KINDS))
+    p.add_argument("--tenant", required=True)
+    p.add_argument("--actor", default="cli")
+    p.add_argument("--chunk-size", type=int, default=500)
+    args = p.parse_args(argv)
+    kind = KINDS[args.entity]
+    async with SessionLocal() as db:
+        if args.action == "export":
+            async for item in export_entities(db, kind, args.tenant):
+                sys.stdout.write(json.dumps(item) + "\n")
+        else:
+            report = await import_entities(db, kind, args.tenant, args.actor, iter_ndjson(_stdin_chunks()), args.chunk_size)
+            print(json.dumps(asdict(report)), file=sys.stderr)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,6 +1,9 @@
+import argparse
 import asyncio
+import random
+from typing import Any, Dict, List
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import delete, select
 from app.deps import SessionLocal
 from app.models import Flag, Segment
 
@@ -28,5 +31,114 @@ async def seed():
         await db.commit()
         print("Seeded sample flags and segments for tenant 'acme'.")
 
+# --- Synthetic tenants for benchmarks and load tests -------------------------
+
+COUNTRIES = (("US", 40), ("CA", 10), ("GB", 10), ("DE", 9), ("FR", 7), ("IN", 8), ("BR", 6), ("JP", 5), ("AU", 5))
+PLANS = (("free", 70), ("pro", 22), ("enterprise", 8))
+PLATFORMS = (("web", 55), ("ios", 25), ("android", 20))
+ROLES = (("user", 95), ("employee", 3), ("admin", 2))
+
+
+def _pick(rng: random.Random, weighted):
+    return rng.choices([v for v, _ in weighted], weights=[w for _, w in weighted])[0]
+
+
+def synthetic_user(rng: random.Random, i: int) -> Dict[str, Any]:
+    """A user with a skewed, production-like attribute mix (heavy-tailed seats/age)."""
+    return {"id": f"user-{i}", "attributes": {
+        "country": _pick(rng, COUNTRIES),
+        "plan": _pick(rng, PLANS),
+        "platform": _pick(rng, PLATFORMS),
+        "role": _pick(rng, ROLES),
+        "seats": max(1, int(rng.lognormvariate(1.5, 1.2))),
+        "age_days": int(rng.expovariate(1 / 300)),
+        "beta": rng.random() < 0.05,
+    }}
+
+
+def _leaf(rng: random.Random) -> Dict[str, Any]:
+    kind = rng.randrange(5)
+    if kind == 0:
+        return {"attr": {"country": _pick(rng, COUNTRIES)}}
+    if kind == 1:
+        return {"attr": {"plan_in": rng.sample([p for p, _ in PLANS], 2)}}
+    if kind == 2:
+        return {"attr": {"seats_gte": rng.choice([5, 10, 50, 200])}}
+    if kind == 3:
+        return {"attr": {"age_days_lt": rng.choice([7, 30, 90])}}
+    return {"attr": {"platform": _pick(rng, PLATFORMS)}}
+
+
+def synthetic_segments(rng: random.Random, n: int, depth: int = 3) -> Dict[str, Dict[str, Any]]:
+    """
+    `n` segments; later ones nest earlier ones (up to `depth` levels of
+    all/any/not over leaves and segment refs), so refs form a DAG.
+    """
+    segments: Dict[str, Dict[str, Any]] = {}
+
+    def tree(level: int) -> Dict[str, Any]:
+        if level >= depth or rng.random() < 0.35:
+            if segments and rng.random() < 0.3:
+                return {"segment": rng.choice(list(segments))}
+            return _leaf(rng)
+        op = rng.choice(("all", "all", "any", "not"))
+        if op == "not":
+            return {"not": tree(level + 1)}
+        return {op: [tree(level + 1) for _ in range(rng.randint(2, 3))]}
+
+    for i in range(n):
+        segments[f"seg-{i}"] = tree(0)
+    return segments
+
+
+def synthetic_flags(rng: random.Random, n: int, rules: int, segment_keys: List[str]) -> List[Dict[str, Any]]:
+    flags = []
+    for i in range(n):
+        variants = [{"key": "control", "weight": rng.randint(1, 9)}, {"key": "treatment", "weight": rng.randint(1, 9)}]
+        flag_rules = []
+        for j in range(rules):
+            when: Dict[str, Any] = {"segment": rng.choice(segment_keys)} if segment_keys and rng.random() < 0.5 else _leaf(rng)
+            if rng.random() < 0.3:
+                when["percentage"] = rng.choice([5, 10, 25, 50])
+            rollout = ({"variant": "treatment"} if rng.random() < 0.5
+                       else {"distribution": [{"key": "control", "weight": 1}, {"key": "treatment", "weight": rng.randint(1, 4)}]})
+            flag_rules.append({"id": f"r{j}", "order": j, "when": when, "rollout": rollout})
+        flags.append({"key": f"flag-{i}", "description": "synthetic", "state": "on" if rng.random() < 0.9 else "off",
+                      "variants": variants, "rules": flag_rules})
+    return flags
+
+
+def synthetic_tenants(tenants: int, flags: int, rules: int, segments: int, seed: int = 42) -> Dict[str, Dict[str, Any]]:
+    """{tenant_id: {"flags": [...], "segments": {key: criteria}}}, identical for identical arguments."""
+    rng = random.Random(seed)
+    out = {}
+    for t in range(tenants):
+        segs = synthetic_segments(rng, segments)
+        out[f"tenant-{t}"] = {"flags": synthetic_flags(rng, flags, rules, list(segs)), "segments": segs}
+    return out
+
+
+async def seed_synthetic(tenants: int, flags: int, rules: int, segments: int, seed: int = 42):
+    data = synthetic_tenants(tenants, flags, rules, segments, seed)
+    async with SessionLocal() as db:
+        for tenant, d in data.items():
+            await db.execute(delete(Flag).where(Flag.tenant_id == tenant))
+            await db.execute(delete(Segment).where(Segment.tenant_id == tenant))
+            db.add_all(Segment(tenant_id=tenant, key=k, criteria=c) for k, c in d["segments"].items())
+            db.add_all(Flag(tenant_id=tenant, **f) for f in d["flags"])
+            await db.commit()
+    print(f"Seeded {tenants} synthetic tenants x {flags} flags x {rules} rules, {segments} segments each.")
+
+
 if __name__ == "__main__":
-    asyncio.run(seed())
+    p = argparse.ArgumentParser(description="Seed sample data (tenant 'acme'), or synthetic tenants with --tenants.")
+    p.add_argument("--tenants", type=int, default=0, help="synthetic tenants to generate (0: sample data only)")
+    p.add_argument("--flags", type=int, default=50)
+    p.add_argument("--rules", type=int, default=4)
+    p.add_argument("--segments", type=int, default=20)
+    p.add_argument("--seed", type=int, default=42)
+    args = p.parse_args()
+    if args.tenants:
+        asyncio.run(seed_synthetic(args.tenants, args.flags, args.rules, args.segments, args.seed))
+    else:
+        asyncio.run(seed())
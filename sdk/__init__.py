@@ -0,0 +1,4 @@
+"""Python client for the feature flag service with in-process evaluation."""
+from sdk.client import FlagClient, FlagNotFound
+
+__all__ = ["FlagClient", "FlagNotFound"]
@@ -0,0 +1,133 @@
+# sdk/client.py
+import asyncio
+import logging
+from typing import Any, Dict, Mapping, Optional
+
+import httpx
+
+# A vendored copy of the server's stdlib-only evaluator: same bucketing, same
+# matcher semantics, and nothing from the server to install.
+from sdk.flag_eval import CompiledFlag, compile_flag
+
+log = logging.getLogger(__name__)
+
+
+class FlagNotFound(KeyError):
+    pass
+
+
+class _Snapshot:
+    """One synced ruleset: compiled plans plus the versions they were built from."""
+    __slots__ = ("version", "plans", "flag_versions", "segment_versions")
+
+    def __init__(self, version: Optional[str], plans: Dict[str, CompiledFlag],
+                 flag_versions: Dict[str, str], segment_versions: Dict[str, str]):
+        self.version = version
+        self.plans = plans
+        self.flag_versions = flag_versions
+        self.segment_versions = segment_versions
+
+
+_EMPTY = _Snapshot(None, {}, {}, {})
+
+
+class FlagClient:
+    """
+    Evaluates a tenant's flags in-process from a ruleset synced off
+    GET /v1/ruleset.
+
+    `refresh()` revalidates with If-None-Match; on a change only flags whose
+    own version moved, or that reference a segment whose version moved, are
+    recompiled. `start()` polls in the background; failed polls keep serving
+    the last good ruleset. `evaluate` never touches the network. The
+    ruleset includes segment criteria, so `token` needs both the flags:r
+    and segments:r scopes.
+
+        client = FlagClient("http://flags:8000", tenant="acme", token=jwt)
+        await client.start()
+        client.variant("new-checkout", {"id": "u1", "attributes": {...}})
+    """
+
+    def __init__(self, base_url: str = "", *, tenant: str, token: Optional[str] = None,
+                 poll_interval: float = 15.0, http: Optional[httpx.AsyncClient] = None):
+        self.tenant = tenant
+        self.poll_interval = poll_interval
+        headers = {"X-Tenant-ID": tenant}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        self._headers = headers
+        self._owns_http = http is None
+        self._http = http if http is not None else httpx.AsyncClient(base_url=base_url, timeout=10.0)
+        self._snapshot = _EMPTY
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    @property
+    def version(self) -> Optional[str]:
+        return self._snapshot.version
+
+    async def refresh(self) -> bool:
+        """Sync once; True when the ruleset changed."""
+        headers = dict(self._headers)
+        if self._snapshot.version is not None:
+            headers["If-None-Match"] = f'"{self._snapshot.version}"'
+        r = await self._http.get("/v1/ruleset", headers=headers)
+        if r.status_code == 304:
+            return False
+        r.raise_for_status()
+        self._snapshot = self._apply(r.json())
+        return True
+
+    def _apply(self, payload: Mapping[str, Any]) -> _Snapshot:
+        old = self._snapshot
+        segments = {s["key"]: s["criteria"] for s in payload["segments"]}
+        segment_versions = {s["key"]: s["version"] for s in payload["segments"]}
+        changed = {k for k in segment_versions.keys() | old.segment_versions.keys()
+                   if segment_versions.get(k) != old.segment_versions.get(k)}
+        plans: Dict[str, CompiledFlag] = {}
+        flag_versions: Dict[str, str] = {}
+        for flag in payload["flags"]:
+            key, version = flag["key"], flag["version"]
+            plan = old.plans.get(key)
+            if plan is None or old.flag_versions.get(key) != version or plan.segment_refs & changed:
+                plan = compile_flag(flag, segments)
+            plans[key] = plan
+            flag_versions[key] = version
+        return _Snapshot(payload["version"], plans, flag_versions, segment_versions)
+
+    def evaluate(self, flag_key: str, user: Dict[str, Any]) -> Dict[str, Any]:
+        """Same result shape as POST /v1/evaluate. Raises FlagNotFound for unknown keys."""
+        plan = self._snapshot.plans.get(flag_key)
+        if plan is None:
+            raise FlagNotFound(flag_key)
+        return plan.evaluate(self.tenant, user)
+
+    def variant(self, flag_key: str, user: Dict[str, Any], default: Optional[str] = None) -> Optional[str]:
+        """The variant for `user`, or `default` when the flag isn't known (yet)."""
+        plan = self._snapshot.plans.get(flag_key)
+        if plan is None:
+            return default
+        return plan.evaluate(self.tenant, user)["variant"]
+
+    def evaluate_all(self, user: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        memo: Dict[str, bool] = {}
+        return {k: p.evaluate(self.tenant, user, memo=memo) for k, p in self._snapshot.plans.items()}
+
+    async def start(self) -> None:
+        """Initial sync (errors propagate), then background polling."""
+        await self.refresh()
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.refresh()
+            except Exception:
+                log.exception("ruleset sync failed; serving version %s", self._snapshot.version)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._owns_http:
+            await self._http.aclose()
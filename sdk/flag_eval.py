@@ -0,0 +1,406 @@
+# sdk/flag_eval.py
+# Vendored copy of app/services/flag_eval.py so the SDK installs without the
+# server. Edit the server's copy and run `make sdk-vendor`; tests/test_sdk.py
+# fails when the two drift.
+
+import hashlib
+import operator
+import time
+from bisect import bisect_right
+from typing import AbstractSet, Dict, Any, Callable, FrozenSet, List, Mapping, Optional, Set, Tuple
+
+def stable_bucket(tenant: str, flag_key: str, user_id: str) -> float:
+    h = hashlib.sha256(f"{tenant}:{flag_key}:{user_id}".encode()).hexdigest()
+    n = int(h[:15], 16)
+    return (n % 10_000_000) / 10_000_000.0
+
+
+class EvalContext:
+    """
+    Per-evaluation state handed to compiled predicates.
+
+    `segments` memoizes segment membership by key; pass the same dict when
+    evaluating several flags for one user so each segment is matched once.
+    `members`, when given, is the user's full membership set (see
+    app.services.segment_index) and answers segment matchers outright.
+    """
+    __slots__ = ("attrs", "bucket", "segments", "members")
+
+    def __init__(self, attrs: Mapping[str, Any], bucket: float, segments: Optional[Dict[str, bool]] = None,
+                 members: Optional[AbstractSet[str]] = None):
+        self.attrs = attrs
+        self.bucket = bucket
+        self.segments = {} if segments is None else segments
+        self.members = members
+
+
+Predicate = Callable[[EvalContext], bool]
+
+_MISSING = object()
+
+# Suffix operators on `attr` matchers, e.g. {"account_age_days_lte": 30}.
+# Longer suffixes first so "_lte" wins over "_lt".
+_ATTR_OPS: Tuple[Tuple[str, Callable[[Any, Any], bool]], ...] = (
+    ("_lte", operator.le),
+    ("_gte", operator.ge),
+    ("_lt", operator.lt),
+    ("_gt", operator.gt),
+    ("_ne", operator.ne),
+    ("_in", lambda actual, allowed: actual in allowed),
+)
+
+
+def _always(ctx: EvalContext) -> bool:
+    return True
+
+
+def _never(ctx: EvalContext) -> bool:
+    return False
+
+
+def split_attr(name: str) -> Tuple[str, Optional[str]]:
+    """Split an `attr` matcher key into (attribute, operator suffix or None)."""
+    for suffix, _ in _ATTR_OPS:
+        if name.endswith(suffix) and len(name) > len(suffix):
+            return name[: -len(suffix)], suffix
+    return name, None
+
+
+def _as_container(values: Any):
+    if not isinstance(values, list):
+        return (values,)
+    try:
+        return frozenset(values)
+    except TypeError:
+        return tuple(values)
+
+
+def _compile_attr(spec: Any) -> Predicate:
+    if not isinstance(spec, dict):
+        return _never
+    checks = []
+    for name, expected in spec.items():
+        attr, suffix = split_attr(name)
+        if suffix is None:
+            checks.append((attr, operator.eq, expected))
+        else:
+            op = dict(_ATTR_OPS)[suffix]
+            if suffix == "_in":
+                expected = _as_container(expected)
+            checks.append((attr, op, expected))
+    checks_t = tuple(checks)
+
+    def pred(ctx: EvalContext) -> bool:
+        attrs = ctx.attrs
+        for attr, op, expected in checks_t:
+            actual = attrs.get(attr, _MISSING)
+            if actual is _MISSING:
+                return False
+            try:
+                if not op(actual, expected):
+                    return False
+            except TypeError:
+                return False
+        return True
+
+    return pred
+
+
+def _all_of(preds: Tuple[Predicate, ...]) -> Predicate:
+    if not preds:
+        return _always
+    if len(preds) == 1:
+        return preds[0]
+
+    def pred(ctx: EvalContext) -> bool:
+        for p in preds:
+            if not p(ctx):
+                return False
+        return True
+
+    return pred
+
+
+def _negate(inner: Predicate) -> Predicate:
+    def pred(ctx: EvalContext) -> bool:
+        return not inner(ctx)
+
+    return pred
+
+
+def _below(threshold: float) -> Predicate:
+    def pred(ctx: EvalContext) -> bool:
+        return ctx.bucket < threshold
+
+    return pred
+
+
+def _any_of(preds: Tuple[Predicate, ...]) -> Predicate:
+    if not preds:
+        return _never
+
+    def pred(ctx: EvalContext) -> bool:
+        for p in preds:
+            if p(ctx):
+                return True
+        return False
+
+    return pred
+
+
+def _segment_member(key: str, inner: Predicate) -> Predicate:
+    def pred(ctx: EvalContext) -> bool:
+        if ctx.members is not None:
+            return key in ctx.members
+        memo = ctx.segments
+        hit = memo.get(key)
+        if hit is None:
+            hit = memo[key] = inner(ctx)
+        return hit
+
+    return pred
+
+
+class _Compiler:
+    def __init__(self, segments: Mapping[str, Any]):
+        self.segments = segments
+        self.refs: Set[str] = set()
+        self._resolved: Dict[str, Predicate] = {}
+
+    def matcher(self, node: Any, resolving: FrozenSet[str] = frozenset(), in_segment: bool = False) -> Predicate:
+        """
+        Compile a `when`/criteria tree into a predicate.
+
+        Keys in one node are ANDed. Unknown matchers, unknown segments and
+        segment cycles compile to a predicate that never matches.
+        """
+        if not node:
+            return _always
+        if not isinstance(node, dict):
+            return _never
+        parts = []
+        for kind, arg in node.items():
+            if kind == "attr":
+                parts.append(_compile_attr(arg))
+            elif kind in ("all", "any"):
+                children = tuple(self.matcher(c, resolving, in_segment) for c in (arg if isinstance(arg, list) else []))
+                parts.append(_all_of(children) if kind == "all" else _any_of(children))
+            elif kind == "not":
+                parts.append(_negate(self.matcher(arg, resolving, in_segment)))
+            elif kind == "segment":
+                parts.append(self.segment(arg, resolving))
+            elif kind == "percentage" and not in_segment:
+                # Segments are bucket-independent cohorts; percentages belong on rules.
+                parts.append(_below(_fraction(arg)))
+            else:
+                parts.append(_never)
+        return _all_of(tuple(parts))
+
+    def segment(self, key: Any, resolving: FrozenSet[str]) -> Predicate:
+        if not isinstance(key, str):
+            return _never
+        self.refs.add(key)
+        if key in resolving:
+            return _never
+        pred = self._resolved.get(key)
+        if pred is None:
+            criteria = self.segments.get(key)
+            if criteria is None:
+                pred = _never
+            else:
+                pred = _segment_member(key, self.matcher(criteria, resolving | {key}, in_segment=True))
+            self._resolved[key] = pred
+        return pred
+
+
+def segment_refs(node: Any) -> Set[str]:
+    """Segment keys a `when`/criteria tree names directly, including inside all/any/not."""
+    refs: Set[str] = set()
+    stack = [node]
+    while stack:
+        n = stack.pop()
+        if isinstance(n, list):
+            stack.extend(n)
+        elif isinstance(n, dict):
+            for kind, arg in n.items():
+                if kind == "segment" and isinstance(arg, str):
+                    refs.add(arg)
+                elif kind in ("all", "any", "not"):
+                    stack.append(arg)
+    return refs
+
+
+def _fraction(pct: Any) -> float:
+    try:
+        return min(max(float(pct) / 100.0, 0.0), 1.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class WeightTable:
+    """Variant keys with normalized cumulative weights; `pick` maps a position in [0,1) to a key."""
+    __slots__ = ("keys", "cumulative")
+
+    def __init__(self, variants: Any):
+        keys = []
+        weights = []
+        for v in variants or []:
+            if isinstance(v, dict) and "key" in v:
+                keys.append(v["key"])
+                weights.append(max(float(v.get("weight", 0) or 0), 0.0))
+        total = sum(weights)
+        cumulative = []
+        acc = 0.0
+        for w in weights:
+            acc += w
+            cumulative.append(acc / total if total else 0.0)
+        if cumulative and total:
+            cumulative[-1] = 1.0
+        self.keys: Tuple[str, ...] = tuple(keys)
+        self.cumulative: Tuple[float, ...] = tuple(cumulative)
+
+    def pick(self, pos: float) -> Optional[str]:
+        if not self.keys:
+            return None
+        if not self.cumulative[-1]:
+            return self.keys[0]
+        i = bisect_right(self.cumulative, pos)
+        return self.keys[min(i, len(self.keys) - 1)]
+
+
+class CompiledRule:
+    """
+    One targeting rule, ready to run.
+
+    `scale` is the rule's percentage gate (top-level `when.percentage` and/or
+    `rollout.weight`) as a fraction; users inside the gate are spread over the
+    rule's distribution by `bucket / scale` so a 50% gate with a 50/50 split
+    still yields 25/25 rather than sending everyone to the first variant.
+    """
+    __slots__ = ("id", "predicate", "scale", "variant", "table")
+
+    def __init__(self, id: Optional[str], predicate: Predicate, scale: float, variant: Optional[str], table: Optional[WeightTable]):
+        self.id = id
+        self.predicate = predicate
+        self.scale = scale
+        self.variant = variant
+        self.table = table
+
+
+# (rule id, nanoseconds spent matching, matched)
+RuleTiming = Tuple[Optional[str], int, bool]
+
+
+class CompiledFlag:
+    """
+    Immutable evaluation plan for one flag: rules pre-sorted by `order`,
+    matchers compiled to closures, segments resolved in place and weight
+    tables precomputed. Build with `compile_flag`.
+    """
+    __slots__ = ("key", "on", "off_variant", "rules", "default", "segment_refs")
+
+    def __init__(self, key: str, on: bool, off_variant: str, rules: Tuple[CompiledRule, ...], default: WeightTable, segment_refs: FrozenSet[str]):
+        self.key = key
+        self.on = on
+        self.off_variant = off_variant
+        self.rules = rules
+        self.default = default
+        self.segment_refs = segment_refs
+
+    def evaluate(self, tenant: str, user: Mapping[str, Any], *, bucket: Optional[float] = None, memo: Optional[Dict[str, bool]] = None,
+                 members: Optional[AbstractSet[str]] = None, rule_timings: Optional[List[RuleTiming]] = None) -> Dict[str, Any]:
+        """
+        Evaluate for `user` ({id, attributes}). Pass a list as `rule_timings`
+        to have (rule_id, nanoseconds, matched) appended for each rule tried.
+        """
+        if not self.on:
+            return {"variant": self.off_variant, "reason": "flag_off", "rule_id": None, "details": {}}
+        if bucket is None:
+            bucket = stable_bucket(tenant, self.key, str(user.get("id", "")))
+        ctx = EvalContext(user.get("attributes") or {}, bucket, memo, members)
+        rule = self._match(ctx) if rule_timings is None else self._match_timed(ctx, rule_timings)
+        if rule is not None:
+            variant = rule.variant
+            if variant is None:
+                table = rule.table or self.default
+                variant = table.pick(bucket / rule.scale) or self.off_variant
+            return {"variant": variant, "reason": "rule_match", "rule_id": rule.id, "details": {"bucket": bucket}}
+        return {
+            "variant": self.default.pick(bucket) or self.off_variant,
+            "reason": "default_distribution",
+            "rule_id": None,
+            "details": {"bucket": bucket},
+        }
+
+    def _match(self, ctx: EvalContext) -> Optional[CompiledRule]:
+        for rule in self.rules:
+            if rule.predicate(ctx):
+                return rule
+        return None
+
+    def _match_timed(self, ctx: EvalContext, out: List[RuleTiming]) -> Optional[CompiledRule]:
+        clock = time.perf_counter_ns
+        for rule in self.rules:
+            start = clock()
+            hit = rule.predicate(ctx)
+            out.append((rule.id, clock() - start, hit))
+            if hit:
+                return rule
+        return None
+
+
+def compile_flag(flag: Mapping[str, Any], segments: Optional[Mapping[str, Any]] = None) -> CompiledFlag:
+    """
+    Compile a flag dict ({key, state, variants, rules}) against the tenant's
+    segments ({segment_key: criteria}) into a `CompiledFlag`.
+    """
+    compiler = _Compiler(segments or {})
+    default = WeightTable(flag.get("variants"))
+    off_variant = default.keys[0] if default.keys else "control"
+
+    ordered = sorted(
+        (r for r in flag.get("rules") or [] if isinstance(r, dict)),
+        key=lambda r: r.get("order", 0) or 0,
+    )
+    rules = []
+    for r in ordered:
+        when = dict(r.get("when") or {})
+        rollout = r.get("rollout") or {}
+        scale = 1.0
+        gates = []
+        if "percentage" in when:
+            scale = min(scale, _fraction(when.pop("percentage")))
+        if rollout.get("weight") is not None:
+            scale = min(scale, _fraction(rollout["weight"]))
+        if scale < 1.0:
+            gates.append(lambda ctx, t=scale: ctx.bucket < t)
+        predicate = _all_of(tuple(gates) + (compiler.matcher(when),))
+        if scale <= 0.0:
+            predicate = _never
+        table = WeightTable(rollout["distribution"]) if rollout.get("distribution") else None
+        rules.append(CompiledRule(r.get("id"), predicate, scale, rollout.get("variant"), table))
+
+    return CompiledFlag(
+        key=flag["key"],
+        on=flag.get("state") == "on",
+        off_variant=off_variant,
+        rules=tuple(rules),
+        default=default,
+        segment_refs=frozenset(compiler.refs),
+    )
+
+
+def compile_segments(segments: Mapping[str, Any]) -> Dict[str, Predicate]:
+    """Compile every segment's criteria to a membership predicate (segment refs resolved in place)."""
+    compiler = _Compiler(segments)
+    return {key: compiler.segment(key, frozenset()) for key in segments}
+
+
+def evaluate_flag(flag: dict, tenant: str, user: dict, segments: Optional[Mapping[str, Any]] = None,
+                  rule_timings: Optional[List[RuleTiming]] = None) -> dict:
+    """
+    Evaluate `flag` for `user` ({id, attributes}). Rules run top-down by
+    `order`; first match wins. Hot paths should cache `compile_flag` output
+    (see app.services.ruleset) instead of calling this per request.
+    """
+    return compile_flag(flag, segments).evaluate(tenant, user, rule_timings=rule_timings)
@@ -1,5 +1,14 @@
 import asyncio
+import os
+import tempfile
 import pytest
+import pytest_asyncio
+
+# Point the app at a throwaway SQLite file before app.config reads the env.
+os.environ.setdefault("DB_DSN", f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/test.db")
+# API tests exercise behaviour, not auth; tests/test_auth.py turns it back on.
+os.environ.setdefault("AUTH_ENABLED", "false")
+
 from httpx import AsyncClient
 from app.main import app
 from app.models import Base
@@ -11,7 +20,7 @@ def event_loop():
     yield loop
     loop.close()
 
-@pytest.fixture(scope="session", autouse=True)
+@pytest_asyncio.fixture(scope="session", autouse=True)
 async def setup_db():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
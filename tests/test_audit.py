@@ -0,0 +1,111 @@
+import json
+from datetime import datetime, timedelta
+import pytest
+from httpx import AsyncClient
+from app.main import app
+from app.deps import SessionLocal
+from app.models import Audit
+
+@pytest.mark.asyncio
+async def test_keyset_pages_and_export():
+    base = datetime(2024, 1, 1)
+    async with SessionLocal() as db:
+        for i in range(7):
+            # Pairs share a timestamp so the id tie-breaker is exercised.
+            db.add(Audit(tenant_id="audit-t", actor="a", entity="flag", entity_key=f"f{i % 2}",
+                         action="update", before=None, after={"i": i}, ts=base + timedelta(seconds=i // 2)))
+        db.add(Audit(tenant_id="audit-other", actor="a", entity="flag", entity_key="f0", action="create", ts=base))
+        await db.commit()
+
+    h = {"X-Tenant-ID": "audit-t"}
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        seen, cursor = [], None
+        while True:
+            params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+            page = (await ac.get("/v1/audit", headers=h, params=params)).json()
+            seen += [item["after"]["i"] for item in page["items"]]
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+        assert seen == [6, 5, 4, 3, 2, 1, 0]
+
+        r = await ac.get("/v1/audit", headers=h, params={"entity_key": "f1", "since": (base + timedelta(seconds=1)).isoformat()})
+        assert [i["after"]["i"] for i in r.json()["items"]] == [5, 3]
+        assert (await ac.get("/v1/audit", headers=h, params={"cursor": "garbage"})).status_code == 400
+
+        r = await ac.get("/v1/audit/export", headers=h)
+        assert [json.loads(line)["after"]["i"] for line in r.text.splitlines()] == [0, 1, 2, 3, 4, 5, 6]
+
+@pytest.mark.asyncio
+async def test_offset_aware_window_is_converted_to_utc():
+    async with SessionLocal() as db:
+        db.add(Audit(tenant_id="audit-tz", actor="a", entity="flag", entity_key="f", action="update",
+                     ts=datetime(2026, 1, 1, 12, 0)))
+        await db.commit()
+    h = {"X-Tenant-ID": "audit-tz"}
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        for since, until, n in (("2026-01-01T13:00:00+02:00", "2026-01-01T14:30:00+02:00", 1),
+                                ("2026-01-01T14:30:00+02:00", None, 0)):
+            params = {"since": since, **({"until": until} if until else {})}
+            assert len((await ac.get("/v1/audit", headers=h, params=params)).json()["items"]) == n
+            assert len((await ac.get("/v1/audit/export", headers=h, params=params)).text.splitlines()) == n
+
+@pytest.mark.asyncio
+async def test_async_writer_batches_committed_entries_only():
+    from sqlalchemy import func, select
+    from app.services.audit import record_audit, writer
+
+    async def count(tenant):
+        async with SessionLocal() as db:
+            return (await db.execute(select(func.count()).select_from(Audit).where(Audit.tenant_id == tenant))).scalar()
+
+    await writer.start()
+    try:
+        async with SessionLocal() as db:
+            for i in range(3):
+                await record_audit(db, "writer-t", "a", "flag", f"f{i}", "create", None, {})
+            assert await count("writer-t") == 0  # staged, not written in this transaction
+            await db.commit()
+        async with SessionLocal() as db:
+            await record_audit(db, "writer-t", "a", "flag", "rolled", "create", None, {})
+            await db.rollback()
+        assert writer._reserved == 0
+
+        writer.max_queue, saved = 0, writer.max_queue
+        try:
+            async with SessionLocal() as db:
+                await record_audit(db, "writer-t", "a", "flag", "full", "create", None, {})
+                await db.commit()
+        finally:
+            writer.max_queue = saved
+    finally:
+        await writer.stop()
+    assert await count("writer-t") == 4
+
+@pytest.mark.asyncio
+async def test_writer_dead_letters_poison_rows_and_keeps_the_rest(caplog):
+    import asyncio
+    from sqlalchemy import func, select
+    from app.services.audit import AUDIT_DEAD_LETTERS, AuditWriter
+
+    def entry(key, tenant="poison-t"):
+        return dict(tenant_id=tenant, actor="a", entity="flag", entity_key=key, action="create",
+                    before=None, after={}, ts=datetime.utcnow())
+
+    w = AuditWriter(batch_size=8, flush_interval=0.01, max_retries=2, retry_max_seconds=0.02)
+    dropped = AUDIT_DEAD_LETTERS.labels("rejected")._value.get()
+    w._committed([entry(f"f{i}") for i in range(5)] + [entry("bad", tenant=None)] + [entry("f5")])
+    await w.start()
+    try:
+        for _ in range(200):
+            if AUDIT_DEAD_LETTERS.labels("rejected")._value.get() > dropped and not w._queue:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        await w.stop()
+    assert not w._queue
+    assert AUDIT_DEAD_LETTERS.labels("rejected")._value.get() - dropped == 1
+    assert [r.audit_entry["entity_key"] for r in caplog.records if r.name.endswith("dead_letter")] == ["bad"]
+    async with SessionLocal() as db:
+        n = (await db.execute(select(func.count()).select_from(Audit).where(Audit.tenant_id == "poison-t"))).scalar()
+    assert n == 6
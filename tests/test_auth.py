@@ -0,0 +1,77 @@
+import time
+import pytest
+from httpx import AsyncClient
+from jose import jwt
+from app.config import settings
+from app.deps import token_cache
+from app.main import app
+from app.utils.security import ALGO, TokenCache, issue_token
+
+H = {"X-Tenant-ID": "auth-t"}
+
+
+def _bearer(token):
+    return {**H, "Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def auth_on(monkeypatch):
+    monkeypatch.setattr(settings, "auth_enabled", True)
+    token_cache.clear()
+    yield
+
+
+@pytest.mark.asyncio
+async def test_missing_invalid_and_expired_tokens_are_401(auth_on):
+    expired = jwt.encode({"sub": "c", "scopes": ["flags:r"], "exp": time.time() - 10}, settings.jwt_secret, algorithm=ALGO)
+    no_exp = jwt.encode({"sub": "c", "scopes": ["flags:r"]}, settings.jwt_secret, algorithm=ALGO)
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        r = await ac.get("/v1/flags", headers=H)
+        assert r.status_code == 401 and r.headers["www-authenticate"] == "Bearer"
+        for token in ("garbage", expired, no_exp, issue_token("other-secret", "c", ["flags:r"])):
+            assert (await ac.get("/v1/flags", headers=_bearer(token))).status_code == 401
+        assert (await ac.get("/healthz")).status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_scopes_enforced_per_route(auth_on):
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        reader = (await ac.post("/v1/auth/token", json={"client_id": "reader", "scopes": ["flags:r"]})).json()["access_token"]
+        writer = (await ac.post("/v1/auth/token", json={"client_id": "writer", "scopes": ["flags:rw"]})).json()["access_token"]
+        flag = {"key": "scoped", "state": "on", "variants": [{"key": "a", "weight": 1}]}
+        assert (await ac.get("/v1/flags", headers=_bearer(reader))).status_code == 200
+        r = await ac.post("/v1/flags", headers=_bearer(reader), json=flag)
+        assert r.status_code == 403 and "flags:rw" in r.json()["detail"]
+        assert (await ac.post("/v1/flags", headers=_bearer(writer), json=flag)).status_code == 201
+        assert (await ac.get("/v1/flags/scoped", headers=_bearer(writer))).status_code == 200  # rw implies r
+        assert (await ac.get("/v1/segments", headers=_bearer(writer))).status_code == 403
+        user = {"user": {"id": "u", "attributes": {}}}
+        r = await ac.get("/v1/ruleset", headers=_bearer(reader))
+        assert r.status_code == 403 and "segments:r" in r.json()["detail"]
+        assert (await ac.post("/v1/evaluate/segments", headers=_bearer(reader), json=user)).status_code == 403
+        both = issue_token(settings.jwt_secret, "sdk", ["flags:r", "segments:r"])
+        assert (await ac.get("/v1/ruleset", headers=_bearer(both))).status_code == 200
+        assert (await ac.post("/v1/evaluate/segments", headers=_bearer(both), json=user)).status_code == 200
+        audit = await ac.get("/v1/audit", headers=_bearer(issue_token(settings.jwt_secret, "auditor", ["audit:r"])))
+        assert audit.json()["items"][0]["actor"] == "writer"
+
+
+def test_token_cache_hits_lru_and_revocation():
+    cache = TokenCache(settings.jwt_secret, max_entries=2)
+    tokens = [issue_token(settings.jwt_secret, f"c{i}", ["flags:r"]) for i in range(3)]
+    first = cache.verify(tokens[0])
+    assert cache.verify(tokens[0]) is first
+    cache.verify(tokens[1])
+    cache.verify(tokens[2])
+    assert cache.verify(tokens[0]) is not first  # evicted, verified again
+
+    cache.revoke(tokens[1])
+    with pytest.raises(Exception) as e:
+        cache.verify(tokens[1])
+    assert e.value.status_code == 401
+
+    cache.revoke_subject("c2")
+    with pytest.raises(Exception):
+        cache.verify(tokens[2])
+    time.sleep(0.01)
+    assert cache.verify(issue_token(settings.jwt_secret, "c2", [])).claims["sub"] == "c2"
@@ -0,0 +1,22 @@
+from benchmarks.runner import Result, compare
+from scripts.seed import synthetic_tenants
+from app.services.flag_eval import compile_flag
+
+
+def test_synthetic_tenants_are_deterministic_and_compile():
+    a = synthetic_tenants(2, 5, 3, 6, seed=7)
+    assert a == synthetic_tenants(2, 5, 3, 6, seed=7)
+    assert a != synthetic_tenants(2, 5, 3, 6, seed=8)
+    for d in a.values():
+        assert len(d["flags"]) == 5 and all(len(f["rules"]) == 3 for f in d["flags"])
+        for f in d["flags"]:
+            compile_flag(f, d["segments"])
+
+
+def test_compare_flags_regressions_past_threshold():
+    def run(p95, tput):
+        return {"scenarios": {"s": {"p95_us": p95, "throughput": tput}}}
+    assert compare(run(110, 1000), run(100, 1000), 0.2)[1] == []
+    assert compare(run(130, 1000), run(100, 1000), 0.2)[1] == ["s"]
+    assert compare(run(100, 700), run(100, 1000), 0.2)[1] == ["s"]
+    assert Result.from_samples([3000, 1000, 2000, 4000], 1.0).p50_us == 3.0
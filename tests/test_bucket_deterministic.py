@@ -1,6 +1,7 @@
 import pytest
 from hypothesis import given, strategies as st
 from app.services.flag_eval import stable_bucket
+from app.services.simulate import stable_buckets
 
 @given(tenant=st.text(min_size=1), flag=st.text(min_size=1), uid=st.text(min_size=1))
 def test_bucket_stable(tenant, flag, uid):
@@ -8,3 +9,8 @@ def test_bucket_stable(tenant, flag, uid):
     b = stable_bucket(tenant, flag, uid)
     assert a == b
     assert 0.0 <= a < 1.0
+
+@given(tenant=st.text(min_size=1), flag=st.text(min_size=1), uids=st.lists(st.text(min_size=1), max_size=20))
+def test_bulk_buckets_match_stable_bucket(tenant, flag, uids):
+    bulk = stable_buckets(tenant, flag, uids)
+    assert [float(b) for b in bulk] == [stable_bucket(tenant, flag, u) for u in uids]
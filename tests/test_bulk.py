@@ -0,0 +1,36 @@
+import json
+import pytest
+from httpx import AsyncClient
+from app.main import app
+
+def _flag(i, state="on"):
+    return {"key": f"f{i}", "state": state, "variants": [{"key": "control", "weight": 1}], "rules": []}
+
+@pytest.mark.asyncio
+async def test_import_upserts_reports_and_exports():
+    h = {"X-Tenant-ID": "bulk-t"}
+    body = "\n".join(json.dumps(_flag(i)) for i in range(5)) + "\nnot json\n" + json.dumps({"key": "bad"}) + "\n"
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        r = await ac.post("/v1/flags/import", headers=h, content=body)
+        rep = r.json()
+        assert (rep["created"], rep["updated"], rep["unchanged"], rep["failed"]) == (5, 0, 0, 2)
+        assert [e["line"] for e in rep["errors"]] == [6, 7]
+
+        r = await ac.post("/v1/evaluate", headers=h, json={"flag_key": "f1", "user": {"id": "u"}})
+        assert r.json()["reason"] == "default_distribution"
+
+        body = "\n".join(json.dumps(_flag(i, "off" if i == 1 else "on")) for i in range(6))
+        rep = (await ac.post("/v1/flags/import", headers=h, content=body)).json()
+        assert (rep["created"], rep["updated"], rep["unchanged"]) == (1, 1, 4)
+        # One tenant-wide invalidation reached the evaluate cache.
+        r = await ac.post("/v1/evaluate", headers=h, json={"flag_key": "f1", "user": {"id": "u"}})
+        assert r.json()["reason"] == "flag_off"
+
+        r = await ac.get("/v1/flags/export", headers=h)
+        exported = [json.loads(line) for line in r.text.splitlines()]
+        assert [f["key"] for f in exported] == [f"f{i}" for i in range(6)]
+
+        rep = (await ac.post("/v1/segments/import", headers=h, content=json.dumps({"key": "s", "criteria": {}}))).json()
+        assert rep["created"] == 1
+        r = await ac.get("/v1/audit", headers=h, params={"entity": "flag", "entity_key": "f1"})
+        assert [i["action"] for i in r.json()["items"]] == ["update", "create"]
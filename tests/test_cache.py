@@ -0,0 +1,80 @@
+import asyncio
+import pytest
+from app.services.cache import TTLCache
+
+def test_lru_bound_and_tenant_quota():
+    c = TTLCache(ttl_seconds=60, max_entries=3, tenant_quota=2)
+    c.set("a:flag:1", 1)
+    c.set("a:flag:2", 2)
+    c.get("a:flag:1")
+    c.set("a:flag:3", 3)  # quota evicts a's LRU entry
+    assert c.get("a:flag:2") is None and c.get("a:flag:1") == 1
+    c.set("b:flag:1", 1)
+    c.set("c:flag:1", 1)  # global bound evicts the oldest entry overall
+    assert len(c) == 3 and c.get("a:flag:3") is None
+
+def test_invalidate_prefix_uses_index():
+    c = TTLCache(ttl_seconds=60)
+    c.set("acme:flag:x", 1)
+    c.set("acme:segments", 2)
+    c.set("other:flag:x", 3)
+    c.invalidate_prefix("acme:flag:")
+    assert c.get("acme:flag:x") is None and c.get("acme:segments") == 2
+    c.invalidate_prefix("acme:")
+    assert len(c) == 1
+    c.invalidate_prefix("oth")  # non-boundary prefixes still work
+    assert len(c) == 0
+
+@pytest.mark.asyncio
+async def test_single_flight_and_stale_while_revalidate():
+    c = TTLCache(ttl_seconds=0, stale_seconds=60)
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    results = await asyncio.gather(*(c.get_or_load("t:k", loader) for _ in range(20)))
+    assert results == [1] * 20 and calls == 1
+    # Expired but within the stale window: old value now, refresh in background.
+    assert await c.get_or_load("t:k", loader) == 1
+    await asyncio.sleep(0.05)
+    assert calls == 2 and c.store["t:k"].value == 2
+
+@pytest.mark.asyncio
+async def test_invalidation_during_load_is_not_cached():
+    c = TTLCache(ttl_seconds=60)
+
+    async def loader():
+        c.invalidate_prefix("t:")
+        return "old"
+
+    assert await c.get_or_load("t:k", loader) == "old"
+    assert c.get("t:k") is None
+
+
+@pytest.mark.asyncio
+async def test_invalidation_only_discards_loads_of_that_key():
+    c = TTLCache(ttl_seconds=60)
+    release = asyncio.Event()
+    calls = 0
+
+    async def slow(value):
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return value
+
+    a = asyncio.create_task(c.get_or_load("t:a", lambda: slow("a1")))
+    b = asyncio.create_task(c.get_or_load("t:b", lambda: slow("b1")))
+    await asyncio.sleep(0)
+    c.invalidate("t:a")
+    # A miss after the invalidation starts a fresh load instead of joining the detached one.
+    fresh = asyncio.create_task(c.get_or_load("t:a", lambda: slow("a2")))
+    await asyncio.sleep(0)
+    release.set()
+    assert await asyncio.gather(a, b, fresh) == ["a1", "b1", "a2"]
+    assert calls == 3
+    assert c.get("t:a") == "a2" and c.get("t:b") == "b1"
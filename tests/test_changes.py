@@ -0,0 +1,63 @@
+from datetime import timedelta
+import pytest
+from app.deps import SessionLocal
+from app.models import Flag
+from app.services.changes import ChangeEvent, PollingTransport
+
+def test_event_json_roundtrip():
+    ev = ChangeEvent("acme", "flag", "new_checkout", "2024-01-01T00:00:00")
+    assert ChangeEvent.from_json(ev.to_json()) == ev
+
+@pytest.mark.asyncio
+async def test_polling_transport_sees_writes_from_other_workers():
+    transport = PollingTransport(interval=3600)
+    await transport.start(lambda ev: None)
+    await transport.stop()
+    async with SessionLocal() as db:
+        db.add(Flag(tenant_id="poll-t", key="f1", state="on", variants=[], rules=[]))
+        await db.commit()
+    events = await transport.poll()
+    assert [(e.tenant, e.entity, e.key) for e in events] == [("poll-t", "flag", "f1")]
+    assert await transport.poll() == []
+
+@pytest.mark.asyncio
+async def test_polling_transport_rescans_overlap_window_for_late_commits():
+    transport = PollingTransport(interval=3600, overlap=30)
+    await transport.start(lambda ev: None)
+    await transport.stop()
+    async with SessionLocal() as db:
+        db.add(Flag(tenant_id="poll-late", key="early", state="on", variants=[], rules=[]))
+        await db.commit()
+    assert [e.key for e in await transport.poll() if e.tenant == "poll-late"] == ["early"]
+    # Stamped before "early" but committed after it was polled.
+    late = transport._wm["flag"] - timedelta(seconds=5)
+    async with SessionLocal() as db:
+        db.add(Flag(tenant_id="poll-late", key="late", state="on", variants=[], rules=[], updated_at=late))
+        await db.commit()
+    assert [e.key for e in await transport.poll() if e.tenant == "poll-late"] == ["late"]
+    assert await transport.poll() == []
+
+def test_resync_event_clears_every_tenant():
+    from app.routers.evaluate import _on_change, cache
+    cache.set("resync-a:flag:x", {"key": "x"})
+    cache.set("resync-b:segments", object())
+    _on_change(ChangeEvent.everything())
+    assert cache.get("resync-a:flag:x") is None and cache.get("resync-b:segments") is None
+
+@pytest.mark.asyncio
+async def test_refills_after_a_change_read_the_primary(monkeypatch):
+    from app.deps import FreshReads
+    from app.routers import evaluate
+
+    def replica():
+        raise AssertionError("refill went to the replica")
+    await evaluate.get_segments("fresh-t")  # unchanged, cached from the replica
+    monkeypatch.setattr(evaluate, "fresh_reads", FreshReads(SessionLocal, replica, hold_seconds=30))
+    async with SessionLocal() as db:
+        db.add(Flag(tenant_id="fresh-t", key="f1", state="on", variants=[], rules=[]))
+        await db.commit()
+    evaluate._on_change(ChangeEvent("fresh-t", "flag", "f1", "2024-01-01T00:00:00"))
+    assert (await evaluate._load_flag("fresh-t", "f1"))["key"] == "f1"
+    assert (await evaluate._load_ruleset("fresh-t")).flags
+    with pytest.raises(AssertionError):
+        await evaluate._load_flag("fresh-t", "untouched")
@@ -0,0 +1,69 @@
+import pytest
+from httpx import AsyncClient
+from app.main import app
+
+FLAG = {
+    "key": "new_checkout", "description": "New checkout flow", "state": "on",
+    "variants": [{"key": "control", "weight": 50}, {"key": "treatment", "weight": 50}],
+    "rules": [{"id": "r1", "order": 1, "when": {"segment": "internal"}, "rollout": {"variant": "treatment"}}],
+}
+
+@pytest.mark.asyncio
+async def test_flag_segment_crud_and_evaluate_sees_writes():
+    h = {"X-Tenant-ID": "crud-t"}
+    user = {"id": "u1", "attributes": {"role": "employee"}}
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        assert (await ac.post("/v1/flags", headers=h, json=FLAG)).status_code == 201
+        assert (await ac.post("/v1/flags", headers=h, json=FLAG)).status_code == 200
+        assert (await ac.post("/v1/flags", headers=h, json={**FLAG, "variants": [{"key": "a", "weight": -1}]})).status_code == 422
+        assert (await ac.get("/v1/flags/new_checkout", headers={"X-Tenant-ID": "other"})).status_code == 404
+
+        r = await ac.post("/v1/evaluate", headers=h, json={"flag_key": "new_checkout", "user": user})
+        assert r.json()["reason"] == "default_distribution"
+
+        # Creating the segment must reach the cached plan without waiting for the TTL.
+        r = await ac.post("/v1/segments", headers=h, json={"key": "internal", "criteria": {"attr": {"role": "employee"}}})
+        assert r.status_code == 201
+        r = await ac.post("/v1/evaluate", headers=h, json={"flag_key": "new_checkout", "user": user})
+        assert r.json()["rule_id"] == "r1"
+
+        r = await ac.put("/v1/flags/new_checkout", headers=h, json={**FLAG, "state": "off"})
+        assert r.status_code == 200 and r.json()["state"] == "off"
+        r = await ac.post("/v1/evaluate", headers=h, json={"flag_key": "new_checkout", "user": user})
+        assert r.json()["reason"] == "flag_off"
+
+        r = await ac.get("/v1/flags", headers=h, params={"state": "off", "q": "checkout"})
+        assert [f["key"] for f in r.json()] == ["new_checkout"]
+
+        assert (await ac.delete("/v1/flags/new_checkout", headers=h)).status_code == 204
+        assert (await ac.get("/v1/flags/new_checkout", headers=h)).status_code == 404
+        r = await ac.post("/v1/evaluate", headers=h, json={"flag_key": "new_checkout", "user": user})
+        assert r.status_code == 404
+
+        assert (await ac.delete("/v1/segments/internal", headers=h)).status_code == 204
+        assert (await ac.get("/v1/segments/internal", headers=h)).status_code == 404
+
+@pytest.mark.asyncio
+async def test_create_that_loses_the_insert_race_updates_instead(monkeypatch):
+    from app.deps import SessionLocal
+    from app.models import Flag
+    from app.routers import flags
+
+    real_get = flags._get
+    calls = 0
+
+    async def racing_get(db, tenant, key, include_deleted=False):
+        nonlocal calls
+        calls += 1
+        if calls == 1:  # another worker creates the flag between our read and our insert
+            async with SessionLocal() as other:
+                other.add(Flag(tenant_id=tenant, key=key, state="off", variants=FLAG["variants"], rules=[]))
+                await other.commit()
+            return None
+        return await real_get(db, tenant, key, include_deleted)
+
+    monkeypatch.setattr(flags, "_get", racing_get)
+    h = {"X-Tenant-ID": "crud-race"}
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        r = await ac.post("/v1/flags", headers=h, json=FLAG)
+        assert r.status_code == 200 and r.json()["state"] == "on"
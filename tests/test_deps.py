@@ -0,0 +1,36 @@
+import time
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from app.deps import FreshReads, ReadSessionLocal, SessionLocal, engine, read_engine
+
+
+@pytest.mark.asyncio
+async def test_sqlite_read_engine_is_separate_read_only_and_wal():
+    assert read_engine is not engine
+    async with SessionLocal() as db:
+        assert (await db.execute(text("PRAGMA journal_mode"))).scalar() == "wal"
+        assert (await db.execute(text("PRAGMA synchronous"))).scalar() == 1  # NORMAL
+    before = REGISTRY.get_sample_value("db_pool_checkout_seconds_count", {"engine": "read"}) or 0
+    async with ReadSessionLocal() as db:
+        assert (await db.execute(text("SELECT count(*) FROM flags"))).scalar() >= 0
+        with pytest.raises(OperationalError):
+            await db.execute(text("DELETE FROM flags WHERE 1 = 0"))
+    assert REGISTRY.get_sample_value("db_pool_checkout_seconds_count", {"engine": "read"}) > before
+
+
+def test_fresh_reads_route_changed_keys_to_the_primary_until_the_hold_ends(monkeypatch):
+    primary, replica = object(), object()
+    reads = FreshReads(primary, replica, hold_seconds=30)
+    reads.mark("t:flag:a")
+    reads.mark_prefix("u:")
+    assert reads.session("t:flag:a") is primary
+    assert reads.session("t:flag:b") is replica
+    assert reads.session("u:segments") is primary
+    later = time.monotonic() + 31
+    monkeypatch.setattr(time, "monotonic", lambda: later)
+    assert reads.session("t:flag:a") is replica and reads.session("u:segments") is replica
+    off = FreshReads(primary, replica, hold_seconds=0)
+    off.mark_prefix("")
+    assert off.session("t:flag:a") is replica
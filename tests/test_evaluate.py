@@ -0,0 +1,110 @@
+import json
+import pytest
+from httpx import AsyncClient
+from app.main import app
+from app.deps import SessionLocal
+from app.models import Flag, Segment
+from app.routers.evaluate import cache, plans
+
+@pytest.mark.asyncio
+async def test_evaluate_uses_compiled_plan_and_404s():
+    async with SessionLocal() as db:
+        db.add(Flag(tenant_id="eval-t", key="beta", state="on",
+                    variants=[{"key": "control", "weight": 1}],
+                    rules=[{"id": "r1", "when": {"segment": "staff"}, "rollout": {"variant": "treatment"}}]))
+        db.add(Segment(tenant_id="eval-t", key="staff", criteria={"attr": {"role": "employee"}}))
+        await db.commit()
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        h = {"X-Tenant-ID": "eval-t"}
+        r = await ac.post("/v1/evaluate", headers=h, json={"flag_key": "beta", "user": {"id": "u1", "attributes": {"role": "employee"}}})
+        assert r.status_code == 200
+        assert r.json()["variant"] == "treatment" and r.json()["rule_id"] == "r1"
+        plan = plans.get("eval-t", cache.get("eval-t:flag:beta"), cache.get("eval-t:segments"))
+        r = await ac.post("/v1/evaluate", headers=h, json={"flag_key": "beta", "user": {"id": "u2"}})
+        assert r.json()["reason"] == "default_distribution"
+        assert plans.get("eval-t", cache.get("eval-t:flag:beta"), cache.get("eval-t:segments")) is plan
+
+        r = await ac.post("/v1/evaluate", headers={"X-Tenant-ID": "other"}, json={"flag_key": "beta", "user": {"id": "u1"}})
+        assert r.status_code == 404
+
+@pytest.mark.asyncio
+async def test_evaluate_batch_streams_matrix():
+    async with SessionLocal() as db:
+        db.add(Flag(tenant_id="batch-t", key="a", state="on", variants=[{"key": "on", "weight": 1}], rules=[]))
+        db.add(Flag(tenant_id="batch-t", key="b", state="off", variants=[{"key": "off", "weight": 1}], rules=[]))
+        await db.commit()
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        h = {"X-Tenant-ID": "batch-t"}
+        r = await ac.post("/v1/evaluate/batch", headers=h, json={"users": [{"id": "u1"}, {"id": "u2"}, {"id": "u3"}]})
+        assert r.status_code == 200
+        assert r.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in r.text.splitlines()]
+        assert [(row["user_id"], row["flag_key"], row["variant"]) for row in lines[:2]] == [("u1", "a", "on"), ("u1", "b", "off")]
+        assert len(lines) == 6
+
+        r = await ac.post("/v1/evaluate/batch", headers=h, json={"flag_keys": ["a", "nope"], "users": [{"id": "u1"}]})
+        assert r.status_code == 404
+
+@pytest.mark.asyncio
+async def test_simulate_reports_blast_radius():
+    flag = {"key": "ramp", "state": "on", "variants": [{"key": "off", "weight": 1}],
+            "rules": [{"id": "r1", "when": {"percentage": 10}, "rollout": {"variant": "on"}}]}
+    ramped = {**flag, "rules": [{"id": "r1", "when": {"percentage": 25}, "rollout": {"variant": "on"}}]}
+    csv_body = "id,country\n" + "".join(f"u{i},CA\n" for i in range(1000))
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        r = await ac.post(
+            "/v1/evaluate/simulate",
+            headers={"X-Tenant-ID": "sim-t"},
+            data={"flag": json.dumps(flag), "proposed": json.dumps(ramped)},
+            files={"population": ("users.csv", csv_body, "text/csv")},
+        )
+    assert r.status_code == 200
+    body = r.json()
+    assert body["population"] == 1000
+    cur_on = body["current"]["variants"]["on"]
+    new_on = body["proposed"]["variants"]["on"]
+    assert body["switched"] == body["transitions"]["off->on"] == new_on - cur_on
+    assert body["current"]["rules"]["r1"] == cur_on
+
+def test_simulate_types_csv_cells_like_evaluate():
+    from app.services.simulate import load_population, simulate
+    flag = {"key": "zip", "state": "on", "variants": [{"key": "off", "weight": 1}],
+            "rules": [{"id": "zip", "when": {"attr": {"zip": "01234"}}, "rollout": {"variant": "on"}},
+                      {"id": "adult", "when": {"segment": "adults"}, "rollout": {"variant": "on"}}]}
+    pop = load_population(b"id,zip,age,beta\nu1,01234,12,true\nu2,1234,30,false\nu3,99999,17,true\n", "users.csv")
+    report = simulate("sim-types", flag, pop, {"adults": {"attr": {"age_gte": 18, "beta": False}}})
+    # "01234" stays a string (only compared with strings); age and beta take their matchers' types.
+    assert report["current"]["rules"] == {"zip": 1, "adult": 1, "default_distribution": 1}
+
+@pytest.mark.asyncio
+async def test_matching_segments_debug_endpoint():
+    async with SessionLocal() as db:
+        db.add(Segment(tenant_id="segidx-t", key="ca", criteria={"attr": {"country": "CA"}}))
+        db.add(Segment(tenant_id="segidx-t", key="ios", criteria={"attr": {"os": "iOS"}}))
+        await db.commit()
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        r = await ac.post("/v1/evaluate/segments", headers={"X-Tenant-ID": "segidx-t"},
+                          json={"user": {"id": "u1", "attributes": {"country": "CA", "os": "Android"}}})
+    assert r.status_code == 200 and r.json() == {"segments": ["ca"]}
+
+@pytest.mark.asyncio
+async def test_evaluate_all_etag_revalidation():
+    h = {"X-Tenant-ID": "boot-t"}
+    user = {"id": "u1", "attributes": {"country": "CA"}}
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        for key in ("a", "b"):
+            await ac.post("/v1/flags", headers=h, json={"key": key, "state": "on", "variants": [{"key": "x", "weight": 1}]})
+        r = await ac.post("/v1/evaluate/all", headers=h, json={"user": user})
+        assert r.status_code == 200 and sorted(r.json()["flags"]) == ["a", "b"]
+        etag = r.headers["etag"]
+
+        r = await ac.post("/v1/evaluate/all", headers={**h, "If-None-Match": etag}, json={"user": user})
+        assert r.status_code == 304 and r.content == b""
+        r = await ac.post("/v1/evaluate/all", headers={**h, "If-None-Match": etag}, json={"user": {**user, "id": "u2"}})
+        assert r.status_code == 200
+
+        assert (await ac.delete("/v1/flags/b", headers=h)).status_code == 204
+        r = await ac.post("/v1/evaluate/all", headers={**h, "If-None-Match": etag}, json={"user": user})
+        assert r.status_code == 200 and list(r.json()["flags"]) == ["a"]
@@ -0,0 +1,70 @@
+from datetime import datetime
+import pytest
+from httpx import AsyncClient
+from app.deps import SessionLocal
+from app.main import app
+from app.services.exposures import ExposureAggregator, HyperLogLog, aggregator, exposure_report
+
+T0 = 1_700_000_040  # a bucket boundary for 60s buckets
+
+
+def test_hyperloglog_estimate_and_merge():
+    a, b = HyperLogLog(), HyperLogLog()
+    for i in range(6000):
+        a.add(f"u{i}")
+    for i in range(3000, 10000):
+        b.add(f"u{i}")
+    assert abs(a.estimate() - 6000) / 6000 < 0.08
+    assert abs(HyperLogLog(bytes(a.registers)).merge(b).estimate() - 10000) / 10000 < 0.08
+    assert HyperLogLog().estimate() == 0
+
+
+@pytest.mark.asyncio
+async def test_flushes_add_up_and_roll_up():
+    agg = ExposureAggregator(bucket_seconds=60, unique_users=True)
+    on = {"variant": "on", "rule_id": "r1"}
+    off = {"variant": "off", "rule_id": None}
+    for i in range(30):
+        agg.record("exp-t", "f", on if i % 3 else off, f"u{i % 10}", now=T0 + i)
+    await agg.flush()
+    for i in range(10):
+        agg.record("exp-t", "f", on, f"u{i}", now=T0 + 5)
+        agg.record("exp-t", "f", on, f"u{i}", now=T0 + 65)
+    await agg.flush()
+
+    async with SessionLocal() as db:
+        per_bucket = await exposure_report(db, "exp-t", "f", datetime(2000, 1, 1), datetime(2100, 1, 1), 60)
+        rolled = await exposure_report(db, "exp-t", "f", datetime(2000, 1, 1), datetime(2100, 1, 1), 120)
+    assert [(s["variant"], s["rule_id"], s["count"]) for s in per_bucket] == [
+        ("off", None, 10), ("on", "r1", 30), ("on", "r1", 10)]
+    assert per_bucket[1]["unique_users"] == 10
+    assert [(s["variant"], s["count"], s["unique_users"]) for s in rolled] == [("off", 10, 10), ("on", 40, 10)]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_flushes_from_two_workers_merge_sketches():
+    import asyncio
+    workers = [ExposureAggregator(bucket_seconds=60, unique_users=True) for _ in range(2)]
+    for w, worker in enumerate(workers):
+        for i in range(200):
+            worker.record("exp-race", "f", {"variant": "on", "rule_id": None}, f"w{w}-u{i}", now=T0)
+    await asyncio.gather(*(worker.flush() for worker in workers))
+
+    async with SessionLocal() as db:
+        [row] = await exposure_report(db, "exp-race", "f", datetime(2000, 1, 1), datetime(2100, 1, 1), 60)
+    assert row["count"] == 400
+    assert abs(row["unique_users"] - 400) / 400 < 0.08
+
+
+@pytest.mark.asyncio
+async def test_evaluations_show_up_in_exposure_endpoint():
+    h = {"X-Tenant-ID": "exp-api"}
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        await ac.post("/v1/flags", headers=h, json={"key": "f", "state": "on", "variants": [{"key": "a", "weight": 1}]})
+        for i in range(5):
+            await ac.post("/v1/evaluate", headers=h, json={"flag_key": "f", "user": {"id": f"u{i}"}})
+        await aggregator.flush()
+        r = await ac.get("/v1/exposures/f", headers=h, params={"interval": 3600})
+        assert r.status_code == 200
+        assert [(s["variant"], s["rule_id"], s["count"]) for s in r.json()["slices"]] == [("a", None, 5)]
+        assert (await ac.get("/v1/exposures/f", headers=h, params={"interval": 90})).status_code == 400
@@ -0,0 +1,98 @@
+import pytest
+from fastapi.responses import JSONResponse
+from httpx import AsyncClient
+from app.config import settings
+from app.deps import SessionLocal
+from app.main import app
+from app.models import Flag
+from app.schemas import EvaluateResponse
+from app.services.fast_evaluate import evaluation_body, parse_evaluate
+
+
+def _reference(result):
+    return JSONResponse(EvaluateResponse.model_validate(result).model_dump(mode="json")).body
+
+
+@pytest.mark.parametrize("result", [
+    {"variant": "off", "reason": "flag_off", "rule_id": None, "details": {}},
+    {"variant": "grün \"q\" \\ ✓", "reason": "rule_match", "rule_id": "r\n1", "details": {"bucket": 0.1234567}},
+    {"variant": "a", "reason": "default_distribution", "rule_id": None, "details": {"bucket": 5e-05}},
+    {"variant": "a", "reason": "default_distribution", "rule_id": None, "details": {"bucket": 0.0}},
+])
+def test_body_matches_json_response(result):
+    assert evaluation_body(result) == _reference(result)
+
+
+def test_unusual_results_fall_back():
+    base = {"variant": "a", "reason": "rule_match", "rule_id": None, "details": {"bucket": 0.5}}
+    assert evaluation_body({**base, "variant": 1}) is None
+    assert evaluation_body({**base, "rule_id": 7}) is None
+    assert evaluation_body({**base, "details": {"bucket": 1}}) is None
+    assert evaluation_body({**base, "details": {"bucket": 0.5, "x": 1}}) is None
+
+
+def test_parse_accepts_only_the_plain_shape():
+    assert parse_evaluate(b'{"flag_key":"f","user":{"id":"u"},"extra":1}') == ("f", {"id": "u"})
+    for body in (b"", b"[]", b"{", b'{"flag_key":1,"user":{}}', b'{"flag_key":"f","user":[]}', b'{"flag_key":"f"}',
+                 b'{"flag_key":"f","user":{"n":NaN}}'):
+        assert parse_evaluate(body) is None
+
+
+@pytest.mark.asyncio
+async def test_fast_path_is_byte_compatible(monkeypatch):
+    async with SessionLocal() as db:
+        db.add(Flag(tenant_id="fast-t", key="on", state="on", variants=[{"key": "a", "weight": 1}, {"key": "b", "weight": 1}],
+                    rules=[{"id": "vip", "when": {"attr": {"tier": "vip"}}, "rollout": {"variant": "b"}}]))
+        db.add(Flag(tenant_id="fast-t", key="off", state="off", variants=[{"key": "ä", "weight": 1}], rules=[]))
+        await db.commit()
+
+    h = {"X-Tenant-ID": "fast-t"}
+    cases = [
+        (h, {"json": {"flag_key": "on", "user": {"id": "u1"}}}),
+        (h, {"json": {"flag_key": "on", "user": {"id": "u2", "attributes": {"tier": "vip"}}, "extra": True}}),
+        (h, {"json": {"flag_key": "off", "user": {}}}),
+        (h, {"json": {"flag_key": "missing", "user": {"id": "u1"}}}),
+        (h, {"json": {"flag_key": 3, "user": {"id": "u1"}}}),
+        (h, {"json": {"flag_key": "on"}}),
+        (h, {"content": b'{"flag_key": "on", '}),
+        (h, {"content": b'{"flag_key": "on", "user": {"n": NaN}}'}),
+        ({**h, "Content-Type": "text/plain"}, {"content": b'{"flag_key": "on", "user": {}}'}),
+        ({}, {"json": {"flag_key": "on", "user": {"id": "u1"}}}),
+        ({"X-Tenant-ID": ""}, {"json": {"flag_key": "on", "user": {"id": "u1"}}}),
+    ]
+
+    async def responses():
+        out = []
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            for headers, kwargs in cases:
+                r = await ac.post("/v1/evaluate", headers=headers, **kwargs)
+                out.append((r.status_code, r.headers.get("content-type"), r.headers.get("content-length"), r.content))
+        return out
+
+    fast = await responses()
+    monkeypatch.setattr(settings, "evaluate_fast_path", False)
+    validated = await responses()
+    assert fast == validated
+    assert [status for status, *_ in fast] == [200, 200, 200, 404, 422, 422, 422, 200, 422, 422, 400]
+
+
+@pytest.mark.asyncio
+async def test_fast_path_enforces_scopes(monkeypatch):
+    from app.deps import token_cache
+    from app.utils.security import issue_token
+    monkeypatch.setattr(settings, "auth_enabled", True)
+    token_cache.clear()
+    body = {"flag_key": "nope", "user": {"id": "u1"}}
+    headers = [{}, {"Authorization": "Bearer junk"},
+               {"Authorization": f"Bearer {issue_token(settings.jwt_secret, 'c', ['audit:r'])}"},
+               {"Authorization": f"Bearer {issue_token(settings.jwt_secret, 'c', ['flags:r'])}"}]
+
+    async def responses():
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            return [(r.status_code, r.headers.get("www-authenticate"), r.content) for r in
+                    [await ac.post("/v1/evaluate", headers={"X-Tenant-ID": "fast-t", **h}, json=body) for h in headers]]
+
+    fast = await responses()
+    monkeypatch.setattr(settings, "evaluate_fast_path", False)
+    assert fast == await responses()
+    assert [status for status, *_ in fast] == [401, 401, 403, 404]
@@ -0,0 +1,62 @@
+from app.services.flag_eval import compile_flag, evaluate_flag, stable_bucket
+
+FLAG = {
+    "key": "checkout_new",
+    "state": "on",
+    "variants": [{"key": "control", "weight": 1}, {"key": "treatment", "weight": 1}],
+    "rules": [
+        {"id": "r2", "order": 2, "when": {"segment": "ca_ios_new_users", "percentage": 10}, "rollout": {"variant": "treatment"}},
+        {"id": "r1", "order": 1, "when": {"attr": {"role": "employee"}}, "rollout": {"variant": "treatment"}},
+    ],
+}
+SEGMENTS = {
+    "ca_ios_new_users": {"all": [
+        {"attr": {"country": "CA"}},
+        {"attr": {"os": "iOS"}},
+        {"attr": {"account_age_days_lte": 30}},
+    ]},
+}
+
+def test_flag_off_returns_first_variant():
+    r = evaluate_flag({**FLAG, "state": "off"}, "t1", {"id": "u1"})
+    assert r == {"variant": "control", "reason": "flag_off", "rule_id": None, "details": {}}
+
+def test_rules_run_in_order_and_attr_equals():
+    r = evaluate_flag(FLAG, "t1", {"id": "u1", "attributes": {"role": "employee", "country": "CA", "os": "iOS", "account_age_days": 1}}, SEGMENTS)
+    assert (r["variant"], r["reason"], r["rule_id"]) == ("treatment", "rule_match", "r1")
+    assert r["details"]["bucket"] == stable_bucket("t1", "checkout_new", "u1")
+
+def test_segment_and_percentage_gate():
+    attrs = {"country": "CA", "os": "iOS", "account_age_days": 7}
+    plan = compile_flag(FLAG, SEGMENTS)
+    assert plan.segment_refs == {"ca_ios_new_users"}
+    for i in range(200):
+        uid = f"u{i}"
+        r = plan.evaluate("t1", {"id": uid, "attributes": attrs})
+        if stable_bucket("t1", "checkout_new", uid) < 0.10:
+            assert r["rule_id"] == "r2" and r["variant"] == "treatment"
+        else:
+            assert r["reason"] == "default_distribution"
+    r = plan.evaluate("t1", {"id": "u1", "attributes": {**attrs, "account_age_days": 90}})
+    assert r["reason"] == "default_distribution"
+
+def test_gated_distribution_is_rescaled():
+    flag = {
+        "key": "f", "state": "on", "variants": [{"key": "a", "weight": 1}],
+        "rules": [{"id": "r", "when": {"percentage": 50}, "rollout": {"distribution": [{"key": "c", "weight": 50}, {"key": "t", "weight": 50}]}}],
+    }
+    plan = compile_flag(flag)
+    seen = {plan.evaluate("t", {"id": f"u{i}"}, bucket=b)["variant"] for i, b in enumerate((0.1, 0.3, 0.7))}
+    assert seen == {"c", "t", "a"}
+
+def test_default_distribution_normalizes_weights():
+    flag = {"key": "f", "state": "on", "variants": [{"key": "a", "weight": 3}, {"key": "b", "weight": 1}], "rules": []}
+    plan = compile_flag(flag)
+    assert plan.evaluate("t", {"id": "x"}, bucket=0.74)["variant"] == "a"
+    assert plan.evaluate("t", {"id": "x"}, bucket=0.76)["variant"] == "b"
+
+def test_unknown_segment_and_cycles_never_match():
+    flag = {"key": "f", "state": "on", "variants": [{"key": "a", "weight": 1}],
+            "rules": [{"id": "r", "when": {"segment": "loop"}, "rollout": {"variant": "b"}}]}
+    assert evaluate_flag(flag, "t", {"id": "u"})["reason"] == "default_distribution"
+    assert evaluate_flag(flag, "t", {"id": "u"}, {"loop": {"segment": "loop"}})["reason"] == "default_distribution"
@@ -1,11 +1,17 @@
 import pytest
 from httpx import AsyncClient
 from app.main import app
+from app.routers.evaluate import prime
+from app.services.snapshot import warm
 
 @pytest.mark.asyncio
 async def test_health_and_ready():
     async with AsyncClient(app=app, base_url="http://test") as ac:
         r = await ac.get("/healthz")
         assert r.status_code == 200 and r.text == "ok"
+        if not warm.ready.is_set():
+            r = await ac.get("/readyz")
+            assert r.status_code == 503 and r.text == "warming"
+            await warm.run(prime)
         r = await ac.get("/readyz")
         assert r.status_code == 200 and r.text == "ready"
@@ -0,0 +1,54 @@
+import json
+import logging
+import queue
+import pytest
+from httpx import AsyncClient
+from app.main import app
+from app.utils.logging import (
+    AccessLogSampler, ContextFilter, JsonFormatter, NonBlockingQueueHandler, LOG_DROPPED, request_context,
+)
+
+
+def _record(msg="hello", **extra):
+    record = logging.LogRecord("t", logging.INFO, __file__, 1, msg, None, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_formatter_includes_request_context_and_extras():
+    token = request_context.set({"path": "/v1/evaluate", "method": "POST", "tenant": "acme", "request_id": "r1"})
+    try:
+        record = _record(status=200)
+        ContextFilter().filter(record)
+    finally:
+        request_context.reset(token)
+    out = json.loads(JsonFormatter().format(record))
+    assert out["message"] == "hello" and out["timestamp"].endswith("+00:00")
+    assert {k: out[k] for k in ("path", "method", "tenant", "request_id", "status")} == {
+        "path": "/v1/evaluate", "method": "POST", "tenant": "acme", "request_id": "r1", "status": 200}
+
+
+def test_queue_handler_drops_instead_of_blocking():
+    handler = NonBlockingQueueHandler(queue.Queue(1))
+    before = LOG_DROPPED._value.get()
+    handler.handle(_record("a"))
+    handler.handle(_record("b"))
+    assert LOG_DROPPED._value.get() == before + 1
+
+
+def test_sampler_prefers_tenant_rate_and_keeps_errors():
+    s = AccessLogSampler({"/v1/evaluate": 0.0}, {"vip": 1.0})
+    assert not s.keep("/v1/evaluate", "acme", 200)
+    assert s.keep("/v1/evaluate", "vip", 200)
+    assert s.keep("/v1/evaluate", "acme", 503)
+    assert s.keep("/v1/flags", "acme", 200)
+
+
+@pytest.mark.asyncio
+async def test_access_log_carries_request_id(caplog):
+    with caplog.at_level(logging.INFO, logger="app.access"):
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            r = await ac.get("/v1/flags/missing", headers={"X-Tenant-ID": "log-t", "X-Request-ID": "req-42"})
+    assert r.headers["x-request-id"] == "req-42"
+    rec = next(r for r in caplog.records if r.name == "app.access")
+    assert (rec.request_id, rec.tenant, rec.route, rec.status) == ("req-42", "log-t", "/v1/flags/{key}", 404)
@@ -0,0 +1,37 @@
+import pytest
+from httpx import AsyncClient
+from prometheus_client import REGISTRY
+from app.main import app
+from app.utils.metrics import UNMATCHED
+
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+@pytest.mark.asyncio
+async def test_requests_labelled_by_route_template():
+    h = {"X-Tenant-ID": "metrics-t"}
+    before = _sample("http_requests_total", path="/v1/flags/{key}", method="GET", status="404")
+    hist = _sample("http_request_duration_seconds_count", path="/v1/flags/{key}", method="GET")
+    unmatched = _sample("http_requests_total", path=UNMATCHED, method="GET", status="404")
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        for key in ("a", "b", "c"):
+            assert (await ac.get(f"/v1/flags/{key}", headers=h)).status_code == 404
+        await ac.get("/no/such/path")
+    assert _sample("http_requests_total", path="/v1/flags/{key}", method="GET", status="404") == before + 3
+    assert _sample("http_request_duration_seconds_count", path="/v1/flags/{key}", method="GET") == hist + 3
+    assert _sample("http_requests_total", path=UNMATCHED, method="GET", status="404") == unmatched + 1
+    assert _sample("http_requests_total", path="/v1/flags/a", method="GET", status="404") == 0
+    assert _sample("http_requests_in_flight") == 0
+
+
+@pytest.mark.asyncio
+async def test_evaluation_outcomes_counted():
+    h = {"X-Tenant-ID": "metrics-t"}
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        await ac.post("/v1/flags", headers=h, json={"key": "dark", "state": "off", "variants": [{"key": "old", "weight": 1}]})
+        before = _sample("flag_evaluations_total", reason="flag_off", variant="old")
+        r = await ac.post("/v1/evaluate", headers=h, json={"flag_key": "dark", "user": {"id": "u1"}})
+        assert r.json()["reason"] == "flag_off"
+    assert _sample("flag_evaluations_total", reason="flag_off", variant="old") == before + 1
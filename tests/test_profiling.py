@@ -0,0 +1,84 @@
+import os
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from prometheus_client import REGISTRY
+from app.config import settings
+from app.deps import SessionLocal, token_cache
+from app.main import app
+from app.models import Flag
+from app.services.flag_eval import evaluate_flag
+from app.utils.profiling import ProfilingMiddleware, stage
+from app.utils.security import issue_token
+
+H = {"X-Tenant-ID": "prof-t"}
+BODY = {"flag_key": "p", "user": {"id": "u1", "attributes": {"country": "US"}}}
+
+
+def _stages(header):
+    return [part.split(";")[0] for part in header.split(", ")]
+
+
+def test_rule_timings_from_evaluate_flag():
+    flag = {"key": "f", "state": "on", "variants": [{"key": "a", "weight": 1}],
+            "rules": [{"id": "r1", "when": {"attr": {"country": "DE"}}, "rollout": {"variant": "a"}},
+                      {"id": "r2", "when": {"attr": {"country": "US"}}, "rollout": {"variant": "a"}},
+                      {"id": "r3", "rollout": {"variant": "a"}}]}
+    timings = []
+    assert evaluate_flag(flag, "t", {"id": "u", "attributes": {"country": "US"}}, rule_timings=timings)["rule_id"] == "r2"
+    assert [(rule_id, hit) for rule_id, _, hit in timings] == [("r1", False), ("r2", True)]
+    assert all(ns >= 0 for _, ns, _ in timings)
+
+
+@pytest.mark.asyncio
+async def test_server_timing_only_for_privileged_callers(monkeypatch):
+    async with SessionLocal() as db:
+        db.add(Flag(tenant_id="prof-t", key="p", state="on", variants=[{"key": "a", "weight": 1}],
+                    rules=[{"id": "us", "when": {"attr": {"country": "US"}}, "rollout": {"variant": "a"}}]))
+        await db.commit()
+    before = REGISTRY.get_sample_value("request_stage_seconds_count", {"stage": "match"}) or 0.0
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        r = await ac.post("/v1/evaluate", headers={**H, "X-Debug-Profile": "1"}, json=BODY)
+        assert r.json()["rule_id"] == "us"
+        timing = r.headers["server-timing"]
+        assert _stages(timing) == ["tenant", "db", "cache", "compile", "match", "serialize", "rule", "total"]
+        assert 'rule;desc="p/us match"' in timing
+        assert "server-timing" not in (await ac.post("/v1/evaluate", headers=H, json=BODY)).headers
+
+        monkeypatch.setattr(settings, "auth_enabled", True)
+        token_cache.clear()
+        plain = issue_token(settings.jwt_secret, "c", ["flags:r"])
+        debug = issue_token(settings.jwt_secret, "c", ["flags:r", "debug:profile"])
+        r = await ac.post("/v1/evaluate", headers={**H, "X-Debug-Profile": "1", "Authorization": f"Bearer {plain}"},
+                          json=BODY)
+        assert r.status_code == 200 and "server-timing" not in r.headers
+        r = await ac.post("/v1/evaluate", headers={**H, "X-Debug-Profile": "1", "Authorization": f"Bearer {debug}"},
+                          json=BODY)
+        assert _stages(r.headers["server-timing"])[:4] == ["auth", "tenant", "cache", "compile"]
+    assert REGISTRY.get_sample_value("request_stage_seconds_count", {"stage": "match"}) == before + 4
+
+
+@pytest.mark.asyncio
+async def test_cprofile_dumps_on_request_and_sample(tmp_path):
+    inner = FastAPI()
+
+    @inner.get("/work/{n}")
+    async def work(n: int):
+        with stage("work"):
+            return {"sum": sum(range(n))}
+
+    def profiled(rate):
+        return ProfilingMiddleware(inner, authorize=lambda auth: auth == "Bearer ok", profile_dir=str(tmp_path),
+                                   sample_rate=rate)
+
+    async with AsyncClient(transport=ASGITransport(app=profiled(0.0)), base_url="http://test") as ac:
+        r = await ac.get("/work/10", headers={"X-Debug-Profile": "cprofile"})
+        assert "server-timing" not in r.headers and os.listdir(tmp_path) == []
+        r = await ac.get("/work/10", headers={"X-Debug-Profile": "cprofile", "Authorization": "Bearer ok"})
+        assert _stages(r.headers["server-timing"]) == ["work", "total"]
+    async with AsyncClient(transport=ASGITransport(app=profiled(1.0)), base_url="http://test") as ac:
+        assert "server-timing" not in (await ac.get("/work/10")).headers
+    names = sorted(os.listdir(tmp_path))
+    assert len(names) == 2 and all(n.endswith(".prof") and "GET-work_n" in n for n in names)
+    assert {n.rsplit("-", 1)[1] for n in names} == {"header.prof", "sample.prof"}
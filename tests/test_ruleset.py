@@ -0,0 +1,27 @@
+from app.services.ruleset import CompiledFlagCache, DependencyIndex, SegmentSnapshot
+
+def _flag(key, when):
+    return {"key": key, "state": "on", "variants": [{"key": "a", "weight": 1}],
+            "rules": [{"id": "r", "when": when, "rollout": {"variant": "b"}}], "version": "v1"}
+
+def test_dependents_follow_nested_trees_and_segment_chains():
+    idx = DependencyIndex()
+    idx.update_flag("t", "f1", [{"when": {"any": [{"attr": {"x": 1}}, {"not": {"segment": "ca"}}]}}])
+    idx.update_flag("t", "f2", [{"when": {"segment": "ca_ios"}}])
+    idx.update_flag("t", "f3", [{"when": {"attr": {"x": 1}}}])
+    idx.update_segment("t", "ca_ios", {"all": [{"segment": "ca"}, {"attr": {"os": "iOS"}}]})
+    assert idx.dependents("t", "ca") == {"f1", "f2"}
+    assert idx.dependents("t", "ca_ios") == {"f2"}
+    assert idx.dependents("other", "ca") == set()
+    idx.update_flag("t", "f1", None)
+    assert idx.dependents("t", "ca") == {"f2"}
+
+def test_segment_change_drops_only_dependent_plans():
+    plans = CompiledFlagCache()
+    segs = SegmentSnapshot({"internal": {"attr": {"role": "employee"}}}, {"internal": "v1"})
+    uses = plans.get("t", _flag("uses", {"segment": "internal"}), segs)
+    other = plans.get("t", _flag("other", {"attr": {"x": 1}}), segs)
+    assert plans.invalidate_segment("t", "internal") == {"uses"}
+    segs2 = SegmentSnapshot({"internal": {"attr": {"role": "admin"}}}, {"internal": "v2"})
+    assert plans.get("t", _flag("other", {"attr": {"x": 1}}), segs2) is other
+    assert plans.get("t", _flag("uses", {"segment": "internal"}), segs2) is not uses
@@ -0,0 +1,30 @@
+import random
+from app.services.flag_eval import compile_segments, EvalContext
+from app.services.segment_index import SegmentIndex
+
+SEGMENTS = {
+    "ca_ios_new": {"all": [{"attr": {"country": "CA"}}, {"attr": {"os": "iOS"}}, {"attr": {"account_age_days_lte": 30}}]},
+    "ca": {"attr": {"country": "CA"}},
+    "adults": {"attr": {"age_gte": 18, "age_lt": 65}},
+    "everyone": {},
+    "not_ca": {"not": {"segment": "ca"}},
+    "ca_or_us": {"any": [{"segment": "ca"}, {"attr": {"country": "US"}}]},
+    "staff": {"attr": {"role_in": ["employee", "contractor"]}},
+}
+
+def test_index_agrees_with_compiled_predicates():
+    index = SegmentIndex(SEGMENTS)
+    preds = compile_segments(SEGMENTS)
+    rnd = random.Random(7)
+    for _ in range(500):
+        attrs = {
+            "country": rnd.choice(["CA", "US", "FR"]),
+            "os": rnd.choice(["iOS", "Android"]),
+            "account_age_days": rnd.randint(0, 60),
+            "age": rnd.choice([10, 18, 40, 65, 90, "n/a"]),
+            "role": rnd.choice(["employee", "guest"]),
+        }
+        for k in rnd.sample(sorted(attrs), rnd.randint(0, 2)):
+            del attrs[k]
+        expected = {k for k, p in preds.items() if p(EvalContext(attrs, 0.0))}
+        assert index.members(attrs) == expected, attrs
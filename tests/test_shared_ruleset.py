@@ -0,0 +1,86 @@
+import pytest
+from httpx import AsyncClient
+from app.deps import SessionLocal
+from app.main import app
+from app.models import Flag, Segment
+from app.routers import evaluate as evaluate_router
+from app.services.flag_eval import compile_flag
+from app.services.ruleset import SegmentSnapshot, ruleset_version
+from app.services.shared_ruleset import RulesetStore, SharedRuleset, encode
+from scripts.seed import synthetic_tenants
+
+
+def _tenant():
+    data = next(iter(synthetic_tenants(1, 20, 4, 8, seed=3).values()))
+    flags = [{**f, "description": None, "version": f"v{i}"} for i, f in enumerate(data["flags"])]
+    flags[0]["rules"] = [{"id": "r", "when": {"attr": {"n_gte": 2 ** 70, "name": "é✓", "ok": True}},
+                          "rollout": {"distribution": [{"key": "a", "weight": 12.5}, {"key": "b", "weight": 87.5}]}}]
+    segments = SegmentSnapshot(criteria=data["segments"], versions={k: "s1" for k in data["segments"]})
+    return flags, segments
+
+
+def test_encode_round_trips_and_interns():
+    flags, segments = _tenant()
+    version = ruleset_version(flags, segments)
+    rs = SharedRuleset(encode(version, flags, segments))
+    ordered = sorted(flags, key=lambda f: f["key"])
+    assert rs.version == version and len(rs) == len(flags)
+    assert list(rs.flags()) == ordered and rs.flags()[-1] == ordered[-1]
+    assert rs.segments() == segments
+    assert rs.flag(flags[0]["key"]) == flags[0] and rs.flag("missing") is None
+    assert type(rs.flag(flags[1]["key"])["variants"][0]["weight"]) is type(flags[1]["variants"][0]["weight"])
+    a, b = rs.flags()[0], rs.flags()[1]
+    assert a["variants"][0]["key"] is b["variants"][0]["key"]
+
+    users = [{"id": f"u{i}", "attributes": {"country": "US", "plan": "pro", "n": 2 ** 71}} for i in range(50)]
+    for f in flags:
+        shared, local = compile_flag(rs.flag(f["key"]), rs.segments().criteria), compile_flag(f, segments.criteria)
+        assert [shared.evaluate("t", u) for u in users] == [local.evaluate("t", u) for u in users]
+
+
+def test_store_swaps_versions_atomically(tmp_path):
+    flags, segments = _tenant()
+    store, other_worker = RulesetStore(str(tmp_path)), RulesetStore(str(tmp_path))
+    assert store.open("t/1") is None
+    v1 = store.publish("t/1", "v1", flags, segments)
+    assert store.publish("t/1", "v1", flags, segments) is v1
+    old = other_worker.open("t/1")
+    assert old.version == "v1" and other_worker.open("t/1") is old
+
+    store.publish("t/1", "v2", flags[:5], segments)
+    new = other_worker.open("t/1")
+    assert new.version == "v2" and len(new) == 5
+    # A reader still holding the old mapping keeps the old ruleset intact.
+    assert old.version == "v1" and len(list(old.flags())) == len(flags)
+
+
+@pytest.mark.asyncio
+async def test_ruleset_served_from_shared_store(tmp_path, monkeypatch):
+    async with SessionLocal() as db:
+        db.add(Flag(tenant_id="shm-t", key="a", state="on", variants=[{"key": "on", "weight": 1}],
+                    rules=[{"id": "r1", "when": {"segment": "staff"}, "rollout": {"variant": "on"}}]))
+        db.add(Segment(tenant_id="shm-t", key="staff", criteria={"attr": {"role": "employee"}}))
+        await db.commit()
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        h = {"X-Tenant-ID": "shm-t"}
+        expected = (await ac.get("/v1/ruleset", headers=h)).json()
+        monkeypatch.setattr(evaluate_router, "shared", RulesetStore(str(tmp_path)))
+        evaluate_router.cache.invalidate("shm-t:ruleset")
+        r = await ac.get("/v1/ruleset", headers=h)
+        assert r.json() == expected
+        assert evaluate_router.shared.open("shm-t").version == expected["version"]
+        r = await ac.post("/v1/evaluate/all", headers=h, json={"user": {"id": "u1", "attributes": {"role": "employee"}}})
+        assert r.json()["flags"]["a"]["variant"] == "on"
+
+
+def test_prime_publishes_each_version_once_per_host(tmp_path, monkeypatch):
+    from app.services.shared_ruleset import RULESET_PUBLISHED
+
+    flags, segments = _tenant()
+    published = RULESET_PUBLISHED._value.get()
+    for _ in range(3):  # one store per worker process
+        monkeypatch.setattr(evaluate_router, "shared", RulesetStore(str(tmp_path)))
+        evaluate_router.prime("shm-prime", flags, segments)
+    assert RULESET_PUBLISHED._value.get() - published == 1
+    assert len(evaluate_router.cache.get("shm-prime:ruleset").flags) == len(flags)
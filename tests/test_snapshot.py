@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import select
+from app.deps import ReadSessionLocal, SessionLocal
+from app.models import Audit, Flag, Segment
+from app.routers.evaluate import cache, get_ruleset, prime
+from app.services.snapshot import WarmStart, catch_up, collect, read_snapshot, write_snapshot
+
+
+async def _flag(db, tenant, key):
+    return (await db.execute(select(Flag).where(Flag.tenant_id == tenant, Flag.key == key))).scalar_one()
+
+
+@pytest.mark.asyncio
+async def test_round_trip_and_catch_up(tmp_path):
+    async with SessionLocal() as db:
+        db.add(Flag(tenant_id="snap-t", key="a", state="on", variants=[{"key": "on", "weight": 1}], rules=[]))
+        db.add(Flag(tenant_id="snap-t", key="b", state="on", variants=[{"key": "on", "weight": 1}], rules=[]))
+        db.add(Segment(tenant_id="snap-t", key="staff", criteria={"attr": {"role": "employee"}}))
+        await db.commit()
+        snap = await collect(db)
+    path = str(tmp_path / "snapshot.json")
+    write_snapshot(path, snap)
+    assert read_snapshot(str(tmp_path / "missing.json")) is None
+
+    async with SessionLocal() as db:
+        (await _flag(db, "snap-t", "a")).state = "off"
+        (await _flag(db, "snap-t", "b")).deleted_at = datetime.utcnow()
+        db.add(Flag(tenant_id="snap-t", key="c", state="on", variants=[{"key": "on", "weight": 1}], rules=[]))
+        seg = (await db.execute(select(Segment).where(Segment.tenant_id == "snap-t"))).scalar_one()
+        await db.delete(seg)
+        db.add(Audit(tenant_id="snap-t", actor="test", entity="segment", entity_key="staff", action="delete"))
+        await db.commit()
+
+    loaded = read_snapshot(path)
+    assert loaded.tenants["snap-t"].flags == snap.tenants["snap-t"].flags
+    assert loaded.watermark == snap.watermark
+    async with SessionLocal() as db:
+        assert await catch_up(db, loaded) >= 4
+    state = loaded.tenants["snap-t"]
+    assert sorted(state.flags) == ["a", "c"] and state.flags["a"]["state"] == "off"
+    assert state.segments == {} and state.segment_versions == {}
+
+
+@pytest.mark.asyncio
+async def test_catch_up_rereads_rows_committed_late_with_older_timestamps():
+    async with SessionLocal() as db:
+        db.add(Flag(tenant_id="late-t", key="a", state="on", variants=[{"key": "on", "weight": 1}], rules=[]))
+        await db.commit()
+        snap = await collect(db)
+    # Stamped before the snapshot's watermark, committed after the snapshot was taken.
+    stamped = snap.watermark - timedelta(seconds=1)
+    async with SessionLocal() as db:
+        db.add(Flag(tenant_id="late-t", key="b", state="on", variants=[{"key": "on", "weight": 1}], rules=[],
+                    updated_at=stamped))
+        await db.commit()
+    async with SessionLocal() as db:
+        await catch_up(db, snap, overlap=0)
+    assert sorted(snap.tenants["late-t"].flags) == ["a"]
+    async with SessionLocal() as db:
+        await catch_up(db, snap, overlap=10)
+    assert sorted(snap.tenants["late-t"].flags) == ["a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_warm_start_primes_caches(tmp_path):
+    async with SessionLocal() as db:
+        db.add(Flag(tenant_id="warm-t", key="x", state="on", variants=[{"key": "on", "weight": 1}],
+                    rules=[{"id": "r1", "when": {"segment": "beta"}, "rollout": {"variant": "on"}}]))
+        db.add(Segment(tenant_id="warm-t", key="beta", criteria={"attr": {"plan": "beta"}}))
+        await db.commit()
+
+    path = str(tmp_path / "snapshot.json")
+    writer = WarmStart(ReadSessionLocal, path)
+    await writer.write()
+
+    warm = WarmStart(ReadSessionLocal, path)
+    await warm.run(prime)
+    assert warm.ready.is_set()
+    assert cache.get("warm-t:flag:x")["key"] == "x"
+    assert cache.get("warm-t:segments").criteria == {"beta": {"attr": {"plan": "beta"}}}
+    primed = cache.get("warm-t:ruleset")
+    assert [f["key"] for f in primed.flags] == ["x"]
+    cache.invalidate("warm-t:ruleset")
+    assert (await get_ruleset("warm-t")).version == primed.version
+
+
+@pytest.mark.asyncio
+async def test_warm_start_never_blocks_readiness(tmp_path):
+    def boom(*args):
+        raise RuntimeError("prime failed")
+
+    warm = WarmStart(ReadSessionLocal, str(tmp_path / "none.json"))
+    await warm.run(boom)
+    assert warm.ready.is_set()
@@ -0,0 +1,68 @@
+import asyncio
+import json
+import pytest
+from app.services.changes import ChangeEvent
+from app.services.stream import ChangeFeed
+
+
+def _parse(frame: bytes):
+    fields = dict(line.split(": ", 1) for line in frame.decode().strip().split("\n") if not line.startswith(":"))
+    return fields.get("id"), fields.get("event"), json.loads(fields["data"]) if "data" in fields else None
+
+
+async def _next(stream):
+    return await asyncio.wait_for(stream.__anext__(), 1)
+
+
+@pytest.mark.asyncio
+async def test_live_events_are_tenant_scoped_and_resumable():
+    feed = ChangeFeed(replay_size=10, queue_size=10, heartbeat=5)
+    stream = feed.listen("a")
+    assert await _next(stream) == b"retry: 3000\n\n"
+    pending = asyncio.ensure_future(_next(stream))
+    await asyncio.sleep(0)
+    feed.dispatch(ChangeEvent("b", "flag", "other", "v0", "create"))
+    feed.dispatch(ChangeEvent("a", "flag", "checkout", "v1", "create"))
+    first_id, kind, data = _parse(await pending)
+    assert kind == "change" and data == {"entity": "flag", "key": "checkout", "version": "v1", "action": "create"}
+    await stream.aclose()
+
+    feed.dispatch(ChangeEvent("a", "segment", "ca", "v2", "delete"))
+    resumed = feed.listen("a", first_id)
+    await _next(resumed)
+    _, kind, data = _parse(await _next(resumed))
+    assert kind == "change" and data["key"] == "ca" and data["action"] == "delete"
+    await resumed.aclose()
+
+
+@pytest.mark.asyncio
+async def test_unknown_or_evicted_last_event_id_resets():
+    feed = ChangeFeed(replay_size=2, queue_size=10, heartbeat=5)
+    for i in range(5):
+        feed.dispatch(ChangeEvent("a", "flag", f"f{i}", "v"))
+    for last_id in ("other-3", feed.event_id(1), feed.event_id(6)):
+        stream = feed.listen("a", last_id)
+        await _next(stream)
+        assert _parse(await _next(stream))[1] == "reset"
+        await stream.aclose()
+    stream = feed.listen("a", feed.event_id(4))  # seq 4 is the oldest event still buffered
+    await _next(stream)
+    assert _parse(await _next(stream))[2]["key"] == "f4"
+    await stream.aclose()
+    assert ChangeFeed().epoch != feed.epoch
+
+
+@pytest.mark.asyncio
+async def test_heartbeat_and_slow_consumer_dropped():
+    feed = ChangeFeed(replay_size=100, queue_size=2, heartbeat=0.01)
+    stream = feed.listen("a")
+    await _next(stream)
+    assert await _next(stream) == b": ping\n\n"
+
+    pending = asyncio.ensure_future(_next(stream))
+    await asyncio.sleep(0.001)
+    for i in range(5):  # dispatched faster than the consumer runs: overflows its queue of 2
+        feed.dispatch(ChangeEvent("a", "flag", f"f{i}", "v"))
+    with pytest.raises(StopAsyncIteration):
+        await pending
+    assert not feed._tenants["a"].subscribers